@@ -0,0 +1,173 @@
+import argparse
+import hashlib
+import json
+import os
+import queue
+import tarfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+"""
+Input layer for bulk receipts: reads the images straight from zip or tar archives (also compressed tar) or
+from a directory tree, without unpacking them to disk.
+- a reader thread reads the files of the archive one after the other (tar archives are read as a stream)
+- a bounded thread pool decodes the images (OpenCV releases the GIL while decoding)
+- at most `prefetch` images are read or decoded ahead of the model stages, so I/O and decoding overlap with the
+  inference and the memory stays bounded whatever the size of the archive
+The images come out in archive order as decoded BGR arrays, which the pipeline stages accept instead of paths.
+
+Usage: python archive_input.py partners.zip [--output folder] [--store results.db] [--workers 4] [--prefetch 8]
+Prints one JSON line per image with its name, the dates and the amounts (or the reason it was rejected).
+"""
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+
+def _is_image(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS) and not os.path.basename(name).startswith(".")
+
+
+def iter_files(source):
+    """
+    Yield (name, bytes) of every image file of a zip archive, a tar archive or a directory, in archive order
+    (directories sorted by path)
+    """
+    if os.path.isdir(source):
+        for folder, folders, file_names in os.walk(source):
+            folders.sort()
+            for file_name in sorted(file_names):
+                path = os.path.join(folder, file_name)
+                if _is_image(file_name):
+                    with open(path, "rb") as f:
+                        yield os.path.relpath(path, source), f.read()
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and _is_image(info.filename):
+                    yield info.filename, archive.read(info)
+    elif tarfile.is_tarfile(source):
+        # Stream mode reads the members in one pass, also for compressed archives
+        with tarfile.open(source, "r|*") as archive:
+            for member in archive:
+                if member.isfile() and _is_image(member.name):
+                    yield member.name, archive.extractfile(member).read()
+    else:
+        raise ValueError(f"{source} is neither a directory nor a zip or tar archive")
+
+
+def _decode(name, data):
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    return name, image, hashlib.sha1(data).hexdigest()
+
+
+_end = object()
+
+
+def prefetch_images(source, workers=4, prefetch=8):
+    """
+    Yield (name, image, sha1 of the file) of every image of source, decoded ahead by a pool of workers.
+    image is None if the file cannot be decoded.
+
+    workers: decoding threads
+    prefetch: images read or decoded ahead at most
+    """
+    pending = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    failure = []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def read():
+            try:
+                for name, data in iter_files(source):
+                    future = executor.submit(_decode, name, data)
+                    # Blocks while prefetch images are waiting, this bounds the memory
+                    while not stop.is_set():
+                        try:
+                            pending.put(future, timeout=0.1)
+                            break
+                        except queue.Full:
+                            pass
+                    if stop.is_set():
+                        return
+            except Exception as error:
+                failure.append(error)
+            finally:
+                pending.put(_end)
+
+        reader = threading.Thread(target=read, name="archive-reader", daemon=True)
+        reader.start()
+        try:
+            while True:
+                future = pending.get()
+                if future is _end:
+                    break
+                yield future.result()
+        finally:
+            # The consumer stopped early: let the reader finish without filling the queue
+            stop.set()
+            while reader.is_alive():
+                try:
+                    pending.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+    if failure:
+        raise failure[0]
+
+
+def main():
+    import pipeline
+    from model_registry import ModelRegistry
+    from tracing import trace_request
+
+    parser = argparse.ArgumentParser(description="Extract date and total amount of all receipts of an archive.")
+    parser.add_argument("source", help="zip or tar archive, or a directory")
+    parser.add_argument("--output", default="archive_output", help="folder for the intermediate images")
+    parser.add_argument("--detector", choices=["nanodet", "nanodet-eager", "opencv"], default="nanodet",
+                        help="receipt detector")
+    parser.add_argument("--orientation", action="store_true", help="straighten the receipt from its corners")
+    parser.add_argument("--workers", type=int, default=4, help="decoding threads")
+    parser.add_argument("--prefetch", type=int, default=8, help="images decoded ahead of the model stages")
+    parser.add_argument("--store", default=None, help="SQLite file to keep the OCR lines and results in")
+    parser.add_argument("--quality-gate", action="store_true",
+                        help="do not send blurry, dark or receipt-free images to the OCR")
+    parser.add_argument("--trace-threshold-ms", type=float, default=None, help="trace every image slower than this")
+    args = parser.parse_args()
+
+    quality = pipeline.quality_thresholds if args.quality_gate else None
+    registry = ModelRegistry(args.detector, pipeline.apply_profile(pipeline.load_profile()))
+    predictor = registry.detector()
+    ocr = registry.ocr()
+    output_path = os.path.join(args.output, '')
+    os.makedirs(output_path, exist_ok=True)
+
+    store = None
+    if args.store:
+        from results_store import ResultsStore
+        store = ResultsStore(args.store)
+    try:
+        for name, image, image_hash in prefetch_images(args.source, args.workers, args.prefetch):
+            if image is None:
+                output = {"result": [], "dates": [], "amounts": [], "timings": {}, "error": "cannot decode image"}
+            else:
+                try:
+                    with trace_request(os.path.basename(name), os.path.join(args.output, "traces"),
+                                       threshold_ms=args.trace_threshold_ms):
+                        output = pipeline.process_receipt(predictor, ocr, image, output_path, args.orientation,
+                                                          verbose=False, quality=quality)
+                except Exception as error:
+                    output = {"result": [], "dates": [], "amounts": [], "timings": {}, "error": repr(error)}
+            if store is not None:
+                store.add(output, image_hash=image_hash, file_name=f"{args.source}:{name}")
+            print(json.dumps({"image": name, "dates": output["dates"], "amounts": output["amounts"],
+                              "rejected": output.get("rejected", {}).get("reason"), "error": output.get("error")},
+                             ensure_ascii=False), flush=True)
+    finally:
+        if store is not None:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
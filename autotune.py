@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+
+from evaluate_pipeline import evaluate
+
+"""
+This script tunes the thread and batch settings of the pipeline for the local machine:
+number of worker processes, torch intra-op threads (NanoDet), OpenCV threads,
+Paddle cpu_threads, MKLDNN and rec_batch_num (CRNN). The torch and Paddle threads are tuned separately, the
+detector and the recognizer do not have to be fastest with the same number of threads.
+It measures the throughput of the pipeline on a sample workload (generated receipts with labels, see
+evaluate_pipeline.py) for one setting at a time, keeping the best value before moving on to the next one.
+The best profile is written to pipeline_profile.json, which pipeline.py and evaluate_pipeline.py load at startup.
+
+Usage: python autotune.py receipt_generator/output [--limit 40]
+"""
+
+
+def _candidates_workers(cpu_count):
+    # 1, 2, 4, ... up to the number of cores
+    workers = []
+    count = 1
+    while count <= cpu_count:
+        workers.append(count)
+        count *= 2
+    if workers[-1] != cpu_count:
+        workers.append(cpu_count)
+    return workers
+
+
+def _profile(workers, threads, opencv_threads=1, enable_mkldnn=False, rec_batch_num=6):
+    # The Paddle threads start at the torch threads, they are tuned on their own afterwards
+    return {
+        "workers": workers,
+        "torch_threads": threads,
+        "opencv_threads": opencv_threads,
+        "paddle": {"cpu_threads": threads, "enable_mkldnn": enable_mkldnn, "rec_batch_num": rec_batch_num},
+    }
+
+
+def measure(dataset_folder, profile, limit, config=None):
+    """
+    Throughput in images/sec of the pipeline with a profile
+    """
+    summary, _ = evaluate(dataset_folder, profile["workers"], limit=limit, config=config, profile=profile)
+    print(f"  {json.dumps(profile)}: {summary['images_per_second']:.2f} images/s, "
+          f"p50 {summary['latency']['total']['median_ms']:.0f} ms")
+    return summary["images_per_second"]
+
+
+def autotune(dataset_folder, limit=40, config=None):
+    """
+    Coordinate search over the settings, one at a time in the order of their expected impact.
+
+    return: the best profile with its throughput
+    """
+    cpu_count = os.cpu_count() or 1
+
+    # Workers and threads per worker share the cores
+    print("workers:")
+    results = []
+    for workers in _candidates_workers(cpu_count):
+        profile = _profile(workers, max(1, cpu_count // workers))
+        results.append((measure(dataset_folder, profile, limit, config), profile))
+    best_throughput, best = max(results, key=lambda result: result[0])
+
+    def tune(name, update):
+        # Try every variant of one setting and keep the fastest
+        nonlocal best_throughput, best
+        print(f"{name}:")
+        for variant in update(best):
+            if variant == best:
+                continue
+            throughput = measure(dataset_folder, variant, limit, config)
+            if throughput > best_throughput:
+                best_throughput, best = throughput, variant
+
+    threads = best["torch_threads"]
+    tune("mkldnn", lambda p: [dict(p, paddle=dict(p["paddle"], enable_mkldnn=value)) for value in (False, True)])
+    tune("rec_batch_num", lambda p: [dict(p, paddle=dict(p["paddle"], rec_batch_num=value)) for value in (1, 6, 16)])
+    tune("torch threads", lambda p: [dict(p, torch_threads=value) for value in sorted({max(1, threads // 2), threads})])
+    tune("paddle threads", lambda p: [dict(p, paddle=dict(p["paddle"], cpu_threads=value))
+                                      for value in sorted({max(1, threads // 2), threads})])
+    tune("opencv threads", lambda p: [dict(p, opencv_threads=value) for value in sorted({1, threads})])
+
+    return dict(best, images_per_second=best_throughput, cpu_count=cpu_count)
+
+
+def main():
+    import pipeline
+
+    parser = argparse.ArgumentParser(description="Tune thread and batch settings of the pipeline for this machine.")
+    parser.add_argument("dataset", help="generator output folder with images/ and labels/ (the sample workload)")
+    parser.add_argument("--limit", type=int, default=40, help="images of the workload")
+    parser.add_argument("--config", default=None, help="JSON file with the pipeline configuration (as in sweep.py)")
+    parser.add_argument("--output", default=pipeline.profile_path, help="profile file")
+    args = parser.parse_args()
+
+    config = None
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    profile = autotune(args.dataset, args.limit, config)
+    with open(args.output, "w") as f:
+        json.dump(profile, f, indent=2)
+    print(f"Best profile ({profile['images_per_second']:.2f} images/s) written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
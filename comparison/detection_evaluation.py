@@ -0,0 +1,262 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import xml.etree.ElementTree as ET
+import numpy as np
+
+"""
+This module evaluates receipt detectors (NanoDet, the OpenCV approach, ...) against Pascal VOC annotations.
+- all annotations of a folder are parsed once into a columnar index (NumPy arrays), which is cached as .npz
+  in a cache folder and rebuilt when an annotation file is added, removed or changed
+- IoUs are computed for all predictions against all ground-truth boxes of their image in one vectorized call,
+  the greedy matching runs in vectorized rounds over all predictions
+- precision, recall and average precision are reported at several IoU thresholds (AP50, AP75, mAP@[.5:.95])
+
+Usage: python detection_evaluation.py <annotation folder> <predictions.json> [--cache .detection_cache]
+with predictions.json mapping image file names to lists of [x_min, y_min, x_max, y_max, score]
+"""
+
+DEFAULT_THRESHOLDS = np.round(np.arange(0.5, 1.0, 0.05), 2)
+
+
+def _parse_annotation(path):
+    # All bndbox objects of one VOC annotation
+    root = ET.parse(path).getroot()
+    boxes = []
+    for obj in root.iter('object'):
+        xmlbox = obj.find('bndbox')
+        boxes.append([float(xmlbox.find(name).text) for name in ('xmin', 'ymin', 'xmax', 'ymax')])
+    return boxes
+
+
+class AnnotationIndex():
+    """
+    Columnar index of the VOC annotations of a folder.
+
+    names: (I,) image names (file name without extension) sorted
+    boxes: (N, 4) ground-truth boxes (x_min, y_min, x_max, y_max) of all images
+    image_ids: (N,) index into names of the image of every box, sorted
+    cache_dir: folder for the cached index, None disables the cache (the annotation folder is never written)
+    """
+    def __init__(self, annotation_folder, cache_dir=".detection_cache"):
+        self.annotation_folder = annotation_folder
+        self.cache_path = None
+        if cache_dir:
+            # One cache file per annotation folder
+            key = hashlib.sha1(os.path.abspath(annotation_folder).encode()).hexdigest()
+            self.cache_path = os.path.join(cache_dir, f"annotation_index-{key}.npz")
+
+        # Sorted by image name, so names can be looked up with a binary search
+        files = sorted(glob.glob(os.path.join(annotation_folder, "*.xml")),
+                       key=lambda path: os.path.splitext(os.path.basename(path))[0])
+        names = np.array([os.path.splitext(os.path.basename(path))[0] for path in files], dtype=str)
+        mtime = max((os.stat(path).st_mtime_ns for path in files), default=0)
+
+        if not self._load_cache(names, mtime):
+            boxes = []
+            image_ids = []
+            for image_id, path in enumerate(files):
+                image_boxes = _parse_annotation(path)
+                boxes.extend(image_boxes)
+                image_ids.extend([image_id] * len(image_boxes))
+            self.names = names
+            self.boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+            self.image_ids = np.array(image_ids, dtype=np.int64)
+            if self.cache_path:
+                os.makedirs(cache_dir, exist_ok=True)
+                np.savez(self.cache_path, names=self.names, boxes=self.boxes, image_ids=self.image_ids,
+                         mtime=np.int64(mtime))
+
+    def _load_cache(self, names, mtime):
+        # The cache is valid if it has the same files and no file was changed after it was written
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return False
+        with np.load(self.cache_path) as cache:
+            if not np.array_equal(cache["names"], names) or int(cache["mtime"]) < mtime:
+                return False
+            self.names = cache["names"]
+            self.boxes = cache["boxes"]
+            self.image_ids = cache["image_ids"]
+        return True
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, names):
+        """
+        Image ids of image names (file names with or without extension), -1 for unknown images.
+        """
+        stems = np.array([os.path.splitext(os.path.basename(name))[0] for name in names], dtype=str)
+        if len(self.names) == 0:
+            # No annotation files, every image is unknown
+            return np.full(len(stems), -1, dtype=np.int64)
+        ids = np.searchsorted(self.names, stems)
+        ids = np.minimum(ids, len(self.names) - 1)
+        return np.where(self.names[ids] == stems, ids, -1)
+
+
+def _areas(boxes):
+    # Inclusive pixel coordinates, like calculate_iou in nanodet_vs_opencv.ipynb
+    return (boxes[..., 2] - boxes[..., 0] + 1) * (boxes[..., 3] - boxes[..., 1] + 1)
+
+
+def box_iou(boxes_a, boxes_b):
+    """
+    Element-wise IoU of two broadcastable arrays of boxes (..., 4)
+    """
+    a = np.asarray(boxes_a, dtype=np.float64)
+    b = np.asarray(boxes_b, dtype=np.float64)
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]) + 1, 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]) + 1, 0, None)
+    intersection = width * height
+    return intersection / (_areas(a) + _areas(b) - intersection)
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    IoU of every box in boxes_a (A, 4) with every box in boxes_b (B, 4), as (A, B) array
+    """
+    return box_iou(np.asarray(boxes_a)[:, None, :], np.asarray(boxes_b)[None, :, :])
+
+
+def _image_pairs(prediction_ids, truth_ids):
+    # All (prediction, ground truth) pairs of the same image, truth_ids must be sorted
+    starts = np.searchsorted(truth_ids, prediction_ids, side="left")
+    ends = np.searchsorted(truth_ids, prediction_ids, side="right")
+    counts = ends - starts
+    predictions = np.repeat(np.arange(len(prediction_ids)), counts)
+    # Offsets 0 .. count - 1 within every prediction's run of ground-truth boxes
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return predictions, np.repeat(starts, counts) + offsets
+
+
+def _average_precision(true_positives, number_of_truths):
+    # Area under the precision/recall curve with the precision envelope (all-point interpolation)
+    if number_of_truths == 0 or len(true_positives) == 0:
+        return 0.0
+    tp = np.cumsum(true_positives)
+    recall = np.concatenate([[0], tp / number_of_truths, [1]])
+    precision = np.concatenate([[0], tp / np.arange(1, len(tp) + 1), [0]])
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    changes = np.flatnonzero(recall[1:] != recall[:-1])
+    return float(np.sum((recall[changes + 1] - recall[changes]) * precision[changes + 1]))
+
+
+def _greedy_match(pair_predictions, pair_starts, pair_truths, ious, threshold, number_of_truths):
+    """
+    Greedy matching: in the order of the predictions (highest score first) every prediction takes its best
+    unmatched ground-truth box with an IoU of at least threshold. The pairs are sorted by prediction and by IoU,
+    best first, the pairs of prediction p start at pair_starts[p].
+
+    All ground-truth boxes prefer the predictions in the same order, so the greedy result is the one of deferred
+    acceptance, which runs in vectorized rounds: all free predictions propose to their next box, every box keeps
+    its best proposer and the rejected ones propose again in the next round.
+
+    return: (P,) bool, whether each prediction matched a box
+    """
+    number_of_predictions = len(pair_starts) - 1
+    none = number_of_predictions
+    # The pairs above the threshold are a prefix of the pairs of every prediction
+    ends = pair_starts[:-1] + np.bincount(pair_predictions[ious >= threshold], minlength=number_of_predictions)
+    next_pair = pair_starts[:-1].copy()
+    holder = np.full(number_of_truths, none, dtype=np.int64)
+
+    free = np.flatnonzero(next_pair < ends)
+    while len(free):
+        truths = pair_truths[next_pair[free]]
+        next_pair[free] += 1
+        previous = holder[truths]
+        np.minimum.at(holder, truths, free)
+        kept = holder[truths]
+        # Rejected proposers and displaced holders are free again, as long as they have boxes left
+        free = np.unique(np.concatenate([free[kept != free], previous[(previous != none) & (kept != previous)]]))
+        free = free[next_pair[free] < ends[free]]
+
+    true_positives = np.zeros(number_of_predictions, dtype=bool)
+    true_positives[holder[holder != none]] = True
+    return true_positives
+
+
+def evaluate_detections(index, image_names, boxes, scores, thresholds=DEFAULT_THRESHOLDS):
+    """
+    Evaluate predicted boxes against the annotation index.
+
+    image_names: (P,) image name of every predicted box
+    boxes: (P, 4) predicted boxes (x_min, y_min, x_max, y_max)
+    scores: (P,) confidence of every box
+    thresholds: IoU thresholds
+
+    return: dict with precision, recall and AP per threshold, AP50, AP75 and mAP over all thresholds
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float64)
+    image_ids = index.lookup(image_names)
+    known = image_ids >= 0
+    boxes, scores, image_ids = boxes[known], scores[known], image_ids[known]
+
+    # Highest score first, ground-truth boxes are matched greedily in this order
+    order = np.argsort(-scores, kind="stable")
+    boxes, image_ids = boxes[order], image_ids[order]
+
+    pair_predictions, pair_truths = _image_pairs(image_ids, index.image_ids)
+    # One vectorized IoU over all pairs: the entries of the per-image IoU matrices
+    ious = box_iou(boxes[pair_predictions], index.boxes[pair_truths])
+
+    # Best-matching ground-truth boxes first within every prediction
+    pair_order = np.lexsort((-ious, pair_predictions))
+    pair_predictions, pair_truths, ious = pair_predictions[pair_order], pair_truths[pair_order], ious[pair_order]
+    pair_starts = np.searchsorted(pair_predictions, np.arange(len(boxes) + 1))
+
+    number_of_truths = len(index.boxes)
+    results = {"thresholds": {}}
+    for threshold in thresholds:
+        true_positives = _greedy_match(pair_predictions, pair_starts, pair_truths, ious, threshold, number_of_truths)
+        tp = int(true_positives.sum())
+        results["thresholds"][float(threshold)] = {
+            "precision": tp / len(boxes) if len(boxes) else 0.0,
+            "recall": tp / number_of_truths if number_of_truths else 0.0,
+            "ap": _average_precision(true_positives, number_of_truths),
+        }
+
+    aps = {threshold: values["ap"] for threshold, values in results["thresholds"].items()}
+    results["AP50"] = aps.get(0.5)
+    results["AP75"] = aps.get(0.75)
+    results["mAP"] = float(np.mean(list(aps.values()))) if aps else 0.0
+    return results
+
+
+def load_predictions(path):
+    """
+    Columnar predictions (image names, boxes, scores) of a JSON file {image file name: [[x0, y0, x1, y1, score], ...]}
+    """
+    with open(path) as f:
+        predictions = json.load(f)
+    image_names = []
+    rows = []
+    for image_name, detections in predictions.items():
+        for detection in detections:
+            image_names.append(image_name)
+            rows.append(detection[:5])
+    rows = np.array(rows, dtype=np.float64).reshape(-1, 5)
+    return image_names, rows[:, :4], rows[:, 4]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate receipt detections against VOC annotations.")
+    parser.add_argument("annotations", help="folder with the VOC XML annotations")
+    parser.add_argument("predictions", help="JSON file mapping image file names to [x0, y0, x1, y1, score] lists")
+    parser.add_argument("--cache", default=".detection_cache", help="folder for the cached annotation index")
+    args = parser.parse_args()
+
+    index = AnnotationIndex(args.annotations, args.cache)
+    results = evaluate_detections(index, *load_predictions(args.predictions))
+    for threshold, values in results["thresholds"].items():
+        print(f"IoU {threshold:.2f}: precision {values['precision']:.4f}, recall {values['recall']:.4f}, "
+              f"AP {values['ap']:.4f}")
+    print(f"AP50 {results['AP50']:.4f}, AP75 {results['AP75']:.4f}, mAP {results['mAP']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
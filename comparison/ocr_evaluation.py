@@ -0,0 +1,244 @@
+import argparse
+import collections
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+
+"""
+This module evaluates text detection (DB, EAST) and text recognition (CRNN) models in-process,
+instead of calling PaddleOCR's tools/eval.py once per model and scraping its output.
+- every configuration (model + dataset) is evaluated in a pool of worker processes, several configurations run
+  at the same time, each worker loads its model once through the paddleocr package
+- the predictions of every configuration are cached per dataset, so a new metric can be computed
+  without running inference again
+- results are returned as metric objects (DetectionMetrics, RecognitionMetrics) instead of text
+
+The datasets are PaddleOCR label files, like the ones written by the receipt generator (--export):
+    det: <image path>\t[{"transcription": "...", "points": [[x, y], ...]}, ...]
+    rec: <image path>\t<text>
+
+Usage: python ocr_evaluation.py configs.json [--processes 4] [--cache .ocr_cache]
+with configs.json a list of {"name", "task" ("det" or "rec"), "model_dir", "data_dir", "label_file", "options"}
+"""
+
+# Version of the cached predictions, increased when _predict changes so older caches are not reused
+# (2: recognition predictions are the whole text, version 1 kept only its first character)
+PREDICTION_VERSION = 2
+
+DetectionMetrics = collections.namedtuple("DetectionMetrics", ["precision", "recall", "hmean", "fps"])
+RecognitionMetrics = collections.namedtuple("RecognitionMetrics", ["accuracy", "fps"])
+
+
+class EvaluationConfig(collections.namedtuple(
+        "EvaluationConfig", ["name", "task", "model_dir", "data_dir", "label_file", "options"])):
+    """
+    name: name of the configuration in the results
+    task: "det" (text detection) or "rec" (text recognition)
+    model_dir: PaddleOCR inference model directory
+    data_dir: folder the image paths of the label file are relative to
+    label_file: PaddleOCR label file of the dataset
+    options: further keyword arguments of paddleocr.PaddleOCR, e.g. {"det_algorithm": "EAST"}
+        or {"rec_image_shape": "3, 32, 100", "rec_char_dict_path": ".../german_dict.txt"}
+    """
+    def __new__(cls, name, task, model_dir, data_dir, label_file, options=None):
+        if task not in ("det", "rec"):
+            raise ValueError(f"unknown task {task}, use det or rec")
+        return super().__new__(cls, name, task, model_dir, data_dir, label_file, options or {})
+
+    def cache_key(self):
+        # Predictions depend on the model, the dataset and the options, not on the name
+        stamp = {
+            "version": PREDICTION_VERSION,
+            "task": self.task,
+            "model_dir": os.path.abspath(self.model_dir),
+            "model_mtime": max((os.path.getmtime(os.path.join(self.model_dir, file_name))
+                                for file_name in os.listdir(self.model_dir)), default=0),
+            "label_file": os.path.abspath(self.label_file),
+            "label_mtime": os.path.getmtime(self.label_file),
+            "options": self.options,
+        }
+        return hashlib.sha1(json.dumps(stamp, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def load_labels(data_dir, label_file, task):
+    """
+    return: list of (image path, ground truth) from a PaddleOCR label file,
+        the ground truth is the list of text boxes (det) or the text (rec)
+    """
+    samples = []
+    with open(label_file, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            image_path, label = line.rstrip("\n").split("\t", 1)
+            if task == "det":
+                label = json.loads(label)
+            samples.append((os.path.join(data_dir, image_path), label))
+    return samples
+
+
+# Models of a worker process, a worker evaluating several configurations of the same model loads it once
+_models = {}
+
+
+def _load_model(config, cpu_threads):
+    key = (config.task, config.model_dir, json.dumps(config.options, sort_keys=True))
+    if key not in _models:
+        from paddleocr import PaddleOCR
+
+        model_dir = {"det_model_dir" if config.task == "det" else "rec_model_dir": config.model_dir}
+        _models[key] = PaddleOCR(use_angle_cls=False, use_gpu=False, show_log=False,
+                                 cpu_threads=cpu_threads, **model_dir, **config.options)
+    return _models[key]
+
+
+def _predict(config, cpu_threads):
+    # Run the model of one configuration on its dataset, in a worker process
+    ocr = _load_model(config, cpu_threads)
+    predictions = []
+    seconds = 0.0
+    for image_path, _ in load_labels(config.data_dir, config.label_file, config.task):
+        image = cv2.imread(image_path)
+        start = time.perf_counter()
+        if config.task == "det":
+            result = ocr.ocr(image, det=True, rec=False, cls=False)[0] or []
+            predictions.append([np.asarray(box, dtype=np.float32).tolist() for box in result])
+        else:
+            # Without detection the result of the image is [(text, score)], one pair for the whole line
+            result = ocr.ocr(image, det=False, rec=True, cls=False)[0]
+            predictions.append(result[0][0] if result else "")
+        seconds += time.perf_counter() - start
+    return {"predictions": predictions, "seconds": seconds}
+
+
+def polygon_iou(a, b):
+    """
+    IoU of two convex polygons given as (N, 2) point arrays
+    """
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    intersection, _ = cv2.intersectConvexConvex(a, b)
+    union = cv2.contourArea(a) + cv2.contourArea(b) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def detection_metrics(predictions, ground_truth, seconds, iou_threshold=0.5):
+    """
+    Precision, recall and hmean of text boxes with one-to-one matching at iou_threshold, like PaddleOCR's DetMetric.
+    Ground-truth boxes transcribed as "###" are ignored, together with the predictions covering them.
+    """
+    matched = predicted = relevant = 0
+    for boxes, labels in zip(predictions, ground_truth):
+        truth = [label["points"] for label in labels if label["transcription"] != "###"]
+        ignored = [label["points"] for label in labels if label["transcription"] == "###"]
+        boxes = [box for box in boxes if not any(polygon_iou(box, other) > iou_threshold for other in ignored)]
+
+        used = set()
+        for box in boxes:
+            ious = [polygon_iou(box, other) if number not in used else 0 for number, other in enumerate(truth)]
+            if ious and max(ious) > iou_threshold:
+                used.add(int(np.argmax(ious)))
+        matched += len(used)
+        predicted += len(boxes)
+        relevant += len(truth)
+
+    precision = matched / predicted if predicted else 0.0
+    recall = matched / relevant if relevant else 0.0
+    hmean = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return DetectionMetrics(precision, recall, hmean, len(predictions) / seconds if seconds else 0.0)
+
+
+def recognition_metrics(predictions, ground_truth, seconds):
+    """
+    Accuracy of recognized text lines, spaces are ignored like in PaddleOCR's RecMetric
+    """
+    correct = sum(prediction.replace(" ", "") == text.replace(" ", "")
+                  for prediction, text in zip(predictions, ground_truth))
+    return RecognitionMetrics(correct / len(ground_truth) if ground_truth else 0.0,
+                              len(predictions) / seconds if seconds else 0.0)
+
+
+DEFAULT_METRICS = {"det": detection_metrics, "rec": recognition_metrics}
+
+
+class OcrEvaluation():
+    """
+    Evaluates configurations concurrently and keeps their predictions.
+
+    processes: number of worker processes, each evaluating one configuration at a time
+    cache_dir: folder for the cached predictions, None disables the cache
+    """
+    def __init__(self, processes=None, cache_dir=".ocr_cache"):
+        self.processes = processes or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+        self.predictions = {}
+
+    def _cache_path(self, config):
+        return os.path.join(self.cache_dir, f"{config.name}-{config.cache_key()}.json")
+
+    def predict(self, configs):
+        """
+        Run inference for every configuration whose predictions are not cached yet.
+
+        return: dict of name -> {"predictions": [...], "seconds": inference seconds}
+        """
+        missing = []
+        for config in configs:
+            if self.cache_dir and os.path.exists(self._cache_path(config)):
+                with open(self._cache_path(config)) as f:
+                    self.predictions[config.name] = json.load(f)
+            else:
+                missing.append(config)
+
+        if missing:
+            # Paddle uses several threads per model, share the cores between the concurrent models
+            workers = min(self.processes, len(missing))
+            cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [(config, executor.submit(_predict, config, cpu_threads)) for config in missing]
+                for config, future in futures:
+                    self.predictions[config.name] = future.result()
+                    if self.cache_dir:
+                        os.makedirs(self.cache_dir, exist_ok=True)
+                        with open(self._cache_path(config), "w") as f:
+                            json.dump(self.predictions[config.name], f)
+        return {config.name: self.predictions[config.name] for config in configs}
+
+    def evaluate(self, configs, metrics=None):
+        """
+        Predict (or load the cached predictions) and score every configuration.
+
+        metrics: optional dict of task -> metric function(predictions, ground_truth, seconds),
+            defaults to detection_metrics and recognition_metrics
+        return: dict of name -> metric object
+        """
+        metrics = dict(DEFAULT_METRICS, **(metrics or {}))
+        predictions = self.predict(configs)
+        results = {}
+        for config in configs:
+            ground_truth = [label for _, label in load_labels(config.data_dir, config.label_file, config.task)]
+            output = predictions[config.name]
+            results[config.name] = metrics[config.task](output["predictions"], ground_truth, output["seconds"])
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate PaddleOCR text detection and recognition models.")
+    parser.add_argument("configs", help="JSON file with the list of configurations")
+    parser.add_argument("--processes", type=int, default=None, help="configurations evaluated at the same time")
+    parser.add_argument("--cache", default=".ocr_cache", help="folder for the cached predictions")
+    args = parser.parse_args()
+
+    with open(args.configs) as f:
+        configs = [EvaluationConfig(**config) for config in json.load(f)]
+    results = OcrEvaluation(args.processes, args.cache).evaluate(configs)
+    for name, metrics in results.items():
+        print(name, " ".join(f"{field}: {value:.4f}" for field, value in metrics._asdict().items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+import argparse
+import collections
+import glob
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+import numpy as np
+from tracing import trace_request
+
+"""
+This script evaluates the complete pipeline (pipeline.py) on a generated dataset with known ground truth.
+The receipt generator writes the labels of every image (text lines, date, total) to output/labels,
+the pipeline runs on all images in parallel worker processes and the script reports
+- date and total exact match (the first extracted value compared with the ground truth)
+- character error rate (CER) of all recognized lines against the printed lines
+- mean/median/95th percentile latency of every pipeline stage and the throughput in images/sec,
+  so every accuracy number comes with its speed
+"""
+
+
+def edit_distance(a, b):
+    """
+    Levenshtein distance of two strings with the bit-parallel algorithm of Myers/Hyyrö:
+    one pass over b with a few integer operations per character, the columns of a are the bits of an int.
+    """
+    if not a:
+        return len(b)
+    if not b:
+        return len(a)
+
+    # Bit mask of the positions of every character in a
+    peq = {}
+    for position, character in enumerate(a):
+        peq[character] = peq.get(character, 0) | (1 << position)
+
+    full = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    pv, mv = full, 0
+    distance = len(a)
+    for character in b:
+        eq = peq.get(character, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & full
+        mh = pv & xh
+        if ph & last:
+            distance += 1
+        elif mh & last:
+            distance -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = (mh | ~(xv | ph)) & full
+        mv = ph & xv
+    return distance
+
+
+def _normalize_text(lines):
+    # OCR may split or join the cells of a row, so spacing is not compared
+    return " ".join(" ".join(lines).split())
+
+
+def normalize_date(text):
+    """
+    ISO date (YYYY-MM-DD) of a date as printed on a receipt (DD.MM.YYYY, DD/MM/YY, YYYY-MM-DD ...), None if invalid
+    """
+    match = re.search(r"(\d{4})-(\d{1,2})-(\d{1,2})", text)
+    if match:
+        year, month, day = (int(value) for value in match.groups())
+    else:
+        match = re.search(r"(\d{1,2})[./-](\d{1,2})[./-](\d{2,4})", text)
+        if not match:
+            return None
+        day, month, year = (int(value) for value in match.groups())
+        if year < 100:
+            year += 2000
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return None
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def normalize_amount(text):
+    """
+    Amount with 2 decimals and a dot (e.g. "14.71") of a printed amount like "14,71", "1.234,56" or "14.71"
+    """
+    digits = re.sub(r"[^\d,.]", "", text)
+    if len(digits) < 3 or digits[-3] not in ",." or not digits[-2:].isdigit():
+        return None
+    whole = re.sub(r"[^\d]", "", digits[:-3]) or "0"
+    return f"{int(whole)}.{digits[-2:]}"
+
+
+def score_sample(labels, output):
+    """
+    Compare the pipeline output of one image with its labels.
+
+    return: dict with date/total exact match, the edit distance and the number of ground-truth characters
+    """
+    dates = [normalize_date(date) for date in output["dates"]]
+    amounts = [normalize_amount(amount) for amount in output["amounts"]]
+    truth = _normalize_text(labels.get("text", []))
+    recognized = _normalize_text(text for _, (text, _) in output["result"])
+    return {
+        "date_match": bool(dates) and dates[0] == labels.get("date"),
+        "total_match": bool(amounts) and amounts[0] == labels.get("total"),
+        "edit_distance": edit_distance(truth, recognized),
+        "characters": len(truth),
+    }
+
+
+# Models of a worker process, loaded once by _init_worker
+_worker_state = {}
+
+
+def _load_models(config, profile):
+    import pipeline
+    from model_registry import ModelRegistry
+
+    # Thread settings of the profile, the OCR options of the configuration take precedence
+    config = dict(pipeline.apply_profile(profile), **config)
+    _worker_state["pipeline"] = pipeline
+    _worker_state["orientation"] = config.pop("orientation", False)
+    _worker_state["deskew"] = config.pop("deskew", True)
+    # Quality gate: true for the default limits of pipeline.py, a dict overrides some of them
+    quality = config.pop("quality", None)
+    if quality:
+        quality = dict(pipeline.quality_thresholds, **(quality if isinstance(quality, dict) else {}))
+    _worker_state["quality"] = quality
+    # The remaining settings select the OCR models and their options
+    registry = ModelRegistry(config.pop("detector", "nanodet"), config)
+    _worker_state["predictor"] = registry.detector()
+    _worker_state["ocr"] = registry.ocr()
+    return registry
+
+
+def _init_worker(config, profile, trace=None):
+    # Forked workers inherit the models loaded by the parent
+    if "predictor" not in _worker_state:
+        _load_models(config, profile)
+    # The pipeline writes its intermediate images into a fixed set of file names, so every worker gets a folder
+    _worker_state["folder"] = tempfile.mkdtemp(prefix="pipeline_eval_")
+    _worker_state["trace"] = trace
+
+
+def _evaluate_sample(sample):
+    image_path, labels = sample
+    pipeline = _worker_state["pipeline"]
+    started = time.time()
+    start = time.perf_counter()
+    trace = _worker_state["trace"] or {}
+    try:
+        with trace_request(os.path.basename(image_path), trace.get("folder", "traces"),
+                           trace.get("sample_rate", 0.0), trace.get("threshold_ms")):
+            output = pipeline.process_receipt(_worker_state["predictor"], _worker_state["ocr"], image_path,
+                                              os.path.join(_worker_state["folder"], ""),
+                                              orientation=_worker_state["orientation"], verbose=False,
+                                              deskew=_worker_state["deskew"], quality=_worker_state["quality"])
+    except Exception as error:
+        # A failed image (e.g. no receipt detected) counts as wrong, it does not stop the evaluation
+        output = {"result": [], "dates": [], "amounts": [], "timings": {}, "error": repr(error)}
+    output["timings"]["total"] = time.perf_counter() - start
+    scores = score_sample(labels, output)
+    scores.update(file_name=labels["file_name"], dates=output["dates"], amounts=output["amounts"],
+                  timings=output["timings"], error=output.get("error"),
+                  rejected=output.get("rejected", {}).get("reason"), started=started, finished=time.time())
+    return scores
+
+
+def load_dataset(dataset_folder, limit=None):
+    """
+    (image path, labels) of every labelled image of a generator output folder (images/ and labels/)
+    """
+    samples = []
+    for label_path in sorted(glob.glob(os.path.join(dataset_folder, "labels", "*.json"))):
+        with open(label_path, encoding="utf-8") as f:
+            labels = json.load(f)
+        image_path = os.path.join(dataset_folder, "images", labels["file_name"])
+        if "date" in labels and os.path.exists(image_path):
+            samples.append((image_path, labels))
+    return samples[:limit]
+
+
+def summarize(scores):
+    stages = sorted({stage for score in scores for stage in score["timings"]})
+    latency = {}
+    for stage in stages:
+        values = np.array([score["timings"][stage] for score in scores if stage in score["timings"]]) * 1000
+        latency[stage] = {
+            "mean_ms": float(values.mean()),
+            "median_ms": float(np.median(values)),
+            "p95_ms": float(np.percentile(values, 95)),
+        }
+    characters = sum(score["characters"] for score in scores)
+    # Throughput from the first image started to the last image finished, without loading the models
+    seconds = max(score["finished"] for score in scores) - min(score["started"] for score in scores)
+    return {
+        "images": len(scores),
+        "failed": sum(score["error"] is not None for score in scores),
+        # Images stopped by the quality gate, by reason
+        "rejected": dict(collections.Counter(score["rejected"] for score in scores if score.get("rejected"))),
+        "date_exact_match": float(np.mean([score["date_match"] for score in scores])),
+        "total_exact_match": float(np.mean([score["total_match"] for score in scores])),
+        "cer": sum(score["edit_distance"] for score in scores) / max(characters, 1),
+        "seconds": seconds,
+        "images_per_second": len(scores) / seconds,
+        "latency": latency,
+    }
+
+
+def evaluate(dataset_folder, processes=None, orientation=False, limit=None, config=None, profile=None,
+             preload=True, trace=None):
+    """
+    Run the pipeline on all labelled images of dataset_folder with processes worker processes.
+
+    config: optional pipeline configuration, a dict with detector ("nanodet", "nanodet-eager" or "opencv"), deskew,
+        orientation, quality (quality gate: true or a dict of limits) and the arguments of pipeline.load_ocr
+        (det_model_dir, rec_model_dir, det_algorithm, ...)
+    profile: thread and batch settings (see autotune.py), by default pipeline_profile.json
+    preload: load the models in this process and fork the workers (see model_registry.py),
+        False loads them in every worker
+    trace: optional dict with folder, sample_rate and threshold_ms, writes Chrome traces of sampled or slow
+        images (see tracing.py)
+    return: the summary and the per-image scores
+    """
+    config = dict(config or {})
+    config.setdefault("orientation", orientation)
+    if profile is None:
+        from pipeline import load_profile
+        profile = load_profile()
+    samples = load_dataset(dataset_folder, limit)
+    if not samples:
+        raise ValueError(f"no labelled images found in {dataset_folder}")
+    processes = processes or profile.get("workers") or os.cpu_count() or 1
+
+    from model_registry import fork_available
+
+    if preload and fork_available():
+        # Load the models once and fork the workers, they share the weights instead of loading them again
+        pool = _load_models(config, profile).preload().pool(processes, _init_worker, (config, profile, trace))
+    else:
+        pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(config, profile, trace))
+    try:
+        with pool:
+            scores = pool.map(_evaluate_sample, samples, chunksize=1)
+    finally:
+        _worker_state.clear()
+    return summarize(scores), scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate accuracy and speed of the pipeline on generated receipts.")
+    parser.add_argument("dataset", help="generator output folder with images/ and labels/")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: from the profile, else all cores)")
+    parser.add_argument("--orientation", action="store_true", help="evaluate the orientation-aware mode")
+    parser.add_argument("--limit", type=int, default=None, help="evaluate only the first images")
+    parser.add_argument("--no-preload", action="store_true", help="load the models in every worker instead of forking")
+    parser.add_argument("--trace-folder", default="traces", help="folder for the Chrome traces")
+    parser.add_argument("--trace-sample-rate", type=float, default=0.0, help="fraction of the images to trace")
+    parser.add_argument("--trace-threshold-ms", type=float, default=None, help="trace every image slower than this")
+    parser.add_argument("--output", default="evaluation.json", help="JSON file for summary and per-image scores")
+    args = parser.parse_args()
+
+    summary, scores = evaluate(args.dataset, args.processes, args.orientation, args.limit,
+                               preload=not args.no_preload,
+                               trace={"folder": args.trace_folder, "sample_rate": args.trace_sample_rate,
+                                      "threshold_ms": args.trace_threshold_ms})
+    print(f"{summary['images']} images ({summary['failed']} failed), {summary['images_per_second']:.2f} images/s")
+    print(f"date exact match {summary['date_exact_match']:.3f}, total exact match "
+          f"{summary['total_exact_match']:.3f}, CER {summary['cer']:.3f}")
+    for stage, latency in summary["latency"].items():
+        print(f"{stage}: mean {latency['mean_ms']:.1f} ms, median {latency['median_ms']:.1f} ms, "
+              f"p95 {latency['p95_ms']:.1f} ms")
+
+    with open(args.output, "w") as f:
+        json.dump({"summary": summary, "images": scores}, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import re
+import numpy as np
+
+"""
+Extraction of the date and the total amount from the OCR result of a receipt ([[box, (text, confidence)], ...]).
+It needs no model, so it can be checked on the text boxes of generated receipts (see extraction_check.py)
+and run again on stored OCR lines (see results_store.py).
+"""
+
+
+def extractDate(result, verbose=True):
+    """
+    Regex to match dates
+    return: the unique dates in the order they were found
+    """
+    # allowing for optional concatenated times
+    date_regex = r'\b(\d{1,2}[./-]\d{1,2}[./-]\d{2,4})(?:\s*\d{2}:\d{2})?'
+    extracted_dates = []
+    # Iterate through OCR results
+    for block in result:
+        if isinstance(block, list) and len(block) == 2:
+            text_block = block[1]  # Expecting the OCR text to be here
+            if isinstance(text_block, tuple) and len(text_block) > 0:
+                text, confidence = text_block
+                # Search for the regex pattern with capturing group
+                matches = re.findall(date_regex, text)
+                if matches:
+                    if verbose:
+                        print(f"Date found in the text: {matches} | Full block: {text}")
+                    extracted_dates.extend(matches)
+                elif verbose:
+                    print(f"No date found in the text: {text}")
+        elif verbose:
+            print("Unexpected block structure encountered.")
+
+    # Deduplicate dates if necessary, keeping the order of the receipt
+    extracted_unique_dates = list(dict.fromkeys(extracted_dates))
+
+    if verbose:
+        print("Extracted Dates:", extracted_unique_dates)
+    return extracted_unique_dates
+
+# Markers of the total, by priority: the total itself, the payment of the total, the currency next to it
+total_markers = [
+    (3, re.compile(r'\b(zu zahlen|summe|total|gesamt\w*|betrag)\b')),
+    (2, re.compile(r'\b(ec-karte|ec-cash|kartenzahlung)\b')),
+    (1, re.compile(r'^(eur|euro|€)$')),
+]
+# Lines about the tax or the change, not the total
+not_total = re.compile(r'mwst|netto|steuer|rückgeld')
+# An amount as printed, optionally with the currency and followed by a tax class (e.g. "14,71 EUR A")
+amount_regex = re.compile(r'[\s:€]*(?:eur|euro)?[\s:€]*(-?\d[\d.,]*[.,]\d{2})\s*(?:€|eur|euro)?\s*[ab*]?')
+
+
+def _text_boxes(result, verbose=True):
+    # (x_min, y_min, x_max, y_max, text, confidence) of every well-formed OCR line
+    boxes = []
+    for block in result:
+        if isinstance(block, (list, tuple)) and len(block) == 2 and isinstance(block[1], tuple) \
+                and len(block[1]) == 2 and isinstance(block[1][0], str):
+            points = np.asarray(block[0], dtype=np.float32).reshape(-1, 2)
+            boxes.append((*points.min(axis=0), *points.max(axis=0), block[1][0].strip(), float(block[1][1])))
+        elif verbose:
+            print(f"Unexpected item structure encountered: {block}")
+    return boxes
+
+
+def group_rows(boxes, min_overlap=0.5):
+    """
+    Group text boxes (x_min, y_min, x_max, y_max, ...) into rows of the receipt.
+    One sweep over the boxes sorted by their top: a box joins the current row if it overlaps the row vertically by at
+    least min_overlap of the smaller height, otherwise it starts a new row. O(n log n) for the sort.
+
+    return: list of rows from top to bottom, each a list of boxes from left to right
+    """
+    rows = []
+    row_top = row_bottom = None
+    for box in sorted(boxes, key=lambda box: box[1]):
+        height = box[3] - box[1]
+        if rows:
+            overlap = min(row_bottom, box[3]) - max(row_top, box[1])
+            if overlap >= min_overlap * min(height, row_bottom - row_top):
+                rows[-1].append(box)
+                # The row keeps the extent of its first box, a tall box does not swallow the next row
+                continue
+        rows.append([box])
+        row_top, row_bottom = box[1], box[3]
+    return [sorted(row, key=lambda box: box[0]) for row in rows]
+
+
+def _normalize(text):
+    # Markers are compared case-insensitively, OCR output mixes "SUMME", "Summe" and "summe"
+    return ' '.join(text.casefold().split())
+
+
+def _marker(text):
+    """
+    return: priority of the strongest total marker in the text (0 if none) and the text after it
+    """
+    text = _normalize(text)
+    if not_total.search(text):
+        return 0, ''
+    found = [(priority, match) for priority, marker in total_markers for match in [marker.search(text)] if match]
+    if not found:
+        return 0, ''
+    priority, match = max(found, key=lambda item: item[0])
+    return priority, text[match.end():]
+
+
+def _amount(text):
+    # The amount if the whole text is one, like the original amount regex (^[\d,.]+\d{2}$)
+    match = amount_regex.fullmatch(_normalize(text))
+    return match.group(1) if match else None
+
+
+def extractTotal(result, verbose=True):
+    """
+    Layout-aware extraction of the total amount.
+    The OCR boxes are grouped into rows, a marker box ("Summe", "zu zahlen", "EC-Karte", "EUR", ...) is paired with
+    an amount in the marker box itself (like "Summe EUR 14,71") or else the rightmost amount to its right on the same
+    row (the gross column of a tax table row).
+    The candidates are ranked by the priority of the marker, the confidence of both boxes and the position
+    (totals are printed in the lower part of the receipt).
+
+    return: the unique amounts, best candidate first
+    """
+    boxes = _text_boxes(result, verbose)
+    if not boxes:
+        if verbose:
+            print("Extracted Total Amounts:", [])
+        return []
+    top = min(box[1] for box in boxes)
+    height = max(max(box[3] for box in boxes) - top, 1.0)
+
+    candidates = []
+    for row in group_rows(boxes):
+        for index, marker in enumerate(row):
+            priority, rest = _marker(marker[4])
+            if not priority:
+                continue
+            if verbose:
+                print(f"Currency marker found: {marker[4]}")
+            # The amount in the marker box itself, after the marker text, or else the rightmost amount of the row:
+            # in a table row like "Gesamtbetrag | Netto | Steuer | Brutto" the nearest amount is the net amount,
+            # the total is in the last column
+            pairs = [(marker, _amount(rest))]
+            if pairs[0][1] is None:
+                pairs = [(box, amount) for box in row[index + 1:] for amount in [_amount(box[4])] if amount][-1:]
+            for box, amount in pairs:
+                position = (box[3] - top) / height
+                score = priority + 0.5 * marker[5] * box[5] + 0.25 * position
+                candidates.append((score, amount))
+                if verbose:
+                    print(f"Amount found following currency marker: {amount} (score {score:.2f})")
+
+    # Best candidate first, an amount found by several markers keeps its best rank
+    extracted_amounts = list(dict.fromkeys(amount for _, amount in sorted(candidates, key=lambda c: -c[0])))
+
+    # Display the extracted total amounts
+    if verbose:
+        print("Extracted Total Amounts:", extracted_amounts)
+    return extracted_amounts
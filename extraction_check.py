@@ -0,0 +1,75 @@
+import argparse
+import glob
+import os
+import random
+import sys
+
+from evaluate_pipeline import normalize_amount, normalize_date
+from extraction import extractDate, extractTotal
+
+"""
+Regression check of the date and total extraction on the store templates of the receipt generator.
+Every template renders a number of seeded receipts, their exact text boxes are fed to extractDate/extractTotal
+as a perfect OCR result would be, and the first extracted values are compared with the ground truth.
+Without OCR errors every template has to reach 100%: a miss is a bug of the extraction rules
+(e.g. the net amount of the tax table of the REWE template taken as the total).
+
+Usage: python extraction_check.py [--samples 50] [--seed 0] [--min-accuracy 1.0]
+Exits with 1 if a template is below --min-accuracy.
+"""
+
+generator_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'receipt_generator')
+
+
+def ocr_result(image):
+    # The text boxes of a rendered receipt in PaddleOCR's format, with full confidence
+    return [[[[x0, y0], [x1, y0], [x1, y1], [x0, y1]], (text, 1.0)]
+            for text, (x0, y0, x1, y1) in image.info['text_boxes']]
+
+
+def check_template(template_file, samples=50, seed=0):
+    """
+    return: fraction of receipts with the right date and total, and the wrong ones (truth, extracted dates/amounts)
+    """
+    from receipt_template import ReceiptGenerator
+
+    generator = ReceiptGenerator(template_file)
+    correct = 0
+    failures = []
+    for index in range(samples):
+        random.seed(seed * 1000003 + index)
+        result = ocr_result(generator.render())
+        truth = generator.fields()
+        dates = extractDate(result, verbose=False)
+        amounts = extractTotal(result, verbose=False)
+        if dates and normalize_date(dates[0]) == truth['date'] and \
+                amounts and normalize_amount(amounts[0]) == truth['total']:
+            correct += 1
+        else:
+            failures.append({'truth': truth, 'dates': dates, 'amounts': amounts})
+    return correct / samples, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the extraction rules on the text of generated receipts.")
+    parser.add_argument("--samples", type=int, default=50, help="receipts per template")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the receipts")
+    parser.add_argument("--min-accuracy", type=float, default=1.0, help="accuracy every template has to reach")
+    args = parser.parse_args()
+
+    # The templates refer to their fonts relative to the generator folder
+    sys.path.insert(0, generator_folder)
+    os.chdir(generator_folder)
+    ok = True
+    for template_file in sorted(glob.glob(os.path.join('templates', '*.json'))):
+        accuracy, failures = check_template(template_file, args.samples, args.seed)
+        ok = ok and accuracy >= args.min_accuracy
+        print(f"{template_file}: {accuracy:.2%}")
+        for failure in failures[:3]:
+            print(f"  truth {failure['truth']}, dates {failure['dates']}, amounts {failure['amounts']}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
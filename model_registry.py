@@ -0,0 +1,245 @@
+import argparse
+import gc
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+"""
+This module loads the models of the pipeline once and shares them between worker processes.
+- the NanoDet network is traced with TorchScript and frozen (batch norm folded into the convolutions) on the first
+  start, the artifact is cached in .model_cache/ and later starts load it instead of parsing the config, building
+  the model and mapping the .pth checkpoint onto it. The artifact is rebuilt when the config, the checkpoint or the
+  torch version changes.
+- ModelRegistry.preload() loads the detector and the OCR models in the parent process, ModelRegistry.pool() then
+  forks the workers: they start without loading anything and share the weights copy-on-write.
+  The parent must not run inference before forking (OpenMP and MKLDNN thread pools do not survive a fork),
+  this is why the artifact is traced in a separate process.
+- the Paddle inference models are already compiled static graphs, they are loaded as they are.
+
+Usage:
+    python model_registry.py --compile              (build the detector artifact ahead of time, e.g. in the image build)
+    python model_registry.py --workers 4            (startup time and memory of fork-after-load and per-worker loading)
+"""
+
+cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.model_cache')
+
+
+def _checkpoint_path(model_path):
+    return model_path + "/model_best/nanodet_model_best.pth"
+
+
+def artifact_path(config_path, model_path, folder=cache_dir):
+    """
+    Path of the traced detector for a config and a checkpoint
+    """
+    import torch
+
+    stamp = hashlib.sha1()
+    with open(config_path, "rb") as f:
+        stamp.update(f.read())
+    checkpoint = os.stat(_checkpoint_path(model_path))
+    stamp.update(f"{os.path.abspath(_checkpoint_path(model_path))}:{checkpoint.st_size}:{checkpoint.st_mtime_ns}"
+                 f":{torch.__version__}".encode("utf-8"))
+    return os.path.join(folder, f"nanodet-{stamp.hexdigest()[:16]}.pt")
+
+
+def compile_nanodet(config_path, model_path, folder=cache_dir):
+    """
+    Trace and freeze the NanoDet network and save it as TorchScript artifact.
+    return: the artifact path
+    """
+    import torch
+    from pipeline import load_nanodet_model
+
+    path = artifact_path(config_path, model_path, folder)
+    predictor = load_nanodet_model(config_path, model_path)
+    # The validation pipeline warps every image to the input size, the traced shapes are the only ones used
+    width, height = predictor.cfg.data.val.input_size
+    example = torch.zeros(1, 3, height, width, device=predictor.device)
+    with torch.no_grad():
+        traced = torch.jit.freeze(torch.jit.trace(predictor.model.eval(), example, check_trace=False))
+
+    os.makedirs(folder, exist_ok=True)
+    # Write and rename, workers starting at the same time never load a half-written file
+    torch.jit.save(traced, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+class _CompiledModel():
+    """
+    Stands in for the NanoDet model in Predictor: the traced network and the head for the box decoding
+    """
+    def __init__(self, network, head):
+        self.network = network
+        self.head = head
+
+    def inference(self, meta):
+        import torch
+
+        with torch.no_grad():
+            preds = self.network(meta["img"])
+            return self.head.post_process(preds, meta)
+
+
+def load_compiled_nanodet(config_path, model_path, folder=cache_dir):
+    """
+    NanoDet Predictor running the traced network, same interface as pipeline.load_nanodet_model
+    """
+    import torch
+    from nanodet.util import cfg, load_config
+    from nanodet.model.head import build_head
+    from nanodet.data.transform import Pipeline
+    from demo.demo import Predictor
+
+    path = artifact_path(config_path, model_path, folder)
+    if not os.path.exists(path):
+        # Tracing runs the network, keep its thread pools out of a process that may fork workers later
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            executor.submit(compile_nanodet, config_path, model_path, folder).result()
+
+    load_config(cfg, config_path)
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    # The head has no trained weights used by post_process, building it alone is cheap
+    head = build_head(cfg.model.arch.head).eval()
+
+    # Predictor's preprocessing and inference are reused, only its model is replaced
+    predictor = Predictor.__new__(Predictor)
+    predictor.cfg = cfg
+    predictor.device = device
+    predictor.model = _CompiledModel(torch.jit.load(path, map_location=device), head)
+    predictor.pipeline = Pipeline(cfg.data.val.pipeline, cfg.data.val.keep_ratio)
+    return predictor
+
+
+def fork_available():
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+class ModelRegistry():
+    """
+    Loads every model of the pipeline once.
+
+    detector: "nanodet" (traced artifact), "nanodet-eager" (config + checkpoint) or "opencv"
+    ocr_options: arguments of pipeline.load_ocr, including the Paddle settings of the profile
+    """
+    def __init__(self, detector="nanodet", ocr_options=None, folder=cache_dir):
+        self.detector_name = detector
+        self.ocr_options = dict(ocr_options or {})
+        self.folder = folder
+        self._detector = None
+        self._ocr = None
+
+    def detector(self):
+        if self._detector is None:
+            import pipeline
+
+            if self.detector_name == "nanodet":
+                self._detector = load_compiled_nanodet(pipeline.config_path, pipeline.model_path, self.folder)
+            elif self.detector_name == "nanodet-eager":
+                self._detector = pipeline.load_detector("nanodet")
+            else:
+                self._detector = pipeline.load_detector(self.detector_name)
+        return self._detector
+
+    def ocr(self):
+        if self._ocr is None:
+            import pipeline
+            from tracing import instrument_ocr
+
+            self._ocr = instrument_ocr(pipeline.load_ocr(**self.ocr_options))
+        return self._ocr
+
+    def preload(self):
+        """
+        Load all models and move everything allocated so far out of the garbage collector's reach,
+        so the collector in the forked workers does not touch (and copy) the shared pages
+        """
+        self.detector()
+        self.ocr()
+        gc.collect()
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+        return self
+
+    def pool(self, processes, initializer=None, initargs=()):
+        """
+        Pool of worker processes forked after preload(), they inherit the loaded models
+        """
+        if self._detector is None or self._ocr is None:
+            self.preload()
+        return multiprocessing.get_context("fork").Pool(processes, initializer=initializer, initargs=initargs)
+
+
+def _memory_mb():
+    # Proportional set size: shared pages are split between the processes sharing them, RSS counts them fully
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+_registry = None
+
+
+def _startup_worker(detector, ocr_options, started):
+    # Load the models unless they were inherited from the parent
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry(detector, ocr_options).preload()
+    _startup_worker.ready = time.perf_counter() - started
+
+
+def _startup_report(_):
+    time.sleep(0.2)  # keep the worker busy, so every worker gets one task
+    return os.getpid(), _startup_worker.ready, _memory_mb()
+
+
+def measure_startup(workers, detector="nanodet", ocr_options=None, fork=True):
+    """
+    Seconds until the pool is ready and per-worker startup seconds and PSS in MB
+    """
+    global _registry
+    started = time.perf_counter()
+    if fork:
+        _registry = ModelRegistry(detector, ocr_options).preload()
+        pool = _registry.pool(workers, _startup_worker, (detector, ocr_options, started))
+    else:
+        _registry = None
+        pool = multiprocessing.get_context("spawn").Pool(workers, _startup_worker, (detector, ocr_options, started))
+    with pool:
+        reports = dict((pid, (ready, memory)) for pid, ready, memory in pool.map(_startup_report, range(workers * 4)))
+    return time.perf_counter() - started, list(reports.values())
+
+
+def main():
+    import pipeline
+
+    parser = argparse.ArgumentParser(description="Build the detector artifact or measure the worker startup.")
+    parser.add_argument("--compile", action="store_true", help="only build the traced detector artifact")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes for the startup measurement")
+    parser.add_argument("--detector", choices=["nanodet", "nanodet-eager", "opencv"], default="nanodet")
+    args = parser.parse_args()
+
+    if args.compile:
+        print(f"Detector artifact written to {compile_nanodet(pipeline.config_path, pipeline.model_path)}")
+        return
+
+    ocr_options = pipeline.apply_profile(pipeline.load_profile())
+    modes = [("spawn + load per worker", False)] + ([("fork after load", True)] if fork_available() else [])
+    for name, fork in modes:
+        seconds, workers = measure_startup(args.workers, args.detector, ocr_options, fork)
+        print(f"{name}: pool ready after {seconds:.2f} s, worker startup "
+              f"{max(ready for ready, _ in workers):.2f} s, PSS per worker "
+              f"{sum(memory for _, memory in workers) / len(workers):.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
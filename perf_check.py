@@ -0,0 +1,194 @@
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import numpy as np
+
+"""
+This script is a performance regression gate for the pipeline and the receipt generator.
+It runs a short benchmark of the pipeline stages (detection, deskew with rotate_image, OCR, extraction) on a fixed
+set of images and of the generator stages (receipt_generator/benchmark.py with a fixed seed), then compares the
+time per stage and the peak memory with a baseline file. Every stage has a tolerance; the script exits with 1 and
+prints a table of all stages when a stage got slower or is missing, or the memory grew past its budget.
+
+Usage:
+    python perf_check.py --update    (record the baseline on the reference machine and commit perf_baseline.json)
+    python perf_check.py             (compare with the baseline)
+"""
+
+DEFAULT_TOLERANCE = 0.2
+DEFAULT_MEMORY_TOLERANCE = 0.1
+# Stages faster than this are dominated by timer noise, they may vary by this much in any case
+DEFAULT_SLACK_MS = 1.0
+
+generator_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "receipt_generator")
+
+
+def measure_pipeline(images, repeat=3, config=None):
+    """
+    Median milliseconds of every pipeline stage over all images and the peak memory of the process in MB
+    """
+    import pipeline
+    from model_registry import ModelRegistry
+
+    # Measure with the tuned settings of the machine and the models loaded like the pipeline runs in production
+    config = dict(pipeline.apply_profile(pipeline.load_profile()), **(config or {}))
+    orientation = config.pop("orientation", False)
+    deskew = config.pop("deskew", True)
+    registry = ModelRegistry(config.pop("detector", "nanodet"), config)
+    predictor = registry.detector()
+    ocr = registry.ocr()
+
+    timings = {}
+    with tempfile.TemporaryDirectory() as folder:
+        output_path = os.path.join(folder, "")
+        # Warm up: the first inference allocates buffers and is not representative
+        pipeline.process_receipt(predictor, ocr, images[0], output_path, orientation, verbose=False, deskew=deskew)
+        for _ in range(repeat):
+            for image_path in images:
+                output = pipeline.process_receipt(predictor, ocr, image_path, output_path, orientation,
+                                                  verbose=False, deskew=deskew)
+                for stage, seconds in output["timings"].items():
+                    timings.setdefault(f"pipeline.{stage}", []).append(seconds * 1000)
+
+    stages = {stage: float(np.median(values)) for stage, values in timings.items()}
+    # ru_maxrss is in kilobytes on Linux
+    return stages, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure_generator(samples=64, seed=0):
+    """
+    Mean milliseconds per sample of every generator stage and the peak memory growth of the worker in MB
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        output = os.path.join(folder, "benchmark.json")
+        subprocess.run([sys.executable, "benchmark.py", "--samples", str(samples), "--workers", "1",
+                        "--seed", str(seed), "--output", output],
+                       cwd=generator_folder, check=True, stdout=subprocess.DEVNULL)
+        with open(output) as f:
+            result = json.load(f)["results"][0]
+    stages = {f"generator.{stage}": ms for stage, ms in result["stage_ms_per_sample"].items()}
+    return stages, max(result["peak_memory_mb"])
+
+
+def compare(baseline, stages, memory):
+    """
+    Baseline entries of a measured part (pipeline or generator, see the keys of memory) that were not measured fail,
+    e.g. a stage that was renamed or no longer reports its time.
+
+    return: list of table rows (name, baseline, current, change, allowed change, ok) and whether all are ok
+    """
+    rows = []
+    for stage in sorted(set(stages) | set(baseline["stages"])):
+        reference = baseline["stages"].get(stage)
+        current = stages.get(stage)
+        if reference is None:
+            rows.append((stage, None, current, None, None, True))
+            continue
+        if current is None:
+            if stage.split(".")[0] in memory:
+                rows.append((stage, reference["ms"], None, None, None, False))
+            continue
+        tolerance = reference.get("tolerance", baseline.get("tolerance", DEFAULT_TOLERANCE))
+        slack = reference.get("slack_ms", baseline.get("slack_ms", DEFAULT_SLACK_MS))
+        limit = reference["ms"] * (1 + tolerance) + slack
+        rows.append((stage, reference["ms"], current, current / reference["ms"] - 1 if reference["ms"] else 0.0,
+                     tolerance, current <= limit))
+
+    memory_baseline = baseline.get("memory_mb", {})
+    for part in sorted(set(memory) | set(memory_baseline)):
+        reference = memory_baseline.get(part)
+        current = memory.get(part)
+        if reference is None:
+            rows.append((f"memory.{part}", None, current, None, None, True))
+            continue
+        if current is None:
+            # The part was skipped (--skip-pipeline or --skip-generator)
+            continue
+        tolerance = reference.get("tolerance", baseline.get("memory_tolerance", DEFAULT_MEMORY_TOLERANCE))
+        budget = reference.get("budget_mb", reference["mb"] * (1 + tolerance))
+        rows.append((f"memory.{part}", reference["mb"], current, current / reference["mb"] - 1,
+                     budget / reference["mb"] - 1, current <= budget))
+    return rows, all(row[-1] for row in rows)
+
+
+def format_table(rows):
+    lines = [f"{'stage':<28}{'baseline':>12}{'current':>12}{'change':>10}{'allowed':>10}  status"]
+    for name, reference, current, change, allowed, ok in rows:
+        unit = "MB" if name.startswith("memory.") else "ms"
+        lines.append(
+            f"{name:<28}"
+            f"{'-' if reference is None else f'{reference:.1f} {unit}':>12}"
+            f"{'-' if current is None else f'{current:.1f} {unit}':>12}"
+            f"{'-' if change is None else f'{change:+.1%}':>10}"
+            f"{'-' if allowed is None else f'{allowed:+.0%}':>10}"
+            f"  {'ok' if ok else 'MISSING' if current is None else 'REGRESSION'}"
+            f"{'' if reference is not None else ' (new)'}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the pipeline and generator stages against a baseline.")
+    parser.add_argument("--baseline", default="perf_baseline.json", help="baseline file")
+    parser.add_argument("--update", action="store_true", help="write the measured values as the new baseline")
+    parser.add_argument("--images", default="receipt_generator/output/images",
+                        help="folder with the images for the pipeline stages")
+    parser.add_argument("--image-count", type=int, default=5, help="number of images for the pipeline stages")
+    parser.add_argument("--repeat", type=int, default=3, help="runs over the pipeline images")
+    parser.add_argument("--config", default=None, help="JSON file with the pipeline configuration (as in sweep.py)")
+    parser.add_argument("--samples", type=int, default=64, help="generator samples")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generator samples")
+    parser.add_argument("--skip-pipeline", action="store_true", help="only check the generator")
+    parser.add_argument("--skip-generator", action="store_true", help="only check the pipeline")
+    args = parser.parse_args()
+
+    stages = {}
+    memory = {}
+    if not args.skip_pipeline:
+        images = sorted(glob.glob(os.path.join(args.images, "*")))[:args.image_count]
+        if not images:
+            parser.error(f"no images in {args.images}")
+        config = None
+        if args.config:
+            with open(args.config) as f:
+                config = json.load(f)
+        pipeline_stages, memory["pipeline"] = measure_pipeline(images, args.repeat, config)
+        stages.update(pipeline_stages)
+    if not args.skip_generator:
+        generator_stages, memory["generator"] = measure_generator(args.samples, args.seed)
+        stages.update(generator_stages)
+
+    if args.update:
+        # Keep the tolerances of an existing baseline, only the measured values are replaced
+        baseline = {"tolerance": DEFAULT_TOLERANCE, "memory_tolerance": DEFAULT_MEMORY_TOLERANCE,
+                    "slack_ms": DEFAULT_SLACK_MS, "stages": {}, "memory_mb": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        for stage, ms in stages.items():
+            baseline["stages"].setdefault(stage, {})["ms"] = round(ms, 2)
+        for part, mb in memory.items():
+            baseline["memory_mb"].setdefault(part, {})["mb"] = round(mb, 1)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        parser.error(f"{args.baseline} not found, record it with --update")
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    rows, ok = compare(baseline, stages, memory)
+    print(format_table(rows))
+    if not ok:
+        print("Performance regression: at least one stage is slower, uses more memory than allowed or is missing")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,19 +4,28 @@ import cv2
 from PIL import Image
 import torch
 from paddleocr import PaddleOCR,draw_ocr
-import re
 import os
+import argparse
+import time
+import json
 import numpy as np
+from tracing import span
+from extraction import extractDate, extractTotal
+from quality import check_quality, measure_quality, quality_thresholds, threshold_image
 
 """
 This script provides the complete pipeline to extracts date and amount from given receipt image by following these steps:
 - load nanodet model to detect receipts and return bounding boxes which has the highest score
 - crop the detected receipts from last step
 - rotate the cropped receipts based on the detected orientation of the longest vertical line in the image ( if the longest vertical line falls within the specified angle range for vertical lines)
+  or, in orientation mode (--orientation), straighten the receipt from its 4 corners in one perspective warp
 - send the results to the custom OCR pipeline (DB + CRNN)
 - extract  date and total amount from the output of OCR according to the determined REGEX
+  (the total from the rows of the receipt: an amount to the right of a marker like "Summe" or "zu zahlen")
 - ouput the matched date and total amount
 * in each step, the result images will be saved and used in the next step
+The thread and batch settings of the models are read at startup from pipeline_profile.json (written by autotune.py) if it exists.
+With --trace, the stages of the image are written as Chrome trace (see tracing.py).
 """
 
 def load_nanodet_model(config_path, model_path):
@@ -29,23 +38,88 @@ def load_nanodet_model(config_path, model_path):
     predictor = Predictor(cfg, model_path + "/model_best/nanodet_model_best.pth", logger, device=device)
     return predictor
 
+def detect_receipt_with_opencv(image):
+    """
+    image: test images
+
+    The function apply basic image processing approach using openCV to extract receipt (from nanodet_vs_opencv.ipynb)
+
+    return: None if there isn't any approximate contour with length = 4, otherwise return the coordinates of extract lagest extract contour
+    """
+    resize_ratio = 500 / image.shape[0]
+    image = cv2.resize(image, (int(image.shape[1] * resize_ratio), int(image.shape[0] * resize_ratio)),
+                       interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    rectKernel = cv2.getStructuringElement(cv2.MORPH_RECT, (9, 9))
+    dilated = cv2.dilate(blurred, rectKernel)
+    edged = cv2.Canny(dilated, 100, 200, apertureSize=3)
+    contours, hierarchy = cv2.findContours(edged, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    largest_contours = sorted(contours, key=cv2.contourArea, reverse=True)[:5]
+
+    receipt_contour = None
+    for contour in largest_contours:
+        approx = cv2.approxPolyDP(contour, 0.032 * cv2.arcLength(contour, True), True)
+        if len(approx) == 4:
+            receipt_contour = approx
+            break
+
+    if receipt_contour is None:
+        return None
+
+    (tl, tr, br, bl) = order_corners(receipt_contour) / resize_ratio
+    x_min = min(tl[0], bl[0])
+    y_min = min(tl[1], tr[1])
+    x_max = max(tr[0], br[0])
+    y_max = max(bl[1], br[1])
+    return int(x_min), int(y_min), int(x_max), int(y_max)
+
+class OpenCVDetector():
+    """
+    Contour-based receipt detector with the same inference interface as NanoDet's Predictor
+    """
+    def inference(self, image):
+        # Like Predictor, the image is a path or an already decoded BGR array
+        box = detect_receipt_with_opencv(cv2.imread(image) if isinstance(image, str) else image)
+        detections = [] if box is None else [[*box, 1.0]]
+        return {}, {0: {0: detections}}
+
+def load_detector(detector="nanodet"):
+    # Receipt detector: the fine-tuned NanoDet model or the OpenCV contour approach
+    if detector == "opencv":
+        return OpenCVDetector()
+    return load_nanodet_model(config_path, model_path)
+
 def perform_object_detection(predictor, image_path):
     # Perform object detection using NanoDet
-    meta, res = predictor.inference(image_path)
+    with span("detection") as attributes:
+        meta, res = predictor.inference(image_path)
+        attributes["boxes"] = len(res[0][0])
     return res
 
-def extract_object_with_highest_score(image_path, detection_results, output_path):
+def detection_with_highest_score(detection_results):
     # Extract the detection results from the dictionary
     detections = detection_results[0][0]  # Assuming res is a dictionary with the structure {0: {0: ...}}
 
     # Find the index of the object with the highest confidence score
     max_score_index = max(range(len(detections)), key=lambda i: detections[i][4])
+    return detections[max_score_index]
+
+def read_image(image):
+    """
+    The image of a path, or a copy of an already decoded BGR array (e.g. from an archive, see archive_input.py),
+    the box drawn on it must not change the caller's array
+    """
+    return cv2.imread(image) if isinstance(image, str) else image.copy()
 
+def extract_object_with_highest_score(image_path, detection_results, output_path):
     # Extract the bounding box coordinates and confidence score of the object with the highest score
-    x_min, y_min, x_max, y_max, _ = detections[max_score_index]
+    x_min, y_min, x_max, y_max = detection_with_highest_score(detection_results)[:4]
 
     # Load the input image
-    image = cv2.imread(image_path)
+    with span("decode") as attributes:
+        image = read_image(image_path)
+        attributes.update(width=image.shape[1], height=image.shape[0])
 
     # Extract the detected object from the image
     detected_object = image[int(y_min):int(y_max), int(x_min):int(x_max)]
@@ -56,111 +130,128 @@ def extract_object_with_highest_score(image_path, detection_results, output_path
 
     return detected_object
 
-def extractDate(result):
-    """
-    Regex to match dates
-    """
-    # allowing for optional concatenated times
-    date_regex = r'\b(\d{1,2}[./-]\d{1,2}[./-]\d{2,4})(?:\s*\d{2}:\d{2})?'
-    extracted_dates = []
-    # Iterate through OCR results
-    for block in result:
-        if isinstance(block, list) and len(block) == 2:
-            text_block = block[1]  # Expecting the OCR text to be here
-            if isinstance(text_block, tuple) and len(text_block) > 0:
-                text, confidence = text_block
-                # Search for the regex pattern with capturing group
-                matches = re.findall(date_regex, text)
-                if matches:
-                    print(f"Date found in the text: {matches} | Full block: {text}")
-                    extracted_dates.extend(matches)
-                else:
-                    print(f"No date found in the text: {text}")
-        else:
-            print("Unexpected block structure encountered.")
-
-    # Deduplicate dates if necessary
-    extracted_unique_dates = list(set(extracted_dates))
-
-    print("Extracted Dates:", extracted_unique_dates)
-
-def extractTotal(result):
-    """
-    Regex to match an amount
-    """
-    amount_regex = r'(^[\d,.]+\d{2}$)'
-
-    extracted_amounts = []
-    prev_was_eur = False  # Flag indicating the preceding item was "EUR" or "EURO"
-
-    for idx in range(len(result)):
-        for item in result[idx][1:]:
-            if isinstance(item, tuple) and len(item) == 2:
-                text, confidence = item  # Unpacking the item
-                
-                if isinstance(text, str):  # Ensure the text is indeed a string
-                    # Normalize the text to upper case for comparison
-                    text_upper = text.strip().upper()
-                    
-                    # Check if the current item is specific keys
-                    if text_upper in ("EUR", "EURO", "zu zahlen","Summe(EUR)","Total",
-                                      "EC-Karte","EC-Cash","Betrag EUR","Summe €"):
-                        print(f"Currency marker found: {text}")
-                        prev_was_eur = True
-
-                    # If the previous item was specific keys and the current matches the amount pattern
-                    elif prev_was_eur and re.match(amount_regex, text.strip()):
-                        extracted_amount = text.strip()
-                        print(f"Amount found following currency marker: {extracted_amount}")
-                        extracted_amounts.append(extracted_amount)
-                        prev_was_eur = False  # Reset the flag
-                    
-                    # If current item is not an amount following specific keys
-                    else:
-                        # Only reset the flag if it was previously set; avoids unnecessary prints
-                        if prev_was_eur:
-                            print("Resetting flag; current item is neither specific keys nor an amount following it.")
-                        prev_was_eur = False
-                else:
-                    print(f"Encountered non-string text: {text}")
-            else:
-                print(f"Unexpected item structure encountered: {item}")
+def order_corners(points):
+    """
+    Order 4 points clockwise from top-left (valid for receipts rotated by less than 45 degrees)
+    """
+    points = np.asarray(points, dtype=np.float32).reshape(4, 2)
+    sums = points.sum(axis=1)
+    diffs = points[:, 1] - points[:, 0]
+    return np.array([points[np.argmin(sums)], points[np.argmin(diffs)],
+                     points[np.argmax(sums)], points[np.argmax(diffs)]], dtype=np.float32)
+
+def estimate_receipt_corners(image, box):
+    """
+    Corners of the receipt inside a detected box, from the minimum area rectangle around the largest bright region.
+    Falls back to the corners of the box if no region is found.
+    """
+    x_min, y_min, x_max, y_max = (int(v) for v in box[:4])
+    x_min, y_min = max(x_min, 0), max(y_min, 0)
+    box_corners = np.array([[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]], dtype=np.float32)
+
+    crop = image[y_min:y_max, x_min:x_max]
+    if crop.size == 0:
+        return box_corners
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    # Receipt paper is brighter than the background around it
+    _, mask = cv2.threshold(cv2.GaussianBlur(gray, (5, 5), 0), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return box_corners
+    largest = max(contours, key=cv2.contourArea)
+    # Ignore small blobs, the receipt fills most of its box
+    if cv2.contourArea(largest) < 0.2 * crop.shape[0] * crop.shape[1]:
+        return box_corners
+    corners = cv2.boxPoints(cv2.minAreaRect(largest)) + (x_min, y_min)
+    return order_corners(corners)
+
+def straighten_receipt(image, corners):
+    """
+    Crop and deskew the receipt in one perspective warp, from its corners clockwise from top-left
+    """
+    corners = np.asarray(corners, dtype=np.float32)
+    top_left, top_right, bottom_right, bottom_left = corners
+    width = int(round(max(np.linalg.norm(top_right - top_left), np.linalg.norm(bottom_right - bottom_left))))
+    height = int(round(max(np.linalg.norm(bottom_left - top_left), np.linalg.norm(bottom_right - top_right))))
+    target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(corners, target)
+    return cv2.warpPerspective(image, matrix, (width, height), flags=cv2.INTER_CUBIC)
+
+def extract_straightened_object(image_path, detection_results, output_path):
+    """
+    Orientation-aware alternative to extract_object_with_highest_score and rotate_image.
+    A detector trained on the oriented ground truth of the receipt generator returns the 4 corners
+    after the score (x_min, y_min, x_max, y_max, score, x1, y1, ... x4, y4), plain boxes get their
+    corners estimated from the image.
+    """
+    detection = detection_with_highest_score(detection_results)
+    image = read_image(image_path)
+
+    if len(detection) >= 13:
+        corners = order_corners(detection[5:13])
+    else:
+        corners = estimate_receipt_corners(image, detection)
+    straightened = straighten_receipt(image, corners)
+
+    # Save the image with the oriented box
+    cv2.polylines(image, [np.rint(corners).astype(np.int32)], True, (0, 255, 0), 2)
+    cv2.imwrite(output_path+'image_with_bounding_box.png', image)
 
-    # If you're aiming to keep unique, non-repeated matches
-    extracted_amounts = list(set(extracted_amounts))
+    return straightened
 
-    # Display the extracted total amounts
-    print("Extracted Total Amounts:", extracted_amounts)
+def assess_quality(image, thresholds):
+    # Quality of a crop that does not go through rotate_image
+    with span("quality") as attributes:
+        metrics = measure_quality(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+        reason = check_quality(metrics, thresholds)
+        attributes.update(metrics, reason=reason)
+    return {"metrics": metrics, "reason": reason}
 
-def rotate_image(image_path, output_folder):
+def rotate_image(image_path, output_folder, verbose=True, quality=None):
     """
     Rotate detected receipts from object detection 
+    quality: limits of the quality gate (see quality.quality_thresholds), the crop is measured on the thresholded images
+        of the rotation and a failed crop is neither rotated nor saved
+
+    return: the quality metrics and the reason of the rejection (None if the crop passed)
     """
     # Read the image
-    original_image = cv2.imread(image_path)
+    with span("rotate.decode") as attributes:
+        original_image = cv2.imread(image_path)
+        attributes.update(width=original_image.shape[1], height=original_image.shape[0])
     rotated_image = original_image
 
-    # Convert the image to grayscale
-    gray = cv2.cvtColor(original_image, cv2.COLOR_BGR2GRAY)
-
-    # Apply Gaussian blur to reduce noise
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-
-    # Apply adaptive thresholding
-    adaptive_thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 25, 4)
+    with span("rotate.threshold"):
+        gray, adaptive_thresh = threshold_image(original_image)
+
+    # The quality measures reuse the grayscale image
+    metrics = reason = None
+    if quality:
+        with span("quality") as attributes:
+            metrics = measure_quality(gray)
+            reason = check_quality(metrics, quality)
+            attributes.update(metrics, reason=reason)
+    if reason is not None:
+        if verbose:
+            print(f"{image_path} rejected: {reason} {metrics}")
+        return {"metrics": metrics, "reason": reason}
 
     # Use morphological operations to remove noise and enhance lines
-    kernel = np.ones((5, 5), np.uint8)
-    opening = cv2.morphologyEx(adaptive_thresh, cv2.MORPH_OPEN, kernel)
+    with span("rotate.morphology"):
+        kernel = np.ones((5, 5), np.uint8)
+        opening = cv2.morphologyEx(adaptive_thresh, cv2.MORPH_OPEN, kernel)
 
     # Detect lines using Probabilistic Hough Transform
-    lines = cv2.HoughLinesP(opening, 1, np.pi / 180, threshold=100, minLineLength=100, maxLineGap=10)
+    with span("rotate.hough") as attributes:
+        lines = cv2.HoughLinesP(opening, 1, np.pi / 180, threshold=100, minLineLength=100, maxLineGap=10)
+        attributes["lines"] = 0 if lines is None else len(lines)
 
     # Initialize variables to store the longest vertical line
     max_length = 0
     longest_line = None
     if lines is None:
-        print(image_path + "fail to rotate")
+        if verbose:
+            print(image_path + "fail to rotate")
     else:
         # Find the longest vertical line
         for line in lines:
@@ -182,51 +273,195 @@ def rotate_image(image_path, output_folder):
                 rotation_matrix = cv2.getRotationMatrix2D(center, 90+angle_from_vertical, 1.0)  # Negative angle to rotate clockwise
             else:
                 rotation_matrix = cv2.getRotationMatrix2D(center, angle_from_vertical-90, 1.0)  # Negative angle to rotate clockwise
-            rotated_image = cv2.warpAffine(original_image, rotation_matrix, (w, h), flags=cv2.INTER_CUBIC)# , borderMode=cv2.BORDER_REPLICATE
+            with span("rotate.warp", angle=float(angle_from_vertical)):
+                rotated_image = cv2.warpAffine(original_image, rotation_matrix, (w, h), flags=cv2.INTER_CUBIC)# , borderMode=cv2.BORDER_REPLICATE
             
     # Save the rotated image with the original filename
     filename = os.path.basename(image_path)
     output_path = os.path.join(output_folder, 'rotated_'+filename)
-    print(output_path)
-    cv2.imwrite(output_path, rotated_image)
+    if verbose:
+        print(output_path)
+    with span("rotate.encode"):
+        cv2.imwrite(output_path, rotated_image)
+    return {"metrics": metrics, "reason": None}
 
 
 config_path = '/Users/local_admin/Desktop/thesis/object_detection/nanodet/nanodet_custom_xml_dataset.yml'
 model_path = '/Users/local_admin/Desktop/thesis/object_detection/trained_detectors/nanodet/trained_nano_det_1500_combined_to_real'
 image_path = '/Users/local_admin/Desktop/thesis/data/prediction/IMG_1822.jpg'
 output_path= '/Users/local_admin/Desktop/thesis/data/prediction/'
+# Thread and batch settings for the local machine, written by autotune.py
+profile_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipeline_profile.json')
 
 
-# Object Detection
-predictor = load_nanodet_model(config_path, model_path)
-detection_results = perform_object_detection(predictor, image_path)
-detected_object = extract_object_with_highest_score(image_path, detection_results,output_path)
-cv2.imwrite(output_path + 'detected_object.jpg', detected_object)
-
-# Rotate Image if necessary
-rotate_image(output_path + 'detected_object.jpg', output_path)
-
+def load_profile(path=profile_path):
+    """
+    The tuned settings, an empty profile (library defaults) if the file does not exist
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
 
-# Text Recognition and Text detection
-ocr = PaddleOCR(use_angle_cls=True,
-                rec_model_dir='/Users/local_admin/Desktop/thesis/ppocr/inference/crnn_real',
-                det_model_dir='/Users/local_admin/Desktop/thesis/ppocr/inference/db_combi/Student',
-                rec_char_dict_path='/Users/local_admin/Desktop/thesis/PaddleOCR/ppocr/utils/dict/german_dict.txt',
-                ocr_version='PP-OCRv2',
-                use_gpu=False,
-                show_log=False,
-                lang="german")
 
-result = ocr.ocr(output_path + 'rotated_detected_object.jpg', cls=False)[0]
+def apply_profile(profile):
+    """
+    Set the thread counts of torch (NanoDet) and OpenCV for this process.
+    return: the PaddleOCR options of the profile (cpu_threads, enable_mkldnn, rec_batch_num)
+    """
+    if profile.get("torch_threads"):
+        torch.set_num_threads(profile["torch_threads"])
+    if profile.get("opencv_threads") is not None:
+        cv2.setNumThreads(profile["opencv_threads"])
+    return dict(profile.get("paddle", {}))
 
-# draw result
-image = Image.open(output_path + 'rotated_detected_object.jpg').convert('RGB')
-boxes = [line[0] for line in result]
-txts = [line[1][0] for line in result]
-scores = [line[1][1] for line in result]
-im_show = draw_ocr(image, boxes, txts, scores, font_path='/Users/local_admin/Desktop/thesis/receipt_generator/fonts/Arial.TTF')
-im_show = Image.fromarray(im_show)
-im_show.save(output_path + '/predicted.jpg')
 
-extractDate(result)
-extractTotal(result)
+def load_ocr(det_model_dir='/Users/local_admin/Desktop/thesis/ppocr/inference/db_combi/Student',
+             rec_model_dir='/Users/local_admin/Desktop/thesis/ppocr/inference/crnn_real',
+             **options):
+    """
+    Text detection (DB by default, det_algorithm="EAST" for EAST) and text recognition (CRNN) models.
+    options: further PaddleOCR arguments, e.g. det_limit_side_len for the OCR input size
+    """
+    options = dict(dict(use_angle_cls=True,
+                        rec_char_dict_path='/Users/local_admin/Desktop/thesis/PaddleOCR/ppocr/utils/dict/german_dict.txt',
+                        ocr_version='PP-OCRv2',
+                        use_gpu=False,
+                        show_log=False,
+                        lang="german"), **options)
+    return PaddleOCR(det_model_dir=det_model_dir, rec_model_dir=rec_model_dir, **options)
+
+
+def _rejected(reason, metrics, timings):
+    # Early result of an image failing the quality gate, the reason is machine-readable
+    return {"result": [], "dates": [], "amounts": [], "timings": timings,
+            "rejected": {"reason": reason, "metrics": metrics}}
+
+def process_receipt(predictor, ocr, image_path, output_path, orientation=False, verbose=True, deskew=True,
+                    detection_results=None, quality=None):
+    """
+    Run all pipeline stages on one image.
+    image_path: path of the image or the decoded BGR array
+    deskew: rotate the cropped receipt with rotate_image, False passes the crop to the OCR as it is
+    detection_results: detections of the image in the format of the predictor, skips the detection stage
+        (e.g. a box tracked over video frames, see stream.py)
+    quality: limits of the quality gate (see quality.quality_thresholds), None sends every image to the OCR
+
+    return: dict with the OCR result, the extracted dates and amounts and the seconds spent
+        in every stage (detection, deskew, ocr, extraction). Images failing the quality gate return early with
+        "rejected": {"reason": no_receipt, low_detection_score, too_dark, overexposed, no_text, blurry or noisy,
+        "metrics": {...}}
+    """
+    timings = {}
+
+    # Object Detection
+    start = time.perf_counter()
+    if detection_results is None:
+        detection_results = perform_object_detection(predictor, image_path)
+    timings["detection"] = time.perf_counter() - start
+
+    if quality:
+        detections = detection_results[0][0]
+        if not len(detections):
+            return _rejected("no_receipt", {"detection_score": 0.0}, timings)
+        score = float(detection_with_highest_score(detection_results)[4])
+        if score < quality.get("min_detection_score", 0.0):
+            return _rejected("low_detection_score", {"detection_score": score}, timings)
+
+    start = time.perf_counter()
+    assessment = None
+    if orientation:
+        # Crop and deskew in one step, no Hough line search needed
+        with span("crop", orientation=True):
+            straightened = extract_straightened_object(image_path, detection_results, output_path)
+        if quality:
+            assessment = assess_quality(straightened, quality)
+        if assessment is None or assessment["reason"] is None:
+            cv2.imwrite(output_path + 'rotated_detected_object.jpg', straightened)
+    else:
+        with span("crop") as attributes:
+            detected_object = extract_object_with_highest_score(image_path, detection_results,output_path)
+            attributes.update(width=detected_object.shape[1], height=detected_object.shape[0])
+        if deskew:
+            cv2.imwrite(output_path + 'detected_object.jpg', detected_object)
+
+            # Rotate Image if necessary
+            with span("rotate_image"):
+                assessment = rotate_image(output_path + 'detected_object.jpg', output_path, verbose, quality)
+        else:
+            if quality:
+                assessment = assess_quality(detected_object, quality)
+            if assessment is None or assessment["reason"] is None:
+                cv2.imwrite(output_path + 'rotated_detected_object.jpg', detected_object)
+    timings["deskew"] = time.perf_counter() - start
+
+    if assessment is not None and assessment["reason"] is not None:
+        return _rejected(assessment["reason"], assessment["metrics"], timings)
+
+    # Text Recognition and Text detection
+    start = time.perf_counter()
+    # PaddleOCR returns None instead of an empty list when no text is found
+    with span("ocr") as attributes:
+        result = ocr.ocr(output_path + 'rotated_detected_object.jpg', cls=False)[0] or []
+        attributes["lines"] = len(result)
+    timings["ocr"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with span("extraction") as attributes:
+        dates = extractDate(result, verbose)
+        amounts = extractTotal(result, verbose)
+        attributes.update(dates=len(dates), amounts=len(amounts))
+    timings["extraction"] = time.perf_counter() - start
+
+    return {"result": result, "dates": dates, "amounts": amounts, "timings": timings}
+
+
+def main(image_path, output_path, orientation=False, detector="nanodet", trace=False, store=None, quality=None):
+    from model_registry import ModelRegistry
+
+    # The registry loads the traced NanoDet artifact, which is faster to start than config + checkpoint
+    registry = ModelRegistry(detector, apply_profile(load_profile()))
+    predictor = registry.detector()
+    ocr = registry.ocr()
+
+    from tracing import trace_request
+
+    with trace_request(os.path.basename(image_path), output_path, sample_rate=1.0 if trace else 0.0):
+        output = process_receipt(predictor, ocr, image_path, output_path, orientation, quality=quality)
+    result = output["result"]
+
+    if store:
+        from results_store import ResultsStore
+
+        with ResultsStore(store) as results:
+            results.add(output, image_path)
+
+    if "rejected" in output:
+        print(json.dumps({"image": image_path, "rejected": output["rejected"]}))
+        return
+
+    # draw result
+    image = Image.open(output_path + 'rotated_detected_object.jpg').convert('RGB')
+    boxes = [line[0] for line in result]
+    txts = [line[1][0] for line in result]
+    scores = [line[1][1] for line in result]
+    im_show = draw_ocr(image, boxes, txts, scores, font_path='/Users/local_admin/Desktop/thesis/receipt_generator/fonts/Arial.TTF')
+    im_show = Image.fromarray(im_show)
+    im_show.save(output_path + '/predicted.jpg')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract date and total amount from a receipt photo.")
+    parser.add_argument("image_path", nargs="?", default=image_path, help="receipt photo")
+    parser.add_argument("--output", default=output_path, help="folder for the intermediate and result images")
+    parser.add_argument("--orientation", action="store_true",
+                        help="straighten the receipt from its corners in one warp instead of the Hough-based rotation")
+    parser.add_argument("--detector", choices=["nanodet", "nanodet-eager", "opencv"], default="nanodet",
+                        help="receipt detector (nanodet-eager: build NanoDet from config and checkpoint)")
+    parser.add_argument("--trace", action="store_true", help="write the stages as Chrome trace JSON to the output folder")
+    parser.add_argument("--store", default=None, help="SQLite file to keep the OCR lines and results in")
+    parser.add_argument("--quality-gate", action="store_true",
+                        help="do not send blurry, dark or receipt-free images to the OCR")
+    args = parser.parse_args()
+    main(args.image_path, os.path.join(args.output, ''), args.orientation, args.detector, args.trace, args.store,
+         quality_thresholds if args.quality_gate else None)
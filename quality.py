@@ -0,0 +1,78 @@
+import cv2
+import numpy as np
+
+"""
+Quality gate of the pipeline: sharpness, exposure and text density of a receipt crop and the limits an image has to
+pass before it is sent to the OCR. It needs no model, so the limits can be checked on generated receipts
+(see quality_check.py).
+"""
+
+# Limits of the quality gate, an image failing one of them is not sent to the OCR. The gate is opt-in.
+# Sharpness is the variance of the Laplacian of the crop scaled to a width of quality_width pixels (independent of the
+# resolution), the paper level the 95th and the ink level the 1st percentile of its gray values (0-255): a dark photo
+# has no bright paper, a washed-out one no dark ink, while a clean white receipt with many clipped pixels passes.
+# Text density is the fraction of dark pixels after an adaptive threshold of the scaled crop (no text on blank or background crops,
+# too much on noise). The limits separate the rendered templates of the receipt generator at 436 to 2600 pixels
+# height from their blurred, darkened, washed-out and blank copies, see quality_check.py.
+quality_width = 400
+quality_thresholds = {
+    "min_detection_score": 0.35,
+    "min_sharpness": 25.0,
+    "min_paper_level": 80.0,
+    "max_ink_level": 200.0,
+    "min_text_density": 0.005,
+    "max_text_density": 0.5,
+}
+
+
+def threshold_image(image):
+    """
+    Grayscale and inverted adaptive threshold (text and lines white) of a receipt crop
+    """
+    # Convert the image to grayscale
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    # Apply Gaussian blur to reduce noise
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+
+    # Apply adaptive thresholding
+    adaptive_thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 25, 4)
+    return gray, adaptive_thresh
+
+
+def measure_quality(gray, width=quality_width):
+    """
+    Sharpness, exposure and text density of the grayscale crop of threshold_image
+    """
+    # All measures on the crop scaled to a fixed width (the sharpness as in stream.sharpness), so they do not depend
+    # on the resolution of the crop
+    scale = width / gray.shape[1]
+    small = cv2.resize(gray, (width, max(1, int(round(gray.shape[0] * scale)))), interpolation=cv2.INTER_AREA)
+    ink_level, paper_level = np.percentile(small, [1, 95])
+    binary = cv2.adaptiveThreshold(cv2.GaussianBlur(small, (3, 3), 0), 255, cv2.ADAPTIVE_THRESH_MEAN_C,
+                                   cv2.THRESH_BINARY_INV, 15, 4)
+    return {
+        "sharpness": float(cv2.Laplacian(small, cv2.CV_64F).var()),
+        "paper_level": float(paper_level),
+        "ink_level": float(ink_level),
+        "text_density": float(np.count_nonzero(binary)) / binary.size,
+    }
+
+
+def check_quality(metrics, thresholds):
+    """
+    return: the reason ("too_dark", "no_text", "blurry", "overexposed", "noisy") of the first failed limit or None
+    """
+    # A blank crop is reported as no_text, not as blurry. Blur also lightens thin ink, so a blurry crop is reported
+    # as blurry before its ink level is checked, only sharp washed-out crops are overexposed
+    checks = [
+        ("too_dark", "paper_level", "min_paper_level", lambda value, limit: value < limit),
+        ("no_text", "text_density", "min_text_density", lambda value, limit: value < limit),
+        ("blurry", "sharpness", "min_sharpness", lambda value, limit: value < limit),
+        ("overexposed", "ink_level", "max_ink_level", lambda value, limit: value > limit),
+        ("noisy", "text_density", "max_text_density", lambda value, limit: value > limit),
+    ]
+    for reason, metric, limit, failed in checks:
+        if thresholds.get(limit) is not None and failed(metrics[metric], thresholds[limit]):
+            return reason
+    return None
@@ -0,0 +1,86 @@
+import argparse
+import glob
+import os
+import random
+import sys
+import cv2
+import numpy as np
+
+from quality import check_quality, measure_quality, quality_thresholds
+
+"""
+Check of the quality gate limits (quality.quality_thresholds) on the store templates of the receipt generator.
+Every template renders seeded receipts, as clean render and as photo-like copy (gray paper, sensor noise), at several
+heights. Every copy has to pass the gate, its blurred, darkened, washed-out and blank variants have to be rejected
+for the matching reason, so the limits do not depend on the resolution of the crop.
+
+Usage: python quality_check.py [--samples 5] [--seed 0] [--heights 436 1300 2600]
+Exits with 1 if a receipt is rejected or a variant gets the wrong reason.
+"""
+
+generator_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'receipt_generator')
+
+
+def variants(image, rng):
+    """
+    Readable copy of a rendered receipt and its degraded variants with the reason the gate has to give them
+    """
+    photo = np.clip(image.astype(np.float32) * 0.8 + 20 + rng.normal(0, 4, image.shape), 0, 255).astype(np.uint8)
+    for copy in (image, photo):
+        yield copy, None
+        # Strong blur also lightens the ink, it must still be reported as blurry and not as overexposed
+        for sigma in (2.5, 3.5):
+            yield cv2.GaussianBlur(copy, (0, 0), sigma * copy.shape[0] / 436), "blurry"
+        yield (copy * 0.2).astype(np.uint8), "too_dark"
+        yield np.clip(copy * 0.25 + 200, 0, 255).astype(np.uint8), "overexposed"
+        yield np.full_like(copy, int(copy.mean())), "no_text"
+
+
+def check_template(template_file, samples=5, seed=0, heights=(436, 1300, 2600)):
+    """
+    return: number of checked images and the wrong ones (height, expected reason, reason, metrics)
+    """
+    from receipt_template import ReceiptGenerator
+
+    generator = ReceiptGenerator(template_file)
+    rng = np.random.default_rng(seed)
+    checked = 0
+    failures = []
+    for index in range(samples):
+        random.seed(seed * 1000003 + index)
+        image = cv2.cvtColor(np.array(generator.render().convert('RGB')), cv2.COLOR_RGB2BGR)
+        for height in heights:
+            width = int(round(image.shape[1] * height / image.shape[0]))
+            scaled = cv2.resize(image, (width, height), interpolation=cv2.INTER_CUBIC)
+            for variant, expected in variants(scaled, rng):
+                metrics = measure_quality(cv2.cvtColor(variant, cv2.COLOR_BGR2GRAY))
+                reason = check_quality(metrics, quality_thresholds)
+                checked += 1
+                if reason != expected:
+                    failures.append((height, expected, reason, metrics))
+    return checked, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the quality gate limits on generated receipts.")
+    parser.add_argument("--samples", type=int, default=5, help="receipts per template")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the receipts")
+    parser.add_argument("--heights", type=int, nargs="+", default=[436, 1300, 2600], help="crop heights in pixels")
+    args = parser.parse_args()
+
+    # The templates refer to their fonts relative to the generator folder
+    sys.path.insert(0, generator_folder)
+    os.chdir(generator_folder)
+    ok = True
+    for template_file in sorted(glob.glob(os.path.join('templates', '*.json'))):
+        checked, failures = check_template(template_file, args.samples, args.seed, args.heights)
+        ok = ok and not failures
+        print(f"{template_file}: {checked - len(failures)}/{checked} as expected")
+        for height, expected, reason, metrics in failures[:3]:
+            print(f"  height {height}: expected {expected}, got {reason} {metrics}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
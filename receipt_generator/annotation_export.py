@@ -0,0 +1,169 @@
+import json
+import os
+import numpy as np
+from PIL import Image
+
+from receipt_background_generator import receipt_angle
+
+"""
+This module provides bulk annotation export for generated images.
+Every sample is appended as one JSON line to annotations.jsonl, on close the file is streamed into
+- one COCO detection JSON (receipt boxes, for NanoDet)
+- a PaddleOCR text detection label file (text line quadrilaterals, for DB/EAST)
+- a PaddleOCR text recognition label file with the cropped text lines (for CRNN)
+Nothing is kept in memory except the current record and the ids of the samples.
+annotations.jsonl is kept, so a resumed run exports the samples of all earlier runs again together with its own.
+"""
+
+
+def text_line_keypoints(text_boxes):
+    """
+    Flatten text boxes [(text, (x0, y0, x1, y1)), ...] into an (N * 4, 2) keypoint array (clockwise corners).
+    """
+    points = []
+    for _, (x0, y0, x1, y1) in text_boxes:
+        points.extend([[x0, y0], [x1, y0], [x1, y1], [x0, y1]])
+    return np.array(points, dtype=np.float32).reshape(-1, 2)
+
+
+def _crop_quad(image, quad):
+    # Rectify a text line quadrilateral (clockwise from top-left) into an upright crop
+    width = int(round(max(np.linalg.norm(quad[1] - quad[0]), np.linalg.norm(quad[2] - quad[3]))))
+    height = int(round(max(np.linalg.norm(quad[3] - quad[0]), np.linalg.norm(quad[2] - quad[1]))))
+    # PIL's QUAD transform expects the corners in the order top-left, bottom-left, bottom-right, top-right
+    data = tuple(quad[[0, 3, 2, 1]].flatten())
+    return image.transform((max(width, 1), max(height, 1)), Image.Transform.QUAD, data,
+                           resample=Image.Resampling.BICUBIC)
+
+
+def _read_records(path):
+    # Records of annotations.jsonl, a line cut off by an interruption is skipped
+    with open(path) as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+class AnnotationExporter():
+    """
+    Streaming writer for COCO and PaddleOCR annotations.
+
+    output_folder: folder for annotations.jsonl, coco.json, det_gt.txt, rec_gt.txt and the rec/ crops
+    image_folder: prefix of the image paths written into the PaddleOCR label files
+    keep: function image_id -> bool selecting the records of earlier runs to keep (e.g. the samples in the
+        manifest, the others were exported but not saved before an interruption and are generated again);
+        None keeps all of them
+    """
+    def __init__(self, output_folder="output", image_folder="images", coco=True, paddle_det=True, paddle_rec=True,
+                 keep=None):
+        self.output_folder = output_folder
+        self.image_folder = image_folder
+        os.makedirs(output_folder, exist_ok=True)
+
+        self.coco_path = os.path.join(output_folder, "coco.json") if coco else None
+        self.det_path = os.path.join(output_folder, "det_gt.txt") if paddle_det else None
+        self.rec_path = os.path.join(output_folder, "rec_gt.txt") if paddle_rec else None
+        if paddle_rec:
+            os.makedirs(os.path.join(output_folder, "rec"), exist_ok=True)
+
+        # Rewrite the records of earlier runs without the ones to drop, cut-off lines and duplicates
+        self.records_path = os.path.join(output_folder, "annotations.jsonl")
+        self._ids = set()
+        if os.path.exists(self.records_path):
+            with open(self.records_path + ".tmp", "w") as f:
+                for record in _read_records(self.records_path):
+                    if record["id"] not in self._ids and (keep is None or keep(record["id"])):
+                        self._ids.add(record["id"])
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(self.records_path + ".tmp", self.records_path)
+        self._records = open(self.records_path, "a")
+        self._image_id = max(self._ids, default=0)
+
+    def add(self, file_name, image, box, text_lines=None, image_id=None, quad=None):
+        """
+        file_name: file name of the generated image
+        image: the generated PIL image
+        box: receipt bounding box (xmin, ymin, xmax, ymax)
+        text_lines: list of (text, quadrilateral as (4, 2) array) in image coordinates
+        image_id: stable COCO image id (e.g. sample index + 1), defaults to a running number
+        quad: optional receipt corners (4, 2) clockwise from top-left, written as COCO segmentation and angle
+        """
+        text_lines = text_lines or []
+        self._image_id += 1
+        image_id = image_id if image_id is not None else self._image_id
+        if image_id in self._ids:
+            # Already exported by an earlier run
+            return
+        self._ids.add(image_id)
+        record = {"id": image_id}
+
+        if self.coco_path is not None:
+            xmin, ymin, xmax, ymax = (int(v) for v in box)
+            record["image"] = {"id": image_id, "file_name": file_name, "width": image.width, "height": image.height}
+            annotation = {
+                "id": image_id, "image_id": image_id, "category_id": 1,
+                "bbox": [xmin, ymin, xmax - xmin, ymax - ymin], "area": (xmax - xmin) * (ymax - ymin),
+                "iscrowd": 0,
+            }
+            if quad is not None:
+                quad = np.asarray(quad, dtype=np.float64)
+                annotation["segmentation"] = [np.round(quad, 1).flatten().tolist()]
+                annotation["angle"] = round(receipt_angle(quad), 2)
+            record["annotation"] = annotation
+
+        if self.det_path is not None:
+            labels = [
+                {"transcription": text, "points": np.rint(quad).astype(int).tolist()}
+                for text, quad in text_lines
+            ]
+            record["det"] = f"{self.image_folder}/{file_name}\t{json.dumps(labels, ensure_ascii=False)}\n"
+
+        if self.rec_path is not None:
+            stem = os.path.splitext(file_name)[0]
+            record["rec"] = []
+            for number, (text, quad) in enumerate(text_lines):
+                crop_name = f"rec/{stem}_{number:03d}.png"
+                _crop_quad(image, np.asarray(quad, dtype=np.float64)).save(os.path.join(self.output_folder, crop_name))
+                record["rec"].append(f"{crop_name}\t{text}\n")
+
+        self._records.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._records.flush()
+
+    def _write(self, path, write):
+        # Label files are replaced in one step, an interrupted close leaves the previous ones
+        with open(path + ".tmp", "w") as f:
+            write(f)
+        os.replace(path + ".tmp", path)
+
+    def _write_coco(self, f):
+        f.write('{"categories": [{"id": 1, "name": "receipt"}], "images": [')
+        for key, separator in (("image", '], "annotations": ['), ("annotation", "]}\n")):
+            first = True
+            for record in _read_records(self.records_path):
+                if key in record:
+                    f.write(("" if first else ",") + json.dumps(record[key]))
+                    first = False
+            f.write(separator)
+
+    def close(self):
+        if self._records is None:
+            return
+        self._records.close()
+        self._records = None
+        # Labels of all samples in annotations.jsonl, from earlier runs too
+        if self.coco_path is not None:
+            self._write(self.coco_path, self._write_coco)
+        if self.det_path is not None:
+            self._write(self.det_path, lambda f: f.writelines(
+                record["det"] for record in _read_records(self.records_path) if "det" in record))
+        if self.rec_path is not None:
+            self._write(self.rec_path, lambda f: f.writelines(
+                line for record in _read_records(self.records_path) for line in record.get("rec", [])))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,92 @@
+from collections import OrderedDict
+import hashlib
+import os
+import numpy as np
+from PIL import Image
+
+"""
+This module provides a pool of decoded background photos.
+Every background is decoded (and optionally downscaled) once and then kept in memory,
+or in a raw .npy cache on disk that worker processes memory-map and share through the page cache.
+Samples get read-only views of the cached pixels, composite_receipt only copies them into the output image.
+"""
+
+
+class BackgroundPool():
+    """
+    backgrounds: list of background image paths
+    max_side: downscale backgrounds so their longest side is at most max_side (None keeps the original size)
+    max_items: number of decoded backgrounds kept in memory at the same time
+    cache_dir: optional folder for the memory-mapped raw cache shared across processes
+    """
+    def __init__(self, backgrounds, max_side=None, max_items=16, cache_dir=None):
+        if not backgrounds:
+            raise ValueError("no background images given")
+        self.backgrounds = list(backgrounds)
+        self.max_side = max_side
+        self.max_items = max_items
+        self.cache_dir = cache_dir
+        self._cache = OrderedDict()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self.backgrounds)
+
+    def _decode(self, path):
+        image = Image.open(path)
+        if self.max_side:
+            # Let the JPEG decoder skip resolution we would throw away anyway
+            image.draft("RGB", (self.max_side, self.max_side))
+        image = image.convert("RGB")
+        if self.max_side and max(image.size) > self.max_side:
+            scale = self.max_side / max(image.size)
+            size = (round(image.width * scale), round(image.height * scale))
+            image = image.resize(size, Image.Resampling.LANCZOS)
+        return np.asarray(image)
+
+    def _cache_path(self, path):
+        # The cache file is tied to the source file and its modification time
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}:{self.max_side}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest() + ".npy")
+
+    def _load(self, path):
+        if not self.cache_dir:
+            return self._decode(path)
+
+        cache_path = self._cache_path(path)
+        if not os.path.exists(cache_path):
+            # Write to a temporary file first so concurrent workers never map a half written cache
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, self._decode(path))
+            os.replace(tmp_path, cache_path)
+        return np.load(cache_path, mmap_mode="r")
+
+    def _get_cached(self, index):
+        path = self.backgrounds[index % len(self.backgrounds)]
+        if path in self._cache:
+            self._cache.move_to_end(path)
+        else:
+            self._cache[path] = self._load(path)
+            if len(self._cache) > self.max_items:
+                self._cache.popitem(last=False)
+        return path, self._cache[path]
+
+    def size(self, index):
+        """
+        (width, height) of the background with the given index, as it will be handed out.
+        """
+        _, pixels = self._get_cached(index)
+        return pixels.shape[1], pixels.shape[0]
+
+    def get(self, index):
+        """
+        Read-only RGB array of the background with the given index (round-robin over the backgrounds).
+        It is a view of the cached pixels, callers that change it have to copy it first.
+        """
+        _, pixels = self._get_cached(index)
+        view = pixels.view()
+        view.flags.writeable = False
+        return view
@@ -0,0 +1,170 @@
+import numpy as np
+import imgaug.augmenters as iaa
+from imgaug import multicore
+from imgaug.augmentables.batches import UnnormalizedBatch
+from imgaug.augmenters.meta import Augmenter
+from PIL import Image
+
+from receipt_background_generator import (
+    compute_max_scale_factor,
+    sample_warp_matrix,
+    transform_points,
+    warp_receipt,
+)
+
+"""
+This module provides the batched augmentation stage of the generator.
+The warp of every receipt is sampled from its own generator in the calling process, receipts are padded to a
+common bucket size and sent as batches through an imgaug Sequential, optionally on imgaug's multicore pool.
+Keypoints (e.g. receipt corners or text line boxes) are transformed with exactly the same matrix as the image.
+"""
+
+
+def _bucket_size(size, bucket):
+    # Round the receipt size up to the next multiple of bucket so similar receipts share a batch
+    width, height = size
+    return (-(-width // bucket) * bucket, -(-height // bucket) * bucket)
+
+
+class ReceiptWarp(Augmenter):
+    """
+    Perspective and affine warp of receipts as a single transform. The matrix of every receipt is sampled by the
+    caller and passed per image as warps, a list of (matrix, (width, height)) in the order of the batch, see
+    ReceiptSequential. The padding of the bucket is cut off before warping, so a receipt is warped exactly like
+    place_receipt does, no matter which batch or worker it ends up in.
+    """
+    def __init__(self, seed=None, name=None, random_state="deprecated", deterministic="deprecated"):
+        super().__init__(seed=seed, name=name, random_state=random_state, deterministic=deterministic)
+        self.warps = None
+
+    def _augment_batch_(self, batch, random_state, parents, hooks):
+        images = []
+        for row, (matrix, (width, height)) in enumerate(self.warps):
+            image_aug, matrix = warp_receipt(Image.fromarray(batch.images[row][:height, :width], 'RGBA'), matrix)
+            images.append(image_aug)
+            if batch.keypoints is not None:
+                kpsoi = batch.keypoints[row]
+                if kpsoi.keypoints:
+                    kpsoi.fill_from_xy_array_(transform_points(matrix, kpsoi.to_xy_array()))
+                kpsoi.shape = image_aug.shape
+        batch.images = images
+        return batch
+
+    def get_parameters(self):
+        return []
+
+
+class ReceiptSequential(iaa.Sequential):
+    """
+    Sequential that hands the per-image warps of an UnnormalizedBatch (batch.data["warps"]) to its ReceiptWarp
+    augmenters. imgaug does not pass batch.data on to the augmenters, this also works inside the multicore workers.
+    """
+    def augment_batch_(self, batch, parents=None, hooks=None):
+        warps = batch.data["warps"]
+        for augmenter in self.get_all_children(flat=True):
+            if isinstance(augmenter, ReceiptWarp):
+                augmenter.warps = warps
+        return super().augment_batch_(batch, parents=parents, hooks=hooks)
+
+
+def build_sequence():
+    """
+    Augmentation sequence of the receipts, batches need data={"warps": ...} (see ReceiptSequential).
+    The perspective and affine warp run as one augmenter so they are applied as a single transform.
+    """
+    return ReceiptSequential([ReceiptWarp()], random_order=False)
+
+
+class BatchAugmenter():
+    """
+    Augments receipts in batches of compatible size.
+
+    batch_size: number of receipts per imgaug batch
+    processes: number of worker processes, 1 augments in the calling process
+    seed: seed of the augmentation of receipts without their own generator, the same seed and input order give the
+        same results
+    bucket: receipts are padded to multiples of this size to form compatible batches
+    """
+    def __init__(self, batch_size=16, processes=None, seed=0, bucket=64):
+        self.batch_size = batch_size
+        self.processes = processes
+        self.seed = seed
+        self.bucket = bucket
+        self._pool = None
+        self._sequence = build_sequence()
+        self._sequence.seed_(seed)
+        self._calls = 0
+
+    def _get_pool(self):
+        # One long-lived pool, so workers are not respawned for every batch
+        if self._pool is None:
+            self._pool = multicore.Pool(self._sequence, processes=self.processes, seed=self.seed)
+        return self._pool
+
+    def augment(self, receipts, background_sizes, keypoints=None, rngs=None):
+        """
+        receipts: list of RGBA PIL images
+        background_sizes: (width, height) of the background each receipt is placed onto
+        keypoints: optional list of (N, 2) point arrays in receipt coordinates, defaults to the receipt corners
+        rngs: optional numpy Generator of every receipt (e.g. from seed_sample), its warp is drawn from it exactly
+            like place_receipt does, so the generator can be passed on to composite_receipt afterwards
+
+        return: list of (augmented RGBA array, augmented keypoints) in the order of the input
+        """
+        if keypoints is None:
+            keypoints = [
+                np.array([[0, 0], [r.width, 0], [r.width, r.height], [0, r.height]], dtype=np.float32)
+                for r in receipts
+            ]
+        if rngs is None:
+            rngs = [np.random.default_rng([self.seed, self._calls, index]) for index in range(len(receipts))]
+        self._calls += 1
+
+        # The matrices are drawn here and not in the workers, at the size of the receipt and not of its bucket
+        warps = []
+        for receipt, background_size, rng in zip(receipts, background_sizes, rngs):
+            max_scale_factor = compute_max_scale_factor(receipt.size, background_size)
+            warps.append((sample_warp_matrix(rng, receipt.width, receipt.height, max_scale_factor), receipt.size))
+
+        # Group receipts by padded size
+        groups = {}
+        for index, receipt in enumerate(receipts):
+            groups.setdefault(_bucket_size(receipt.size, self.bucket), []).append(index)
+
+        batches = []
+        for padded_size, indices in groups.items():
+            for start in range(0, len(indices), self.batch_size):
+                chunk = indices[start:start + self.batch_size]
+                images = np.zeros((len(chunk), padded_size[1], padded_size[0], 4), dtype=np.uint8)
+                for row, index in enumerate(chunk):
+                    receipt = np.asarray(receipts[index].convert('RGBA'))
+                    # Padding is added at the right/bottom, so receipt coordinates stay valid
+                    images[row, :receipt.shape[0], :receipt.shape[1]] = receipt
+                batches.append(UnnormalizedBatch(
+                    images=list(images),
+                    keypoints=[np.asarray(keypoints[index], dtype=np.float32).reshape(-1, 2) for index in chunk],
+                    data={"indices": chunk, "warps": [warps[index] for index in chunk]},
+                ))
+
+        if self.processes == 1:
+            augmented = [self._sequence.augment_batch_(batch) for batch in batches]
+        else:
+            augmented = self._get_pool().map_batches(batches)
+
+        results = [None] * len(receipts)
+        for batch in augmented:
+            for index, image_aug, keypoints_aug in zip(batch.data["indices"], batch.images_aug, batch.keypoints_aug):
+                results[index] = (image_aug, np.asarray(keypoints_aug))
+        return results
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
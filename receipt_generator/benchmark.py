@@ -0,0 +1,236 @@
+import argparse
+import collections
+import contextlib
+import glob
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import tempfile
+import time
+import numpy as np
+
+from annotation_export import AnnotationExporter, text_line_keypoints
+from background_pool import BackgroundPool
+from batch_augmentation import BatchAugmenter
+from main import find_templates, load_templates
+from manifest import sample_name, seed_sample
+from output_codec import OutputCodec
+from receipt_background_generator import annotation_xml, composite_receipt
+from receipt_template import ReceiptGenerator, _combine_all_images_vertically
+
+"""
+This script benchmarks the throughput of the generator.
+Every sample goes through the same stages as in batch mode (main.py --batch), each stage is timed separately:
+text rendering, block concatenation, augmentation, background decoding, masking/compositing,
+image encoding and annotation writing.
+The benchmark runs with 1 to N worker processes, each rendering its share of the samples in-process,
+and reports samples/sec, the mean time per stage and the peak memory of every worker as JSON (the growth over the
+start of the worker, the pages a forked worker shares with the parent are not counted).
+Like main.py it has to be run with the receipt_generator folder as working directory.
+
+Usage: python benchmark.py [--samples 200] [--workers 4] [--output output/benchmark.json]
+"""
+
+STAGES = ["render_text", "concatenate", "augment", "background", "composite", "encode", "annotate"]
+
+
+class StageTimer():
+    """
+    Accumulates the wall time spent in every stage.
+    """
+    def __init__(self):
+        self.seconds = collections.defaultdict(float)
+
+    @contextlib.contextmanager
+    def __call__(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] += time.perf_counter() - start
+
+
+def _run_batch(indices, templates, backgrounds, augmenter, codec, annotation_folder, exporter, seed, timer):
+    # Render, augment, composite, encode and annotate one batch of samples like generate_batched does
+    receipts = []
+    keypoints = []
+    text_boxes = []
+    rngs = []
+    for index in indices:
+        rngs.append(seed_sample(seed, index))
+        generator = ReceiptGenerator(templates[index % len(templates)])
+        with timer("render_text"):
+            rows = generator.render_rows()
+        with timer("concatenate"):
+            receipt = _combine_all_images_vertically(rows).convert("RGBA")
+        boxes = receipt.info.get("text_boxes", [])
+        corners = np.array([[0, 0], [receipt.width, 0], [receipt.width, receipt.height],
+                            [0, receipt.height]], dtype=np.float32)
+        receipts.append(receipt)
+        keypoints.append(np.vstack([corners, text_line_keypoints(boxes)]))
+        text_boxes.append(boxes)
+
+    # The sizes decode the backgrounds on first use, which belongs to the background stage
+    with timer("background"):
+        background_sizes = [backgrounds.size(index) for index in indices]
+    with timer("augment"):
+        augmented = augmenter.augment(receipts, background_sizes, keypoints, rngs)
+
+    for index, (image_augmented, keypoints_augmented), boxes, rng in zip(indices, augmented, text_boxes, rngs):
+        with timer("background"):
+            background = backgrounds.get(index)
+        with timer("composite"):
+            image, box, keypoints_augmented = composite_receipt(background, image_augmented, rng, keypoints_augmented)
+        with timer("encode"):
+            codec.encode(image)
+        with timer("annotate"):
+            image_output_name = sample_name(seed, index, codec.extension)
+            stem = os.path.splitext(image_output_name)[0]
+            xml = annotation_xml(image_output_name, image_output_name, image.width, image.height, 3, *box)
+            with open(os.path.join(annotation_folder, stem + ".xml"), "w") as f:
+                f.write(xml)
+            if exporter is not None:
+                quads = keypoints_augmented[4:].reshape(-1, 4, 2)
+                exporter.add(image_output_name, image, box,
+                             [(text, quad) for (text, _), quad in zip(boxes, quads)], image_id=index + 1)
+
+
+def _worker(worker_id, num_workers, options, start_barrier, results):
+    # A forked worker starts with the pages of the parent, ru_maxrss (kilobytes on Linux) counts them too
+    start_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    templates = load_templates(find_templates())
+    backgrounds = BackgroundPool(sorted(glob.glob(os.path.join("backgrounds", "*"))),
+                                 max_side=options["background_max_side"])
+    codec = OutputCodec(options["format"], png_compress_level=options["png_compress_level"])
+    seed = options["seed"]
+
+    with tempfile.TemporaryDirectory() as annotation_folder, \
+            BatchAugmenter(batch_size=options["batch_size"], processes=1, seed=seed) as augmenter:
+        exporter = AnnotationExporter(annotation_folder) if options["export"] else None
+
+        # Warm up outside of the measurement: compile the templates, load the fonts and build the augmenters
+        _run_batch([options["samples"] + worker_id], templates, backgrounds, augmenter, codec,
+                   annotation_folder, exporter, seed, StageTimer())
+
+        # Worker k renders samples k, k + num_workers, ... so every worker count renders the same samples
+        indices = list(range(worker_id, options["samples"], num_workers))
+        timer = StageTimer()
+        start_barrier.wait()
+        start = time.perf_counter()
+        for batch_start in range(0, len(indices), options["batch_size"]):
+            _run_batch(indices[batch_start:batch_start + options["batch_size"]], templates, backgrounds,
+                       augmenter, codec, annotation_folder, exporter, seed, timer)
+        seconds = time.perf_counter() - start
+        if exporter is not None:
+            exporter.close()
+
+    results.put({
+        "worker": worker_id,
+        "samples": len(indices),
+        "seconds": seconds,
+        "stages": dict(timer.seconds),
+        # Growth of the peak memory over the start of the worker, without the pages inherited from the parent
+        "peak_memory_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - start_memory,
+        "start_memory_mb": start_memory,
+    })
+
+
+def run(num_workers, options, timeout=1800):
+    """
+    Generate options["samples"] samples with num_workers worker processes.
+    timeout: seconds the workers may take at most, also for the warm-up before the common start
+
+    return: dict with samples/sec, mean milliseconds per sample of every stage and the per-worker results
+    """
+    # A worker that dies during the warm-up breaks the barrier instead of blocking the others forever
+    start_barrier = multiprocessing.Barrier(num_workers, timeout=timeout)
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_worker, args=(worker_id, num_workers, options, start_barrier, results))
+        for worker_id in range(num_workers)
+    ]
+    for process in processes:
+        process.start()
+    deadline = time.monotonic() + timeout
+    workers = []
+    try:
+        while len(workers) < num_workers:
+            try:
+                workers.append(results.get(timeout=1.0))
+            except queue.Empty:
+                failed = [process.exitcode for process in processes if process.exitcode not in (None, 0)]
+                if failed:
+                    raise RuntimeError(f"{len(failed)} of {num_workers} benchmark worker(s) failed "
+                                       f"(exit codes {failed})")
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"benchmark with {num_workers} worker(s) took longer than {timeout} s")
+    finally:
+        for process in processes:
+            if len(workers) < num_workers and process.is_alive():
+                process.terminate()
+            process.join()
+    workers.sort(key=lambda result: result["worker"])
+
+    samples = sum(worker["samples"] for worker in workers)
+    # All workers start together, the slowest one determines the wall time
+    seconds = max(worker["seconds"] for worker in workers)
+    return {
+        "workers": num_workers,
+        "samples": samples,
+        "seconds": seconds,
+        "samples_per_second": samples / seconds,
+        "stage_ms_per_sample": {
+            stage: 1000 * sum(worker["stages"].get(stage, 0) for worker in workers) / samples
+            for stage in STAGES
+        },
+        "peak_memory_mb": [worker["peak_memory_mb"] for worker in workers],
+        "per_worker": workers,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the throughput of the receipt generator.")
+    parser.add_argument("--samples", type=int, default=200, help="samples generated for every worker count")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="run with 1 to this many worker processes")
+    parser.add_argument("--batch-size", type=int, default=16, help="receipts per augmentation batch")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the samples")
+    parser.add_argument("--format", choices=["png", "jpg", "npy"], default="png", help="output image format")
+    parser.add_argument("--png-compress-level", type=int, default=6, help="zlib level of PNG outputs (0-9)")
+    parser.add_argument("--background-max-side", type=int, default=None,
+                        help="downscale backgrounds to this longest side once when they are decoded")
+    parser.add_argument("--export", action="store_true",
+                        help="also time writing COCO and PaddleOCR det/rec labels")
+    parser.add_argument("--output", default="output/benchmark.json", help="JSON file for the results")
+    parser.add_argument("--timeout", type=float, default=1800,
+                        help="seconds a worker count may take at most before the benchmark fails")
+    args = parser.parse_args()
+
+    options = {
+        "samples": args.samples,
+        "batch_size": args.batch_size,
+        "seed": args.seed,
+        "format": args.format,
+        "png_compress_level": args.png_compress_level,
+        "background_max_side": args.background_max_side,
+        "export": args.export,
+    }
+
+    results = []
+    for num_workers in range(1, args.workers + 1):
+        result = run(num_workers, options, args.timeout)
+        results.append(result)
+        stages = ", ".join(f"{stage} {ms:.1f} ms" for stage, ms in result["stage_ms_per_sample"].items())
+        print(f"{num_workers} worker(s): {result['samples_per_second']:.1f} samples/s, "
+              f"peak memory growth per worker {max(result['peak_memory_mb']):.0f} MB ({stages})")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"options": options, "cpu_count": os.cpu_count(), "results": results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import glob
+import multiprocessing
+import os
+import queue
+import numpy as np
+
+from background_pool import BackgroundPool
+from main import find_templates, load_templates
+from manifest import seed_sample
+from receipt_background_generator import place_receipt
+from receipt_template import ReceiptGenerator
+
+"""
+This module provides an endless stream of synthetic training samples, without writing image files.
+Worker processes render and augment receipts ahead of time and hand them over through a bounded queue,
+so training (e.g. NanoDet or CRNN fine-tuning) can consume fresh receipts directly.
+Like main.py it has to be used with the receipt_generator folder as working directory (fonts, templates, backgrounds).
+
+Example:
+    for image, bbox, text_lines in SyntheticReceipts(seed=0, num_workers=4):
+        ...
+"""
+
+
+def render_sample(templates, backgrounds, seed, index):
+    """
+    Render sample number index of the stream with the given seed.
+
+    return: (RGB image array, (xmin, ymin, xmax, ymax), list of text lines on the receipt)
+    """
+    rng = seed_sample(seed, index)
+    generator = ReceiptGenerator(templates[index % len(templates)])
+    receipt = generator.render().convert("RGBA")
+    image, box, _ = place_receipt(backgrounds.get(index), receipt, rng)
+    return np.asarray(image), box, list(generator.receipt_text_data)
+
+
+def _worker(worker_id, num_workers, seed, background_files, background_max_side, background_cache,
+            samples, stop, limit=None):
+    templates = load_templates(find_templates())
+    backgrounds = BackgroundPool(background_files, max_side=background_max_side, cache_dir=background_cache)
+
+    # Worker k renders samples k, k + num_workers, ... so the workers never produce the same sample
+    index = worker_id
+    while not stop.is_set() and (limit is None or index < limit):
+        sample = render_sample(templates, backgrounds, seed, index)
+        while not stop.is_set():
+            try:
+                samples.put(sample, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        index += num_workers
+
+
+class SyntheticReceipts():
+    """
+    Iterable over (image array, bbox, text lines) samples.
+
+    seed: the same seed gives the same samples, with several workers in the order they are finished
+    num_workers: number of prefetching worker processes, 0 renders in the iterating process
+    prefetch: maximum number of finished samples waiting in the queue
+    limit: stop after this many samples (None for an endless stream), always the samples 0 to limit - 1
+    timeout: seconds to wait for the next sample while the workers are alive (None waits as long as they run)
+    """
+    def __init__(self, seed=0, num_workers=2, prefetch=32, limit=None,
+                 background_folder="backgrounds", background_max_side=None, background_cache=None, timeout=None):
+        self.seed = seed
+        self.num_workers = num_workers
+        self.prefetch = prefetch
+        self.limit = limit
+        self.background_files = sorted(glob.glob(os.path.join(background_folder, "*")))
+        self.background_max_side = background_max_side
+        self.background_cache = background_cache
+        self.timeout = timeout
+        self._processes = []
+        self._stop = None
+
+    def _iter_in_process(self):
+        templates = load_templates(find_templates())
+        backgrounds = BackgroundPool(self.background_files, max_side=self.background_max_side,
+                                     cache_dir=self.background_cache)
+        index = 0
+        while self.limit is None or index < self.limit:
+            yield render_sample(templates, backgrounds, self.seed, index)
+            index += 1
+
+    def __iter__(self):
+        if self.num_workers == 0:
+            yield from self._iter_in_process()
+            return
+
+        samples = multiprocessing.Queue(maxsize=self.prefetch)
+        self._stop = multiprocessing.Event()
+        self._processes = [
+            multiprocessing.Process(
+                target=_worker,
+                args=(worker_id, self.num_workers, self.seed, self.background_files,
+                      self.background_max_side, self.background_cache, samples, self._stop, self.limit),
+                daemon=True,
+            )
+            for worker_id in range(self.num_workers)
+        ]
+        for process in self._processes:
+            process.start()
+
+        try:
+            count = 0
+            while self.limit is None or count < self.limit:
+                yield self._next_sample(samples)
+                count += 1
+        finally:
+            self._stop.set()
+            # Drain the queue so the workers can flush their pending puts and exit
+            while any(process.is_alive() for process in self._processes):
+                try:
+                    samples.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self.close()
+
+    def _next_sample(self, samples):
+        # Wait for the next sample, but not for a worker that died (bad background, killed for memory)
+        waited = 0.0
+        while True:
+            try:
+                return samples.get(timeout=1.0)
+            except queue.Empty:
+                waited += 1.0
+            failed = [process.exitcode for process in self._processes if process.exitcode not in (None, 0)]
+            if failed:
+                raise RuntimeError(f"{len(failed)} of {len(self._processes)} sample worker(s) failed "
+                                   f"(exit codes {failed})")
+            if not any(process.is_alive() for process in self._processes):
+                # The last samples may still have been on their way when the get above timed out
+                try:
+                    return samples.get(timeout=1.0)
+                except queue.Empty:
+                    raise RuntimeError("the sample workers stopped before all samples were rendered") from None
+            if self.timeout is not None and waited >= self.timeout:
+                raise TimeoutError(f"no sample within {self.timeout} s")
+
+    def close(self):
+        if self._stop is not None:
+            self._stop.set()
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
@@ -1,70 +1,205 @@
-import sys
 import os
 import glob
-import datetime
+import argparse
+import functools
+
+from manifest import Manifest, parse_part, sample_indices, sample_name, seed_sample
 
 def get_background(backgrounds, index):
     # Get the background filename in a round-robin fashion
     return backgrounds[index % len(backgrounds)]
 
-def call_scripts(number_of_calls):
-    # Define the folders containing the script files and backgrounds
-    script_folder = "scripts"
+def call_scripts(number_of_calls, seed=0, part=(0, 1), manifest_path="output/manifest.jsonl", extension="png",
+                 png_compress_level=6, jpeg_quality=90):
+    # Define the folder containing the backgrounds
     background_folder = "backgrounds"
 
-    # Get all Python script files from the script folder
-    script_files = glob.glob(os.path.join(script_folder, "*.py"))
+    # Get all store templates
+    template_files = find_templates()
 
     # Get all background files from the background folder
-    backgrounds = glob.glob(os.path.join(background_folder, "*"))
+    backgrounds = sorted(glob.glob(os.path.join(background_folder, "*")))
+
+    with Manifest(manifest_path, seed) as manifest:
+        # Templates are assigned round-robin, so exactly number_of_calls images are generated
+        for index in sample_indices(number_of_calls, part):
+            if index in manifest:
+                continue
+
+            template_file = template_files[index % len(template_files)]
+            background = get_background(backgrounds, index)
+            # The extension selects the output codec of receipt_background_generator.py
+            image_name = sample_name(seed, index, extension)
+
+            # Render the receipt, then place it onto the background, both seeded by (seed, index) like in batch mode
+            if os.system(f"python receipt_template.py {template_file} {seed} {index}") != 0 or \
+                    os.system(f"python receipt_background_generator.py {background} {image_name} {seed} {index} "
+                              f"--png-compress-level {png_compress_level} --jpeg-quality {jpeg_quality}") != 0:
+                print(f"Error: Image {index + 1}/{number_of_calls} could not be created")
+                continue
+
+            manifest.record(index, template=template_file, background=background, file=image_name)
+            print(f"Image {index + 1}/{number_of_calls} erfolgreich erstellt")
 
-    # Calculate the number of scripts
-    num_scripts = len(script_files)
+def find_templates(template_folder="templates"):
+    # All store templates, sorted so the round-robin assignment is the same on every machine
+    return sorted(path for pattern in ("*.json", "*.yml", "*.yaml")
+                  for path in glob.glob(os.path.join(template_folder, pattern)))
 
-    # Determine the number of scripts to call based on the number of calls
-    scripts_to_call = min(number_of_calls, num_scripts)
+def load_templates(template_files):
+    # Compile the store templates once so receipts can be rendered in-process
+    from receipt_template import load_template
+    return [load_template(template_file) for template_file in template_files]
 
-    # Calculate the number of calls per script
-    calls_per_script = max(number_of_calls // scripts_to_call, 1)
+def generate_batched(number_of_images, batch_size=16, processes=None, seed=0,
+                     background_max_side=None, background_cache=None, shard_folder=None, shard_size=1000,
+                     export=False, part=(0, 1), manifest_path="output/manifest.jsonl",
+                     codec=None, encoder_threads=2):
+    """
+    Generate images in-process and augment the receipts in batches on imgaug's multicore pool.
+    Backgrounds are decoded once through a BackgroundPool.
+    With shard_folder the samples are packed into tar shards instead of loose files.
+    With export the text line boxes are transformed along with the receipts and written as
+    COCO and PaddleOCR det/rec labels to output/.
+    The same seed produces the same images; samples already in the manifest are skipped.
+    Images are encoded with codec (PNG by default) on encoder_threads background threads.
+    """
+    import contextlib
+    import numpy as np
+    from annotation_export import AnnotationExporter, text_line_keypoints
+    from background_pool import BackgroundPool
+    from batch_augmentation import BatchAugmenter
+    from output_codec import AsyncEncoder, OutputCodec
+    from receipt_background_generator import composite_receipt, save_sample
+    from receipt_template import ReceiptGenerator
+    from shards import ShardWriter
 
-    # Initialize the index to track the current background
-    background_index = 0
+    template_files = find_templates()
+    backgrounds = BackgroundPool(sorted(glob.glob(os.path.join("backgrounds", "*"))),
+                                 max_side=background_max_side, cache_dir=background_cache)
+    templates = load_templates(template_files)
 
-    # Iterate over each script file and call it the appropriate number of times
-    for i in range(scripts_to_call):
-        # Get the script file
-        script_file = script_files[i]
+    # Render enough receipts per round to keep every worker busy with full batches
+    chunk_size = batch_size * (processes or os.cpu_count() or 1)
 
-        # Check if the script file exists
-        if not os.path.exists(script_file):
-            print(f"Error: Script file '{script_file}' not found.")
-            return
+    manifest = Manifest(manifest_path, seed)
+    remaining = [index for index in sample_indices(number_of_images, part) if index not in manifest]
+    # Packed samples only count as done once their shard is complete
+    pending = {}
 
-        for x in range(calls_per_script):        
-            # Get the background filename
-            background = get_background(backgrounds, background_index)
+    def record_shard(keys):
+        for key in keys:
+            manifest.record(**pending.pop(key))
 
-            # Call the script with the background filename as an argument
-            timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-            image_name = f"IMG_{timestamp}.png"
-            os.system(f"python {script_file}")
-            os.system(f"python receipt_background_generator.py {background} {image_name}")
-            # Increment the background index
-            background_index += 1
-            print(f"Image {background_index}/{number_of_calls} erfolgreich erstellt")
+    shard_writer = ShardWriter(shard_folder, max_count=shard_size, on_close=record_shard) \
+        if shard_folder else contextlib.nullcontext()
+    # Exported samples an interruption kept out of the manifest are generated and exported again
+    exporter = AnnotationExporter("output", keep=lambda image_id: image_id - 1 in manifest) \
+        if export else contextlib.nullcontext()
+    codec = codec or OutputCodec()
+    encoder = AsyncEncoder(workers=encoder_threads, max_pending=2 * encoder_threads)
+
+    with manifest, BatchAugmenter(batch_size=batch_size, processes=processes, seed=seed) as augmenter, \
+            shard_writer, exporter, encoder:
+        for start in range(0, len(remaining), chunk_size):
+            indices = remaining[start:start + chunk_size]
+            receipts = []
+            text_lines = []
+            fields = []
+            text_boxes = []
+            keypoints = []
+            rngs = []
+            for index in indices:
+                rngs.append(seed_sample(seed, index))
+                generator = ReceiptGenerator(templates[index % len(templates)])
+                receipt = generator.render()
+                receipts.append(receipt.convert("RGBA"))
+                text_lines.append(generator.receipt_text_data)
+                fields.append(generator.fields())
+                # The receipt corners come first, followed by the 4 corners of every text box
+                boxes = receipt.info.get("text_boxes", [])
+                corners = np.array([[0, 0], [receipt.width, 0], [receipt.width, receipt.height],
+                                    [0, receipt.height]], dtype=np.float32)
+                text_boxes.append(boxes)
+                keypoints.append(np.vstack([corners, text_line_keypoints(boxes)]))
+            # The warps are drawn from the sample generators, which then place the receipts like in script mode
+            augmented = augmenter.augment(receipts, [backgrounds.size(index) for index in indices], keypoints, rngs)
+
+            for index, (image_augmented, keypoints_augmented), lines, sample_fields, boxes, rng in zip(
+                    indices, augmented, text_lines, fields, text_boxes, rngs):
+                image, box, keypoints_augmented = composite_receipt(
+                    backgrounds.get(index), image_augmented, rng, keypoints_augmented)
+                image_output_name = sample_name(seed, index, codec.extension)
+                if export:
+                    quads = keypoints_augmented[4:].reshape(-1, 4, 2)
+                    exporter.add(image_output_name, image, box,
+                                 [(text, quad) for (text, _), quad in zip(boxes, quads)], image_id=index + 1,
+                                 quad=keypoints_augmented[:4])
+
+                record = dict(index=index, template=template_files[index % len(template_files)],
+                              background=backgrounds.backgrounds[index % len(backgrounds)], file=image_output_name)
+                if shard_folder:
+                    pending[os.path.splitext(image_output_name)[0]] = record
+                    on_saved = None
+                else:
+                    # Loose files are recorded once the encoder thread has written them
+                    on_saved = functools.partial(manifest.record, **record)
+                save_sample(image, box, image_output_name,
+                            shard_writer=shard_writer if shard_folder else None, text_lines=lines,
+                            codec=codec, encoder=encoder, on_saved=on_saved, quad=keypoints_augmented[:4],
+                            fields=sample_fields)
+                print(f"Image {index + 1}/{number_of_images} erfolgreich erstellt")
 
 if __name__ == "__main__":
-    # Check if the correct number of command-line arguments is provided
-    if len(sys.argv) != 2:
-        print("Usage: python main_script.py <number_of_calls>")
-        sys.exit(1)
-
-    # Get the number of calls from the command-line arguments
-    try:
-        number_of_calls = int(sys.argv[1])
-    except ValueError:
-        print("Error: Please provide a valid number of calls.")
-        sys.exit(1)
-
-    # Call the function to execute the selected scripts
-    call_scripts(number_of_calls)
+    parser = argparse.ArgumentParser(description="Generate synthetic receipt images with annotations.")
+    parser.add_argument("number_of_calls", type=int, help="number of images to generate")
+    parser.add_argument("--batch", action="store_true",
+                        help="render in-process and augment receipts in batches")
+    parser.add_argument("--batch-size", type=int, default=None, help="receipts per augmentation batch (default 16)")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="augmentation worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the run")
+    parser.add_argument("--part", type=parse_part, default=(0, 1),
+                        help="generate only part K/N of the indices, to split a run across N machines")
+    parser.add_argument("--manifest", default="output/manifest.jsonl",
+                        help="manifest of completed samples, used to resume interrupted runs")
+    parser.add_argument("--background-max-side", type=int, default=None,
+                        help="downscale backgrounds to this longest side once when they are decoded")
+    parser.add_argument("--background-cache", default=None,
+                        help="folder for the memory-mapped decoded background cache")
+    parser.add_argument("--shards", default=None,
+                        help="pack images, annotations and text labels into tar shards in this folder")
+    parser.add_argument("--shard-size", type=int, default=None, help="samples per shard (default 1000)")
+    parser.add_argument("--export", action="store_true",
+                        help="also write COCO and PaddleOCR det/rec labels to output/")
+    parser.add_argument("--format", choices=["png", "jpg", "npy"], default="png", help="output image format")
+    parser.add_argument("--png-compress-level", type=int, default=6, help="zlib level of PNG outputs (0-9)")
+    parser.add_argument("--jpeg-quality", type=int, default=90, help="quality of JPEG outputs")
+    parser.add_argument("--encoder-threads", type=int, default=None,
+                        help="background threads encoding and writing the outputs, only in batch mode (default 2)")
+    args = parser.parse_args()
+    if not args.batch:
+        # Script mode renders, augments and encodes every image in its own processes, these options would be ignored
+        batch_options = {"--batch-size": args.batch_size, "--processes": args.processes,
+                         "--background-max-side": args.background_max_side,
+                         "--background-cache": args.background_cache, "--shards": args.shards,
+                         "--shard-size": args.shard_size, "--export": args.export or None,
+                         "--encoder-threads": args.encoder_threads}
+        for option, value in batch_options.items():
+            if value is not None:
+                parser.error(f"{option} only applies to --batch")
+
+    if args.batch:
+        from output_codec import OutputCodec
+        codec = OutputCodec(args.format, png_compress_level=args.png_compress_level, jpeg_quality=args.jpeg_quality)
+        batch_size = 16 if args.batch_size is None else args.batch_size
+        shard_size = 1000 if args.shard_size is None else args.shard_size
+        generate_batched(args.number_of_calls, batch_size, args.processes, args.seed,
+                         background_max_side=args.background_max_side, background_cache=args.background_cache,
+                         shard_folder=args.shards, shard_size=shard_size, export=args.export,
+                         part=args.part, manifest_path=args.manifest,
+                         codec=codec, encoder_threads=2 if args.encoder_threads is None else args.encoder_threads)
+    else:
+        # Render the receipts with the store templates
+        call_scripts(args.number_of_calls, args.seed, args.part, args.manifest, args.format,
+                     args.png_compress_level, args.jpeg_quality)
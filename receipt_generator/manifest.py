@@ -0,0 +1,99 @@
+import json
+import os
+import random
+import threading
+
+"""
+This module provides the manifest of a generation run.
+Every completed sample is appended as one JSON line (index, seed, template, background, file),
+so an interrupted run can be resumed by skipping the indices that are already done.
+"""
+
+
+def sample_name(seed, index, extension="png"):
+    """
+    Collision-free file name of a sample: the same (seed, index) always gets the same name.
+    """
+    return f"IMG_{seed}_{index:06d}.{extension}"
+
+
+def seed_sample(seed, index):
+    """
+    Seed the receipt content of one sample and return its augmentation generator.
+    Every (seed, index) pair gives the same sample, no matter which process renders it.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng([seed, index])
+    content_seed = int(rng.integers(2 ** 32))
+    random.seed(content_seed)
+    return rng
+
+
+def sample_indices(number_of_images, part=(0, 1)):
+    """
+    Indices of the samples a run has to produce.
+    part (k, n) selects every n-th index starting at k, so a run can be split across n machines.
+    """
+    k, n = part
+    return range(k, number_of_images, n)
+
+
+def parse_part(text):
+    # "K/N" -> (K, N)
+    k, n = (int(value) for value in text.split("/"))
+    if not 0 <= k < n:
+        raise ValueError(f"invalid part {text}, expected K/N with 0 <= K < N")
+    return k, n
+
+
+class Manifest():
+    """
+    path: JSON lines file the completed samples are appended to
+    seed: seed of the run, resuming a manifest written with another seed is refused
+    """
+    def __init__(self, path, seed):
+        self.path = path
+        self.seed = seed
+        self.done = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut off by an interruption, the sample will be generated again
+                        continue
+                    if record["seed"] != seed:
+                        raise ValueError(f"{path} was written with seed {record['seed']}, not {seed}")
+                    self.done[record["index"]] = record
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a")
+        # Samples may be recorded from encoder threads
+        self._lock = threading.Lock()
+
+    def __contains__(self, index):
+        return index in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def record(self, index, **fields):
+        record = {"index": index, "seed": self.seed, **fields}
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            # Make sure the record survives a crash right after the sample was written
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.done[index] = record
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
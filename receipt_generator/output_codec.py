@@ -0,0 +1,93 @@
+from concurrent.futures import ThreadPoolExecutor
+import io
+import threading
+import numpy as np
+
+"""
+This module provides the configurable output encoding of generated images.
+OutputCodec encodes images as PNG (with a compression level), JPEG (with a quality) or raw NPY.
+AsyncEncoder runs encoding and writing on a bounded pool of background threads, so rendering and
+augmentation do not wait for zlib/libjpeg (both release the GIL while encoding).
+"""
+
+EXTENSIONS = {"png": "png", "jpeg": "jpg", "npy": "npy"}
+
+
+class OutputCodec():
+    """
+    format: "png", "jpeg" or "npy"
+    png_compress_level: zlib level 0 (fastest, largest) to 9 (slowest, smallest)
+    jpeg_quality: JPEG quality 1 to 95
+    """
+    def __init__(self, format="png", png_compress_level=6, jpeg_quality=90):
+        format = format.lower().replace("jpg", "jpeg")
+        if format not in EXTENSIONS:
+            raise ValueError(f"unsupported output format {format}, use one of {', '.join(EXTENSIONS)}")
+        self.format = format
+        self.png_compress_level = png_compress_level
+        self.jpeg_quality = jpeg_quality
+
+    @classmethod
+    def from_file_name(cls, file_name, **kwargs):
+        return cls(file_name.rsplit(".", 1)[-1], **kwargs)
+
+    @property
+    def extension(self):
+        return EXTENSIONS[self.format]
+
+    def encode(self, image):
+        """
+        Encode a PIL image to bytes.
+        """
+        encoded = io.BytesIO()
+        if self.format == "npy":
+            np.save(encoded, np.asarray(image))
+        elif self.format == "jpeg":
+            image.convert("RGB").save(encoded, format="JPEG", quality=self.jpeg_quality)
+        else:
+            image.save(encoded, format="PNG", compress_level=self.png_compress_level)
+        return encoded.getvalue()
+
+    def save(self, image, path):
+        with open(path, "wb") as f:
+            f.write(self.encode(image))
+
+
+class AsyncEncoder():
+    """
+    Bounded pool of background threads for encoding and writing.
+
+    workers: number of encoder threads
+    max_pending: maximum number of queued tasks, submit blocks when it is reached so memory stays bounded
+    """
+    def __init__(self, workers=2, max_pending=8):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="encoder")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._errors = []
+
+    def _done(self, future):
+        self._slots.release()
+        if future.exception() is not None:
+            self._errors.append(future.exception())
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) on an encoder thread. Errors are raised again on close.
+        """
+        if self._errors:
+            raise self._errors[0]
+        self._slots.acquire()
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(self._done)
+        return future
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        if self._errors:
+            raise self._errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
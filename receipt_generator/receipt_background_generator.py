@@ -1,12 +1,15 @@
 from PIL import Image, ImageDraw
+import argparse
 import numpy as np
-import imgaug.augmenters as iaa
 import pathlib
 import sys 
 import os
 import math
+import json
 import xml.etree.ElementTree as ET
 
+from output_codec import OutputCodec
+
 """
 This script provides a final generator 
 The generated receipts from 3 receipt generators are used hier and applied augmentation techniques.
@@ -14,7 +17,12 @@ They are placed onto a background from collected background photos at a random p
 The final generator also generates corresponding annotations of images for oboject detection.
 """
 
-def create_annotation_xml(filename, path, width, height, depth, xmin, ymin, xmax, ymax):
+def annotation_xml(filename, path, width, height, depth, xmin, ymin, xmax, ymax, quad=None):
+    """
+    Pascal VOC annotation of one image as string
+    With quad (the 4 receipt corners clockwise from top-left) the object also gets the oriented box:
+    <quad> with the corners x1, y1 ... x4, y4 and <angle>, the rotation of the receipt in degrees.
+    """
     # Create the root element
     annotation = ET.Element("annotation")
 
@@ -62,6 +70,15 @@ def create_annotation_xml(filename, path, width, height, depth, xmin, ymin, xmax
     ymax_elem = ET.SubElement(bndbox_elem, "ymax")
     ymax_elem.text = str(ymax)
 
+    if quad is not None:
+        # Oriented ground truth, ignored by readers that only know bndbox
+        quad_elem = ET.SubElement(object_elem, "quad")
+        for number, (x, y) in enumerate(quad, start=1):
+            ET.SubElement(quad_elem, f"x{number}").text = f"{x:.1f}"
+            ET.SubElement(quad_elem, f"y{number}").text = f"{y:.1f}"
+        angle_elem = ET.SubElement(object_elem, "angle")
+        angle_elem.text = f"{receipt_angle(quad):.2f}"
+
 
     # Add newlines and indentation to the XML content
     xml_content = ET.tostring(annotation, encoding="unicode", method="xml")
@@ -69,6 +86,11 @@ def create_annotation_xml(filename, path, width, height, depth, xmin, ymin, xmax
     formatted_xml = formatted_xml.replace("\n<", "\n    <")
     formatted_xml = formatted_xml.replace("  ", "    ")  # Adjust indentation
     formatted_xml += "\n"  # Add newline at the end
+    return formatted_xml
+
+
+def create_annotation_xml(filename, path, width, height, depth, xmin, ymin, xmax, ymax, quad=None):
+    formatted_xml = annotation_xml(filename, path, width, height, depth, xmin, ymin, xmax, ymax, quad)
 
     # Write the XML to a file
     xml_filename = os.path.splitext(filename)[0] + ".xml"
@@ -79,123 +101,336 @@ def create_annotation_xml(filename, path, width, height, depth, xmin, ymin, xmax
         f.write(formatted_xml)
 
 
-# Load background image
-image_output_name = sys.argv[2]
-filename = sys.argv[1]
-background = Image.open(filename)
-
-# Load image to be placed
-image_to_place = Image.open('tmp_output.png')
-
-# Calculate new dimensions for the enlarged canvas
-canvas_width = max(background.width, image_to_place.width*1.5)
-canvas_height = max(background.height, image_to_place.height*1.5)
-
-# Create a new blank canvas with enlarged boundaries
-new_background = Image.new('RGBA', (canvas_width, canvas_height), color=(0, 0, 0, 0))
-
-# Calculate offset to paste the original image onto the enlarged canvas
-offset = ((canvas_width - image_to_place.width) // 2, (canvas_height - image_to_place.height) // 2)
-
-# Paste the original image onto the new canvas, centered
-new_background.paste(image_to_place, offset, image_to_place)
-
-# debug  
-#new_background.save(f"output/test/{image_output_name}")
-
-rotated_width = abs(math.cos(35) * image_to_place.width) + abs(math.sin(35) * image_to_place.height)
-max_scale_factor_width = new_background.width / 1.7 / rotated_width
-
-rotated_height = abs(math.sin(35) * image_to_place.width) + abs(math.cos(35) * image_to_place.height)
-max_scale_factor_height = new_background.height / 2 / rotated_height
-max_scale_factor = min(max_scale_factor_width, max_scale_factor_height)
-
-# Define augmentation sequence
-seq = iaa.Sequential([
-    iaa.PerspectiveTransform(scale=(0, 0.1)),  # apply perspective transformation
-    iaa.Affine(  
-        rotate=(-35, 35),  # rotate by -35 to 35 degrees
-        scale=(max_scale_factor - 0.2,max_scale_factor), # scale images to max_scale_factor of their size
+def receipt_angle(quad):
+    """
+    Rotation of the receipt in degrees (clockwise in image coordinates), from the direction of its top edge.
+    """
+    (x1, y1), (x2, y2) = quad[0], quad[1]
+    return float(np.degrees(np.arctan2(y2 - y1, x2 - x1)))
+
+
+def crop_to_alpha(image_rgba):
+    """
+    Crop an RGBA array to the bounding box of its non-transparent pixels.
+
+    return: the cropped array, the bounding box (0, 0, width, height) of the crop
+        and the (x, y) position of the crop in the input
+    """
+    alpha = image_rgba[:, :, 3]
+    rows = np.flatnonzero(alpha.any(axis=1))
+    cols = np.flatnonzero(alpha.any(axis=0))
+    if rows.size == 0:
+        raise ValueError("augmented receipt is fully transparent")
+    cropped = image_rgba[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    return cropped, (0, 0, cropped.shape[1], cropped.shape[0]), (int(cols[0]), int(rows[0]))
+
+
+def alpha_composite(image, foreground_rgba, position):
+    """
+    Blend an RGBA foreground onto an RGB PIL image in place at position (x, y).
+    Only the covered region is read and written, parts of the foreground falling outside the image are clipped,
+    like PIL's paste.
+    """
+    x, y = position
+    fg_h, fg_w = foreground_rgba.shape[:2]
+
+    # Intersection of the foreground with the image
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + fg_w, image.width), min(y + fg_h, image.height)
+    if x0 >= x1 or y0 >= y1:
+        return image
+
+    fg = foreground_rgba[y0 - y:y1 - y, x0 - x:x1 - x]
+    region = np.asarray(image.crop((x0, y0, x1, y1)))
+    alpha = fg[:, :, 3:4].astype(np.float32) / 255.0
+    blended = fg[:, :, :3] * alpha + region * (1.0 - alpha)
+    image.paste(Image.fromarray(np.rint(blended).astype(np.uint8)), (x0, y0))
+    return image
+
+
+def compute_max_scale_factor(receipt_size, background_size):
+    """
+    Largest scale at which the rotated receipt still fits comfortably onto the background.
+    """
+    receipt_width, receipt_height = receipt_size
+    canvas_width = max(background_size[0], receipt_width * 1.5)
+    canvas_height = max(background_size[1], receipt_height * 1.5)
+
+    rotated_width = abs(math.cos(35) * receipt_width) + abs(math.sin(35) * receipt_height)
+    max_scale_factor_width = canvas_width / 1.7 / rotated_width
+
+    rotated_height = abs(math.sin(35) * receipt_width) + abs(math.cos(35) * receipt_height)
+    max_scale_factor_height = canvas_height / 2 / rotated_height
+    return min(max_scale_factor_width, max_scale_factor_height)
+
+
+def _homography_from_points(src, dst):
+    # Solve the 8 unknowns of the 3x3 homography mapping 4 src points onto 4 dst points
+    a = []
+    b = []
+    for (x, y), (u, v) in zip(src, dst):
+        a.append([x, y, 1, 0, 0, 0, -u * x, -u * y])
+        a.append([0, 0, 0, x, y, 1, -v * x, -v * y])
+        b.extend([u, v])
+    h = np.linalg.solve(np.array(a, dtype=np.float64), np.array(b, dtype=np.float64))
+    return np.append(h, 1.0).reshape(3, 3)
+
+
+def sample_warp_matrix(rng, width, height, max_scale_factor,
+                       perspective_scale=(0, 0.1), rotate=(-35, 35)):
+    """
+    Sample the perspective transformation and the affine rotation/scaling as one 3x3 matrix.
+
+    The jitter is drawn like in imgaug's PerspectiveTransform, |N(0, sigma)| of the image size per corner with sigma
+    drawn from perspective_scale, but applied the other way round: imgaug stretches the jittered inner quad onto the
+    full image (the receipt grows and its edges are cut off), here the receipt corners move inwards onto that quad,
+    so the receipt only shrinks and stays inside the size compute_max_scale_factor allows for. The jitter is clipped
+    below half the image size, so opposite corners never cross.
+    """
+    corners = np.array([[0, 0], [width, 0], [width, height], [0, height]], dtype=np.float64)
+    sigma = rng.uniform(*perspective_scale)
+    jitter = np.minimum(np.abs(rng.normal(0, sigma, size=(4, 2))), 0.45) * (width, height)
+    inwards = np.array([[1, 1], [-1, 1], [-1, -1], [1, -1]])
+    perspective = _homography_from_points(corners, corners + jitter * inwards)
+
+    angle = np.deg2rad(rng.uniform(*rotate))
+    scale = rng.uniform(max_scale_factor - 0.2, max_scale_factor)
+    cos, sin = scale * np.cos(angle), scale * np.sin(angle)
+    cx, cy = width / 2, height / 2
+    # Rotate and scale around the receipt center, like iaa.Affine does
+    affine = np.array([
+        [cos, -sin, cx - cos * cx + sin * cy],
+        [sin, cos, cy - sin * cx - cos * cy],
+        [0, 0, 1],
+    ])
+    return affine @ perspective
+
+
+def transform_points(matrix, points):
+    """
+    Apply a 3x3 projective matrix to an (N, 2) array of points.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    homogeneous = np.hstack([points, np.ones((len(points), 1))]) @ matrix.T
+    return homogeneous[:, :2] / homogeneous[:, 2:3]
+
+
+def fit_matrix_to_canvas(matrix, width, height):
+    """
+    Shift the matrix so the transformed receipt starts at (0, 0).
+
+    return: the shifted matrix and the (width, height) of the smallest canvas holding the result
+    """
+    corners = transform_points(matrix, [[0, 0], [width, 0], [width, height], [0, height]])
+    origin = np.floor(corners.min(axis=0))
+    out_width, out_height = (np.ceil(corners.max(axis=0)) - origin).astype(int)
+    shift = np.array([[1, 0, -origin[0]], [0, 1, -origin[1]], [0, 0, 1]])
+    return shift @ matrix, (int(out_width), int(out_height))
+
+
+def warp_receipt(receipt, matrix):
+    """
+    Warp an RGBA receipt with the combined matrix onto a canvas just large enough for the result.
+
+    return: the warped RGBA array and the matrix mapping receipt pixels into that canvas
+    """
+    matrix, out_size = fit_matrix_to_canvas(matrix, *receipt.size)
+
+    # PIL expects the inverse mapping (output pixel -> input pixel), normalised to h33 = 1
+    inverse = np.linalg.inv(matrix)
+    inverse /= inverse[2, 2]
+    warped = receipt.transform(
+        out_size,
+        Image.Transform.PERSPECTIVE,
+        data=tuple(inverse.flatten()[:8]),
+        resample=Image.Resampling.BICUBIC,
     )
-], random_order=False)
+    return np.array(warped), matrix
 
-# Apply augmentation sequence to the enlarged canvas
-image_augmented = seq.augment_image(np.array(new_background))
 
-# Convert numpy array to PIL Image
-augmented_image_pil = Image.fromarray(image_augmented)
+def place_receipt(background, receipt, rng, keypoints=None):
+    """
+    Augment the receipt and blend it onto the background (PIL image or RGB array) near its center.
+    Optional keypoints (N, 2) in receipt coordinates are transformed together with the receipt.
 
-# debug 
-#augmented_image_pil.save(f"output/test2/{image_output_name}")
-
-# Convert the image to RGBA and create a mask
-image_augmented = Image.fromarray(image_augmented)
-image_augmented = image_augmented.convert("RGBA")
-datas = image_augmented.getdata()
-
-# Create a mask
-newData = []
-for item in datas:
-    # Remove black pixels
-    if item[0] == 0 and item[1] == 0 and item[2] == 0:
-        newData.append((255, 255, 255, 0))
+    return: the composited RGB image, the receipt bounding box (xmin, ymin, xmax, ymax)
+        and the keypoints in image coordinates (None without keypoints)
+    """
+    if isinstance(background, Image.Image):
+        background_size = background.size
     else:
-        newData.append(item)
-
-# Update the image with the new data
-image_augmented.putdata(newData)
-
-# Get the bounding box of the non-transparent pixels
-bbox = image_augmented.getbbox()
-
-# Crop the image to the bounding box
-cropped_image = image_augmented.crop(bbox)
-
-bbox = cropped_image.getbbox()
-
-center_x = background.width // 2
-center_y = background.height // 2
-
-# Calculate the maximum offset from the center for random placement
-max_offset = min(center_x, center_y) // 4  # Adjust this factor for slight variations
-
-# Generate random offsets within the maximum limits
-offset_x = center_x + np.random.randint(-max_offset, max_offset + 1)
-offset_y = center_y + np.random.randint(-max_offset, max_offset + 1)
-
-# Calculate the position to paste the augmented image
-paste_position = (offset_x - bbox[2] // 2, offset_y - bbox[3] // 2)
-
-# Paste the augmented image onto the background at the calculated position
-background.paste(cropped_image, paste_position, cropped_image)
-
-start_x = paste_position[0] + 1
-start_y = paste_position[1] + 1
-end_x = start_x + bbox[2] - bbox[0] + 1
-end_y = start_y + bbox[3] - bbox[1] + 1
-
-#draw = ImageDraw.Draw(background)
-#draw.rectangle([start_x, start_y, end_x, end_y], outline='orange')
-
-# Display the result (optional)
-#background.show()
-
-pathlib.Path('output/images').mkdir(parents=True, exist_ok=True) 
-
-
-# Save the result
-background.save(f"output/images/{image_output_name}")
-
-width, height = background.size
-
-create_annotation_xml(
-    filename=image_output_name,
-    path=f"/Users/local_admin/Desktop/thesis/realreceipts/data/regular/{image_output_name}",
-    width=width,
-    height=height,
-    depth=3,
-    xmin=start_x,
-    ymin=start_y,
-    xmax=end_x,
-    ymax=end_y
-)
+        background_size = (background.shape[1], background.shape[0])
+    max_scale_factor = compute_max_scale_factor(receipt.size, background_size)
+    matrix = sample_warp_matrix(rng, receipt.width, receipt.height, max_scale_factor)
+    image_augmented, matrix = warp_receipt(receipt, matrix)
+    if keypoints is not None:
+        keypoints = transform_points(matrix, keypoints)
+    return composite_receipt(background, image_augmented, rng, keypoints)
+
+
+def composite_receipt(background, image_augmented, rng, keypoints=None):
+    """
+    Blend an already augmented RGBA receipt onto the background near its center.
+    The background is a PIL image or an RGB array (also read-only, e.g. from BackgroundPool), it is not changed.
+    Optional keypoints (N, 2) in the coordinates of image_augmented are moved along with the receipt.
+
+    return: the composited RGB image, the receipt bounding box (xmin, ymin, xmax, ymax)
+        and the keypoints in image coordinates (None without keypoints)
+    """
+    # The output image is the only copy of the background, the receipt is blended into it
+    if isinstance(background, Image.Image):
+        composited = background.convert("RGB")
+    else:
+        composited = Image.fromarray(background)
+
+    # The alpha channel is warped together with the colour channels, so it marks
+    # exactly where receipt pixels ended up (no black-colour keying needed)
+    cropped_image, bbox, crop_origin = crop_to_alpha(image_augmented)
+
+    center_x = composited.width // 2
+    center_y = composited.height // 2
+
+    # Calculate the maximum offset from the center for random placement
+    max_offset = min(center_x, center_y) // 4  # Adjust this factor for slight variations
+
+    # Generate random offsets within the maximum limits
+    offset_x = center_x + rng.integers(-max_offset, max_offset + 1)
+    offset_y = center_y + rng.integers(-max_offset, max_offset + 1)
+
+    # Calculate the position to paste the augmented image
+    paste_position = (int(offset_x - bbox[2] // 2), int(offset_y - bbox[3] // 2))
+
+    # Blend the augmented receipt onto the background at the calculated position
+    alpha_composite(composited, cropped_image, paste_position)
+
+    if keypoints is not None:
+        keypoints = np.asarray(keypoints, dtype=np.float64) - crop_origin + paste_position
+
+    start_x = paste_position[0] + 1
+    start_y = paste_position[1] + 1
+    end_x = start_x + bbox[2] - bbox[0] + 1
+    end_y = start_y + bbox[3] - bbox[1] + 1
+    return composited, (start_x, start_y, end_x, end_y), keypoints
+
+
+def save_sample(image, box, image_output_name, shard_writer=None, text_lines=None,
+                codec=None, encoder=None, on_saved=None, quad=None, fields=None):
+    """
+    Save a generated image to output/images, its Pascal VOC annotation to output/annotations
+    and its labels (box, text lines, ground-truth fields) as JSON to output/labels.
+    With a shard_writer the image, annotation and labels are packed into the current shard instead.
+
+    codec: OutputCodec for the image, by default chosen from the extension of image_output_name
+    encoder: optional AsyncEncoder, encoding and writing then run on its background threads
+    on_saved: optional callback, called once the sample is completely written
+    quad: optional (4, 2) receipt corners in image coordinates, clockwise from top-left
+    fields: optional ground-truth fields printed on the receipt, e.g. {"date": "2016-10-22", "total": "14.71"}
+    """
+    if codec is None:
+        codec = OutputCodec.from_file_name(image_output_name)
+    if encoder is not None:
+        return encoder.submit(_write_sample, image, box, image_output_name, shard_writer, text_lines,
+                              codec, on_saved, quad, fields)
+    _write_sample(image, box, image_output_name, shard_writer, text_lines, codec, on_saved, quad, fields)
+
+
+def _write_sample(image, box, image_output_name, shard_writer, text_lines, codec, on_saved, quad, fields):
+    start_x, start_y, end_x, end_y = box
+    if quad is not None:
+        quad = np.round(np.asarray(quad, dtype=np.float64), 1).tolist()
+    width, height = image.size
+    path = os.path.abspath(os.path.join("output/images", image_output_name))
+    key = os.path.splitext(image_output_name)[0]
+
+    labels = {
+        "file_name": image_output_name,
+        "width": width,
+        "height": height,
+        "bbox": [start_x, start_y, end_x, end_y],
+        "text": text_lines or [],
+    }
+    if quad is not None:
+        labels["quad"] = quad
+        labels["angle"] = round(receipt_angle(quad), 2)
+    if fields is not None:
+        labels.update(fields)
+
+    if shard_writer is not None:
+        shard_writer.write(key, {
+            codec.extension: codec.encode(image),
+            "xml": annotation_xml(image_output_name, path, width, height, 3, start_x, start_y, end_x, end_y, quad),
+            "json": json.dumps(labels, ensure_ascii=False),
+        })
+    else:
+        pathlib.Path('output/images').mkdir(parents=True, exist_ok=True)
+
+        # Save the result
+        codec.save(image, f"output/images/{image_output_name}")
+
+        create_annotation_xml(
+            filename=image_output_name,
+            path=path,
+            width=width,
+            height=height,
+            depth=3,
+            xmin=start_x,
+            ymin=start_y,
+            xmax=end_x,
+            ymax=end_y,
+            quad=quad
+        )
+
+        pathlib.Path('output/labels').mkdir(parents=True, exist_ok=True)
+        with open(f"output/labels/{key}.json", "w", encoding="utf-8") as f:
+            json.dump(labels, f, ensure_ascii=False)
+
+    if on_saved is not None:
+        on_saved()
+
+
+def main(background_file, image_output_name, rng=None, codec=None):
+    """
+    rng: numpy Generator of the placement and augmentation, unseeded by default
+    codec: OutputCodec of the image, by default chosen from the extension of image_output_name
+    """
+    # Load background image and the receipt to be placed
+    background = Image.open(background_file)
+    image_to_place = Image.open('tmp_output.png').convert('RGBA')  # written uncompressed by receipt_template.py
+
+    corners = [[0, 0], [image_to_place.width, 0], [image_to_place.width, image_to_place.height],
+               [0, image_to_place.height]]
+    background, box, quad = place_receipt(background, image_to_place, rng or np.random.default_rng(), corners)
+
+    # Text lines and ground-truth fields of the receipt, written next to tmp_output.png
+    text_lines, fields = None, None
+    if os.path.exists('tmp_output.json'):
+        with open('tmp_output.json', encoding='utf-8') as f:
+            receipt_labels = json.load(f)
+        text_lines, fields = receipt_labels['text'], receipt_labels['fields']
+
+    #draw = ImageDraw.Draw(background)
+    #draw.rectangle(box, outline='orange')
+
+    # Display the result (optional)
+    #background.show()
+
+    save_sample(background, box, image_output_name, text_lines=text_lines, quad=quad, fields=fields, codec=codec)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Place the rendered receipt tmp_output.png onto a background.")
+    parser.add_argument("background", help="background image")
+    parser.add_argument("image_output_name", help="file name of the sample, its extension selects the format")
+    parser.add_argument("seed", type=int, nargs="?", help="seed of the run, with index: seeded placement")
+    parser.add_argument("index", type=int, nargs="?", help="index of the sample")
+    parser.add_argument("--png-compress-level", type=int, default=6, help="zlib level of PNG outputs (0-9)")
+    parser.add_argument("--jpeg-quality", type=int, default=90, help="quality of JPEG outputs")
+    args = parser.parse_args()
+
+    rng = None
+    if args.index is not None:
+        from manifest import seed_sample
+        rng = seed_sample(args.seed, args.index)
+    codec = OutputCodec.from_file_name(args.image_output_name, png_compress_level=args.png_compress_level,
+                                       jpeg_quality=args.jpeg_quality)
+    main(args.background, args.image_output_name, rng, codec)
@@ -0,0 +1,254 @@
+'''
+Data-driven Receipt Generator
+
+A receipt is described by a store template (JSON, or YAML if PyYAML is installed) in templates/:
+ - the font, the list of items that can be bought and their price range
+ - a list of blocks, each a list of rows; a row is a list of text cells placed next to each other
+ - cells are strings or {"text", "width", "font_size"} objects, widths and font size default to the block's
+ - texts may contain placeholders: {date:%d.%m.%Y}, {total}, {tax[19]}, {net[19]} and, in blocks with
+   "repeat": "items", {item} and {price}
+Templates are compiled once per process: fonts are loaded once and rows without placeholders are
+rendered once and reused by every receipt.
+
+Usage: python receipt_template.py templates/rewe.json (writes tmp_output.png)
+'''
+
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+import functools
+import json
+import random
+import string
+import sys
+from datetime import datetime, timedelta
+
+
+def generate_random_date():
+    # Convert start_date and end_date to datetime objects
+    start_date = '2000-01-01'  # Example start date
+    end_date = '2024-12-31'    # Example end date
+    start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
+    end_datetime = datetime.strptime(end_date, '%Y-%m-%d')
+
+    # Generate a random timedelta within the range
+    random_timedelta = timedelta(days=random.randint(0, (end_datetime - start_datetime).days))
+
+    # Add the random timedelta to start_date
+    random_date = start_datetime + random_timedelta
+
+    return random_date
+
+
+def _format_amount(amount):
+    return '{:,.2f}'.format(amount).replace('.', ',')
+
+
+@functools.lru_cache(maxsize=None)
+def _font(font_file, font_size):
+    return ImageFont.truetype(font_file, size=font_size)
+
+
+def _text_image(text, font_file, font_size=12, width=320):
+    image = Image.new(mode="RGB", size=(width, font_size + 4), color=(255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    draw.text((0 + 4, 0), str(text), fill='rgb(0, 0, 0)', font=_font(font_file, font_size))
+    # Bounding box of the drawn text (non-white pixels), used for text detection/recognition labels
+    text_box = ImageOps.invert(image.convert('L')).getbbox()
+    image.info['text_boxes'] = [(str(text).strip(), text_box)] if text_box and str(text).strip() else []
+    return image
+
+
+def _combine_all_images_horizantally(images):
+    w = sum(i.size[0] for i in images)
+    mh = max(i.size[1] for i in images)
+
+    result = Image.new("RGBA", (w, mh))
+
+    x = 0
+    text_boxes = []
+    for i in images:
+        result.paste(i, (x, 0))
+        # Keep track of where the text of every part ends up in the combined image
+        for text, (x0, y0, x1, y1) in i.info.get('text_boxes', []):
+            text_boxes.append((text, (x0 + x, y0, x1 + x, y1)))
+        x += i.size[0]
+    result.info['text_boxes'] = text_boxes
+    return result
+
+
+def _combine_all_images_vertically(images):
+    w = max(i.size[0] for i in images)
+    mh = sum(i.size[1] for i in images)
+
+    result = Image.new("RGBA", (w, mh))
+
+    y = 0
+    text_boxes = []
+    for i in images:
+        result.paste(i, (0, y))
+        for text, (x0, y0, x1, y1) in i.info.get('text_boxes', []):
+            text_boxes.append((text, (x0, y0 + y, x1, y1 + y)))
+        y += i.size[1]
+    result.info['text_boxes'] = text_boxes
+    return result
+
+
+def _has_placeholder(text):
+    return any(field is not None for _, field, _, _ in string.Formatter().parse(text))
+
+
+class _Row():
+    # One compiled row: its cells and, if it has no placeholders, the image rendered at compile time
+    def __init__(self, cells, font_file):
+        self.cells = cells
+        self.font_file = font_file
+        self.static = not any(_has_placeholder(text) for text, _, _ in cells)
+        self.image = self._render({}) if self.static else None
+        self.text = self._text({}) if self.static else None
+
+    def _text(self, context):
+        return ' '.join(text.format(**context) for text, _, _ in self.cells).strip()
+
+    def _render(self, context):
+        return _combine_all_images_horizantally([
+            _text_image(text.format(**context), self.font_file, font_size, width)
+            for text, width, font_size in self.cells
+        ])
+
+    def render(self, context):
+        """
+        return: the row image and its text
+        """
+        if self.static:
+            return self.image, self.text
+        return self._render(context), self._text(context)
+
+
+class ReceiptTemplate():
+    """
+    Compiled store template, use load_template to get the cached instance.
+    """
+    def __init__(self, path, spec):
+        self.path = path
+        self.name = spec.get('name', path)
+        self.font_file = spec['font']
+        self.width = spec.get('width', 320)
+        self.items = spec['items']
+        self.item_count = spec.get('item_count', [1, 10])
+        self.price_range = spec.get('price_range', [0.5, 10.0])
+        self.tax_rates = spec.get('tax_rates', [7, 19])
+
+        self.blocks = []
+        for block in spec['blocks']:
+            widths = block.get('widths', [self.width])
+            font_size = block.get('font_size', 12)
+            rows = []
+            for row in block['rows']:
+                cells = []
+                for position, cell in enumerate(row):
+                    if isinstance(cell, str):
+                        cell = {'text': cell}
+                    cells.append((
+                        cell['text'],
+                        cell.get('width', widths[position] if position < len(widths) else widths[-1]),
+                        cell.get('font_size', font_size),
+                    ))
+                rows.append(_Row(cells, self.font_file))
+            self.blocks.append((block.get('repeat'), rows))
+
+
+def _read_spec(path):
+    if path.endswith(('.yml', '.yaml')):
+        import yaml  # optional, only needed for YAML templates
+        with open(path, encoding='utf-8') as f:
+            return yaml.safe_load(f)
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+@functools.lru_cache(maxsize=None)
+def load_template(path):
+    """
+    Load and compile a store template once per process.
+    """
+    return ReceiptTemplate(path, _read_spec(path))
+
+
+class ReceiptGenerator():
+    """
+    Renders one random receipt from a template.
+    After render(), receipt_text_data holds the text lines, total_price and date the true values
+    (fields() returns them as ground truth).
+    """
+    def __init__(self, template):
+        if isinstance(template, str):
+            template = load_template(template)
+        self.template = template
+        self.final_output_image = None
+        self.receipt_text_data = []
+        self.total_price = 0
+        self.date = None
+
+    def _context(self):
+        self.date = generate_random_date()
+        items = []
+        for i in range(random.randint(*self.template.item_count)):
+            item = random.choice(self.template.items)
+            price = round(random.uniform(*self.template.price_range), 2)
+            items.append({'item': item, 'price': _format_amount(price)})
+            self.total_price += price
+
+        total = self.total_price
+        context = {
+            'date': self.date,
+            'total': _format_amount(total),
+            'tax': {rate: _format_amount(total * rate / 100) for rate in self.template.tax_rates},
+            'net': {rate: _format_amount(total - total * rate / 100) for rate in self.template.tax_rates},
+        }
+        return context, items
+
+    def render_rows(self):
+        """
+        Render the rows of a new random receipt, without joining them.
+        """
+        self.receipt_text_data = []
+        self.total_price = 0
+        context, items = self._context()
+
+        bag = []
+        for repeat, rows in self.template.blocks:
+            contexts = [dict(context, **item) for item in items] if repeat == 'items' else [context]
+            for row_context in contexts:
+                for row in rows:
+                    image, text = row.render(row_context)
+                    bag.append(image)
+                    # Separator lines ('-----', '*****') are not part of the receipt text
+                    if any(c.isalnum() for c in text):
+                        self.receipt_text_data.append(text)
+        return bag
+
+    def render(self):
+        self.final_output_image = _combine_all_images_vertically(self.render_rows())
+        return self.final_output_image
+
+    def fields(self):
+        """
+        Ground-truth fields of the last rendered receipt: ISO date and total as printed (2 decimals).
+        """
+        return {'date': self.date.strftime('%Y-%m-%d'), 'total': '{:.2f}'.format(self.total_price)}
+
+    def save_output(self):
+        # Only read back once by receipt_background_generator.py, so skip the zlib compression
+        self.render().save('tmp_output.png', compress_level=0)
+        with open('tmp_output.json', 'w', encoding='utf-8') as f:
+            json.dump({'text': self.receipt_text_data, 'fields': self.fields()}, f, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 4):
+        print("Usage: python receipt_template.py <template> [<seed> <index>]")
+        sys.exit(1)
+    if len(sys.argv) == 4:
+        # The same content as sample <index> of a batch run with <seed>
+        from manifest import seed_sample
+        seed_sample(int(sys.argv[2]), int(sys.argv[3]))
+    ReceiptGenerator(sys.argv[1]).save_output()
@@ -0,0 +1,146 @@
+import glob
+import io
+import json
+import os
+import tarfile
+import threading
+import time
+
+"""
+This module provides a packed output format for large synthetic datasets.
+Samples are streamed into WebDataset-style tar shards: all files of one sample share a key
+(e.g. IMG_0_000001.png, IMG_0_000001.xml, IMG_0_000001.json) and are stored next to each other.
+Every shard gets an offset index (<shard>.idx.json), so single samples can be read without scanning the tar.
+"""
+
+
+class ShardWriter():
+    """
+    Streaming writer for tar shards.
+
+    output_folder: folder the shards are written to
+    max_count: number of samples per shard
+    max_size: maximum shard size in bytes, a new shard is started when it would be exceeded
+    prefix: file name prefix of the shards
+    on_close: optional callback receiving the keys of a shard once it is complete
+    """
+    def __init__(self, output_folder, max_count=1000, max_size=1 << 30, prefix="shard", on_close=None):
+        self.output_folder = output_folder
+        self.max_count = max_count
+        self.max_size = max_size
+        self.prefix = prefix
+        self.on_close = on_close
+        # Samples may be written from encoder threads
+        self._lock = threading.Lock()
+        os.makedirs(output_folder, exist_ok=True)
+
+        # Continue after the complete shards; a shard without index was interrupted and gets overwritten
+        self.shard_index = len(glob.glob(os.path.join(output_folder, f"{prefix}-*.tar.idx.json")))
+        self._tar = None
+        self._index = None
+        self._count = 0
+
+    def _open_shard(self):
+        self.path = os.path.join(self.output_folder, f"{self.prefix}-{self.shard_index:06d}.tar")
+        self._tar = tarfile.open(self.path, "w", format=tarfile.USTAR_FORMAT)
+        self._index = {}
+        self._count = 0
+
+    def _close_shard(self):
+        if self._tar is None:
+            return
+        self._tar.close()
+        with open(self.path + ".idx.json", "w") as f:
+            json.dump(self._index, f)
+        self._tar = None
+        self.shard_index += 1
+        if self.on_close is not None:
+            self.on_close(list(self._index))
+
+    def write(self, key, files):
+        """
+        key: sample name shared by all of its files
+        files: dict of extension -> bytes or str, e.g. {"png": b"...", "xml": "<annotation>...", "json": "{...}"}
+        """
+        with self._lock:
+            self._write(key, files)
+
+    def _write(self, key, files):
+        size = sum(len(data) for data in files.values())
+        if self._tar is not None and (self._count >= self.max_count or self._tar.offset + size > self.max_size):
+            self._close_shard()
+        if self._tar is None:
+            self._open_shard()
+
+        entry = {}
+        for extension, data in files.items():
+            if isinstance(data, str):
+                data = data.encode("utf-8")
+            info = tarfile.TarInfo(f"{key}.{extension}")
+            info.size = len(data)
+            info.mtime = time.time()
+            # The file data starts right after its header block
+            header = info.tobuf(self._tar.format, self._tar.encoding, self._tar.errors)
+            entry[extension] = [self._tar.offset + len(header), len(data)]
+            self._tar.addfile(info, io.BytesIO(data))
+        self._index[key] = entry
+        self._count += 1
+
+    def close(self):
+        with self._lock:
+            self._close_shard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ShardReader():
+    """
+    Reader for shards written by ShardWriter.
+    Iterating streams all samples shard by shard; indexing by key reads a single sample using the offset index.
+    """
+    def __init__(self, folder, prefix="shard"):
+        # Only complete shards (with an index) are read
+        self.shards = sorted(path[:-len(".idx.json")]
+                             for path in glob.glob(os.path.join(folder, f"{prefix}-*.tar.idx.json")))
+        self._locations = {}
+        for shard in self.shards:
+            with open(shard + ".idx.json") as f:
+                for key, entry in json.load(f).items():
+                    self._locations[key] = (shard, entry)
+
+    def __len__(self):
+        return len(self._locations)
+
+    def keys(self):
+        return self._locations.keys()
+
+    def __getitem__(self, key):
+        shard, entry = self._locations[key]
+        sample = {}
+        with open(shard, "rb") as f:
+            for extension, (offset, size) in entry.items():
+                f.seek(offset)
+                sample[extension] = f.read(size)
+        return sample
+
+    def __iter__(self):
+        """
+        Yield (key, {extension: bytes}) for every sample, reading each shard sequentially.
+        """
+        for shard in self.shards:
+            key = None
+            sample = {}
+            with tarfile.open(shard, "r|") as tar:
+                for member in tar:
+                    member_key, extension = member.name.rsplit(".", 1)
+                    if member_key != key and sample:
+                        yield key, sample
+                        sample = {}
+                    key = member_key
+                    sample[extension] = tar.extractfile(member).read()
+            if sample:
+                yield key, sample
@@ -0,0 +1,262 @@
+import argparse
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from evaluate_pipeline import normalize_amount, normalize_date
+
+"""
+Persistent store of the pipeline results in SQLite (WAL mode), one database file.
+- receipts: one row per processed image with its hash, the extracted date and total (as printed, normalized and
+  with the confidence of their OCR line), the stage timings and the time it was stored
+- lines: the raw OCR lines of every image with their box and confidence, so the extraction can run again
+  (re-extraction) and reconciliation queries can be answered without processing any image again
+- indexes on date, total and image hash
+Writes are queued and a background thread stores them in batches, one transaction per batch, so the processing
+thread never waits for the disk.
+
+Usage:
+    python results_store.py results.db --date 2024-03-01 [--total 14.71] [--hash <sha1>]   (query)
+    python results_store.py results.db --reextract                                        (extract again)
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS receipts (
+    id INTEGER PRIMARY KEY,
+    image_hash TEXT,
+    file_name TEXT,
+    date TEXT,
+    date_raw TEXT,
+    date_confidence REAL,
+    total_cents INTEGER,
+    total_raw TEXT,
+    total_confidence REAL,
+    dates TEXT,
+    amounts TEXT,
+    timings TEXT,
+    error TEXT,
+    stored REAL
+);
+CREATE TABLE IF NOT EXISTS lines (
+    receipt_id INTEGER REFERENCES receipts(id) ON DELETE CASCADE,
+    line INTEGER,
+    text TEXT,
+    confidence REAL,
+    box TEXT,
+    PRIMARY KEY (receipt_id, line)
+);
+CREATE INDEX IF NOT EXISTS receipts_date ON receipts(date);
+CREATE INDEX IF NOT EXISTS receipts_total ON receipts(total_cents);
+CREATE INDEX IF NOT EXISTS receipts_hash ON receipts(image_hash);
+"""
+
+
+def connect(path):
+    connection = sqlite3.connect(path)
+    # Readers (queries, re-extraction) do not block the writer and the other way round
+    connection.execute("PRAGMA journal_mode=WAL")
+    # In WAL mode a commit is durable after the next checkpoint, an application crash loses nothing
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA foreign_keys=ON")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _field(values, result, normalize):
+    # First extracted value, normalized, with the confidence of the first OCR line containing it
+    if not values:
+        return None, None, None
+    raw = values[0]
+    confidence = next((line_confidence for _, (text, line_confidence) in result if raw in text), None)
+    return normalize(raw), raw, confidence
+
+
+def _cents(amount):
+    return None if amount is None else int(round(float(amount) * 100))
+
+
+def receipt_row(output):
+    """
+    Column values of the receipts table for the output of pipeline.process_receipt
+    """
+    result = output.get("result") or []
+    date, date_raw, date_confidence = _field(output.get("dates"), result, normalize_date)
+    total, total_raw, total_confidence = _field(output.get("amounts"), result, normalize_amount)
+    return {
+        "date": date, "date_raw": date_raw, "date_confidence": date_confidence,
+        "total_cents": _cents(total), "total_raw": total_raw, "total_confidence": total_confidence,
+        "dates": json.dumps(output.get("dates", []), ensure_ascii=False),
+        "amounts": json.dumps(output.get("amounts", []), ensure_ascii=False),
+    }
+
+
+class ResultsStore():
+    """
+    path: SQLite database file
+    batch_size: results per transaction at most
+    flush_interval: seconds a result waits at most for more results of its batch
+    """
+    def __init__(self, path="results.db", batch_size=64, flush_interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        connect(path).close()
+        self._queue = queue.Queue()
+        self._error = None
+        self._writer = threading.Thread(target=self._write_loop, name="results-store", daemon=True)
+        self._writer.start()
+
+    def add(self, output, image_path=None, image_hash=None, file_name=None):
+        """
+        Queue the output of pipeline.process_receipt for writing.
+        The hash of image_path is computed by the writer thread, pass image_hash if the file may change before.
+        """
+        if self._error is not None:
+            raise self._error
+        self._queue.put((output, image_path, image_hash, file_name or (image_path and os.path.basename(image_path)),
+                         time.time()))
+
+    def _write_loop(self):
+        connection = connect(self.path)
+        try:
+            closing = False
+            while not closing:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                # None is the end marker of close()
+                while len(batch) < self.batch_size and batch[-1] is not None:
+                    try:
+                        batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                    except queue.Empty:
+                        break
+                closing = batch[-1] is None
+                batch = [entry for entry in batch if entry is not None]
+                if batch:
+                    with connection:
+                        for entry in batch:
+                            self._insert(connection, *entry)
+        except Exception as error:
+            # Raised by the next add() or by close()
+            self._error = error
+        finally:
+            connection.close()
+
+    def _insert(self, connection, output, image_path, image_hash, file_name, stored):
+        if image_hash is None and image_path is not None:
+            image_hash = file_hash(image_path)
+        row = receipt_row(output)
+        rejected = output.get("rejected")
+        row.update(image_hash=image_hash, file_name=file_name, timings=json.dumps(output.get("timings", {})),
+                   error=output.get("error") or (rejected and f"rejected: {rejected['reason']}"), stored=stored)
+        cursor = connection.execute(f"INSERT INTO receipts ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                                    list(row.values()))
+        connection.executemany(
+            "INSERT INTO lines (receipt_id, line, text, confidence, box) VALUES (?, ?, ?, ?, ?)",
+            [(cursor.lastrowid, number, text, float(confidence), json.dumps([[float(v) for v in point] for point in box]))
+             for number, (box, (text, confidence)) in enumerate(output.get("result") or [])])
+
+    def close(self):
+        """
+        Write all queued results and stop the writer thread
+        """
+        self._queue.put(None)
+        self._writer.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def query(connection, date=None, total=None, image_hash=None):
+    """
+    Stored receipts by date (YYYY-MM-DD), total (e.g. "14.71") and/or image hash, newest first
+    """
+    conditions = []
+    values = []
+    if date is not None:
+        conditions.append("date = ?")
+        values.append(date)
+    if total is not None:
+        conditions.append("total_cents = ?")
+        values.append(_cents(total))
+    if image_hash is not None:
+        conditions.append("image_hash = ?")
+        values.append(image_hash)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    connection.row_factory = sqlite3.Row
+    return [dict(row) for row in connection.execute(f"SELECT * FROM receipts {where} ORDER BY stored DESC", values)]
+
+
+def ocr_result(connection, receipt_id):
+    """
+    The stored OCR lines of a receipt in PaddleOCR's format [[box, (text, confidence)], ...]
+    """
+    return [[json.loads(box), (text, confidence)] for text, confidence, box in connection.execute(
+        "SELECT text, confidence, box FROM lines WHERE receipt_id = ? ORDER BY line", (receipt_id,))]
+
+
+def reextract(path, extract_date, extract_total, batch_size=500):
+    """
+    Run the extraction again on the stored OCR lines of all receipts (e.g. after a fix of the rules)
+    return: number of receipts whose date or total changed
+    """
+    connection = connect(path)
+    changed = 0
+    try:
+        ids = [receipt_id for receipt_id, in connection.execute("SELECT id FROM receipts ORDER BY id")]
+        for start in range(0, len(ids), batch_size):
+            with connection:
+                for receipt_id in ids[start:start + batch_size]:
+                    result = ocr_result(connection, receipt_id)
+                    row = receipt_row({"result": result, "dates": extract_date(result, verbose=False),
+                                       "amounts": extract_total(result, verbose=False)})
+                    before = connection.execute("SELECT date, total_cents FROM receipts WHERE id = ?",
+                                                (receipt_id,)).fetchone()
+                    changed += before != (row["date"], row["total_cents"])
+                    connection.execute(f"UPDATE receipts SET {', '.join(f'{column} = ?' for column in row)} "
+                                       f"WHERE id = ?", [*row.values(), receipt_id])
+    finally:
+        connection.close()
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the stored pipeline results or extract them again.")
+    parser.add_argument("database", help="SQLite results file")
+    parser.add_argument("--date", default=None, help="date as YYYY-MM-DD")
+    parser.add_argument("--total", default=None, help="total amount, e.g. 14.71")
+    parser.add_argument("--hash", default=None, help="SHA-1 of the image file")
+    parser.add_argument("--reextract", action="store_true",
+                        help="run extractDate/extractTotal of extraction.py again on the stored OCR lines")
+    args = parser.parse_args()
+
+    if args.reextract:
+        from extraction import extractDate, extractTotal
+
+        print(f"{reextract(args.database, extractDate, extractTotal)} receipts changed")
+        return
+
+    connection = connect(args.database)
+    for row in query(connection, args.date, args.total, args.hash):
+        print(json.dumps(row, ensure_ascii=False))
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
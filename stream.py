@@ -0,0 +1,261 @@
+import argparse
+import hashlib
+import json
+import os
+import cv2
+import numpy as np
+
+"""
+This script runs the pipeline on a video file or a camera (counter-top capture devices) instead of single photos.
+The frames are not pushed through the whole pipeline one by one:
+- the receipt box is tracked across frames: a small grayscale copy of every frame is compared with the previous one,
+  the box follows the global shift (phase correlation) and NanoDet only runs again when the motion exceeds a
+  threshold (something was put down, moved or taken away) and once more when the scene has settled
+- while the receipt lies still, the sharpest frame (variance of the Laplacian inside the box) is kept
+- after a number of stable frames the OCR and the extraction run once on that frame, a receipt is read again only
+  after it was removed or replaced
+so the CPU usage stays flat while the camera runs continuously.
+
+Usage: python stream.py <video file or camera index> [--output folder] [--detector nanodet]
+Prints one JSON line per receipt with the frame number, the dates and the amounts.
+"""
+
+
+def _analysis_frame(frame, width):
+    # Small grayscale copy for motion and shift, the noise of the sensor is blurred away
+    scale = width / frame.shape[1]
+    small = cv2.resize(frame, (width, int(round(frame.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+    small = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+    return small.astype(np.float32), scale
+
+
+def motion(previous, current, pixel_threshold=25):
+    """
+    Fraction of the pixels that changed between two analysis frames
+    """
+    return float(np.count_nonzero(np.abs(current - previous) > pixel_threshold)) / current.size
+
+
+def sharpness(frame, box, width=400):
+    """
+    Variance of the Laplacian of the receipt crop, scaled to a fixed width so frames are comparable
+    """
+    x_min, y_min, x_max, y_max = (int(v) for v in box[:4])
+    crop = frame[max(y_min, 0):max(y_max, 0), max(x_min, 0):max(x_max, 0)]
+    if crop.size == 0:
+        return 0.0
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    scale = width / gray.shape[1]
+    gray = cv2.resize(gray, (width, max(1, int(round(gray.shape[0] * scale)))), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def _shift_detection(detection, dx, dy):
+    # Box and, if present, the corners after the score (x1, y1, ... x4, y4) move by the same offset
+    shifted = list(detection)
+    for index in (0, 2):
+        shifted[index] += dx
+    for index in (1, 3):
+        shifted[index] += dy
+    for index in range(5, min(len(shifted), 13)):
+        shifted[index] += dx if index % 2 == 1 else dy
+    return shifted
+
+
+def _box_iou(a, b):
+    width = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    height = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+class ReceiptTracker():
+    """
+    Decides per frame whether the detector has to run and when a receipt is ready for the OCR.
+
+    detect: function frame -> detection (x_min, y_min, x_max, y_max, score, ...) with the highest score or None
+    motion_threshold: fraction of changed pixels above which the receipt is detected again
+    stable_frames: frames without motion before the OCR runs on the sharpest of them
+    detection_interval: while the motion goes on, detect at most every this many frames
+    min_score: detections below this score count as no receipt
+    """
+    def __init__(self, detect, motion_threshold=0.02, stable_frames=10, detection_interval=5, min_score=0.5,
+                 analysis_width=160):
+        self.detect = detect
+        self.motion_threshold = motion_threshold
+        self.stable_frames = stable_frames
+        self.detection_interval = detection_interval
+        self.min_score = min_score
+        self.analysis_width = analysis_width
+
+        self.frames = 0
+        self.detections = 0
+        self.detection = None
+        self._previous = None
+        self._last_detection_frame = None
+        self._settled = True
+        self._stable = 0
+        self._best = None
+        self._read_detection = None
+
+    def _run_detection(self, frame):
+        detection = self.detect(frame)
+        self.detections += 1
+        self._last_detection_frame = self.frames
+        if detection is None or detection[4] < self.min_score:
+            # The receipt was taken away, the next one is read again
+            self.detection = None
+            self._read_detection = None
+            return
+        if self._read_detection is not None and _box_iou(detection, self._read_detection) < 0.5:
+            # A different receipt (or the same one moved far): read it again
+            self._read_detection = None
+        self.detection = list(detection)
+
+    def feed(self, frame):
+        """
+        return: None, or a dict with the frame number, the sharpest frame and the detection of a receipt to read
+        """
+        self.frames += 1
+        small, scale = _analysis_frame(frame, self.analysis_width)
+        previous, self._previous = self._previous, small
+
+        if previous is None or previous.shape != small.shape:
+            self._run_detection(frame)
+            self._settled = True
+            return None
+
+        moving = motion(previous, small) > self.motion_threshold
+        if moving:
+            self._settled = False
+            self._stable = 0
+            self._best = None
+            if self._last_detection_frame is None or \
+                    self.frames - self._last_detection_frame >= self.detection_interval:
+                self._run_detection(frame)
+            return None
+
+        if not self._settled:
+            # First still frame after the motion: where did the receipt end up
+            self._settled = True
+            self._run_detection(frame)
+        elif self.detection is not None:
+            # Small movements (camera shake, a slowly sliding receipt) move the box without a new detection
+            (dx, dy), response = cv2.phaseCorrelate(previous, small)
+            if response > 0.1:
+                self.detection = _shift_detection(self.detection, dx / scale, dy / scale)
+
+        if self.detection is None or self._read_detection is not None:
+            return None
+
+        self._stable += 1
+        score = sharpness(frame, self.detection)
+        if self._best is None or score > self._best["sharpness"]:
+            self._best = {"frame": self.frames, "image": frame.copy(), "detection": list(self.detection),
+                          "sharpness": score}
+        if self._stable < self.stable_frames:
+            return None
+
+        best, self._best = self._best, None
+        self._stable = 0
+        self._read_detection = list(self.detection)
+        return best
+
+    def retry(self):
+        # The read frame was rejected (e.g. blurry), read the receipt again after the next stable frames
+        self._read_detection = None
+
+
+def open_source(source):
+    # A camera index (e.g. "0") or a video file
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    if not capture.isOpened():
+        raise ValueError(f"cannot open {source}")
+    return capture
+
+
+def run(source, output_path, detector="nanodet", orientation=False, deskew=True, store=None, quality=None,
+        **tracker_options):
+    """
+    Read the receipts of a video stream, yield one result dict per receipt
+    store: optional results_store.ResultsStore for the OCR lines and results
+    quality: limits of the quality gate (see quality.quality_thresholds), a rejected frame is read again later
+    """
+    import pipeline
+    from model_registry import ModelRegistry
+
+    registry = ModelRegistry(detector, pipeline.apply_profile(pipeline.load_profile()))
+    predictor = registry.detector()
+    ocr = registry.ocr()
+
+    def detect(frame):
+        detections = pipeline.perform_object_detection(predictor, frame)[0][0]
+        return max(detections, key=lambda detection: detection[4]) if len(detections) else None
+
+    tracker = ReceiptTracker(detect, **tracker_options)
+    capture = open_source(source)
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            best = tracker.feed(frame)
+            if best is None:
+                continue
+            # The frame goes to the pipeline as array, the tracked box replaces the detection stage
+            output = pipeline.process_receipt(predictor, ocr, best["image"], output_path, orientation, verbose=False,
+                                              deskew=deskew, detection_results={0: {0: [best["detection"]]}},
+                                              quality=quality)
+            if "rejected" in output:
+                # Not readable (e.g. blurry while the receipt lay still), wait for the next stable frames
+                tracker.retry()
+                continue
+            if store is not None:
+                # The frame has no file, hash the frame itself
+                store.add(output, image_hash=hashlib.sha1(best["image"].tobytes()).hexdigest(),
+                          file_name=f"{source}#{best['frame']}")
+            yield {"frame": best["frame"], "sharpness": best["sharpness"], "dates": output["dates"],
+                   "amounts": output["amounts"], "frames": tracker.frames, "detections": tracker.detections}
+    finally:
+        capture.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract date and total amount of receipts from a video stream.")
+    parser.add_argument("source", help="video file or camera index")
+    parser.add_argument("--output", default="stream_output", help="folder for the intermediate images")
+    parser.add_argument("--detector", choices=["nanodet", "nanodet-eager", "opencv"], default="nanodet",
+                        help="receipt detector")
+    parser.add_argument("--orientation", action="store_true", help="straighten the receipt from its corners")
+    parser.add_argument("--motion-threshold", type=float, default=0.02,
+                        help="fraction of changed pixels that triggers a new detection")
+    parser.add_argument("--stable-frames", type=int, default=10, help="still frames before the OCR runs")
+    parser.add_argument("--detection-interval", type=int, default=5,
+                        help="frames between detections while the scene moves")
+    parser.add_argument("--store", default=None, help="SQLite file to keep the OCR lines and results in")
+    parser.add_argument("--quality-gate", action="store_true",
+                        help="read a receipt again instead of sending a blurry or dark frame to the OCR")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    store = None
+    if args.store:
+        from results_store import ResultsStore
+        store = ResultsStore(args.store)
+    quality = None
+    if args.quality_gate:
+        import pipeline
+        quality = pipeline.quality_thresholds
+    try:
+        for result in run(args.source, os.path.join(args.output, ''), args.detector, args.orientation, store=store,
+                          quality=quality, motion_threshold=args.motion_threshold, stable_frames=args.stable_frames,
+                          detection_interval=args.detection_interval):
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+    finally:
+        if store is not None:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import csv
+import itertools
+import json
+
+from evaluate_pipeline import evaluate
+
+"""
+This script sweeps the pipeline over a grid of configurations on a fixed labelled dataset
+(receipt detector, text detector, text recognizer, OCR input size, deskew on/off).
+For every configuration it records the CPU latency (median and 95th percentile per image), the throughput
+and the field accuracy (date and total exact match), then marks the Pareto frontier of latency against accuracy.
+The results are written as JSON and CSV, so the cheapest configuration meeting an accuracy target can be picked.
+
+Usage: python sweep.py <dataset folder> grid.json [--output sweep] [--min-accuracy 0.9]
+
+grid.json lists the values of every dimension, named model settings are passed to pipeline.load_ocr:
+{
+    "detector": ["nanodet", "opencv"],
+    "text_detector": {"db": {"det_model_dir": ".../db_combi/Student"},
+                      "east": {"det_model_dir": ".../east_combi", "det_algorithm": "EAST"}},
+    "recognizer": {"crnn_real": {"rec_model_dir": ".../crnn_real"}},
+    "det_limit_side_len": [640, 960],
+    "deskew": [true, false]
+}
+"""
+
+COLUMNS = ["name", "detector", "text_detector", "recognizer", "det_limit_side_len", "deskew",
+           "date_exact_match", "total_exact_match", "field_accuracy", "cer",
+           "p50_ms", "p95_ms", "images_per_second", "failed", "pareto"]
+
+
+def configurations(grid):
+    """
+    Yield (row, pipeline config) for every combination of the grid
+    """
+    detectors = grid.get("detector", ["nanodet"])
+    text_detectors = grid.get("text_detector", {"default": {}})
+    recognizers = grid.get("recognizer", {"default": {}})
+    sizes = grid.get("det_limit_side_len", [960])
+    deskews = grid.get("deskew", [True])
+
+    for detector, text_detector, recognizer, size, deskew in itertools.product(
+            detectors, text_detectors, recognizers, sizes, deskews):
+        row = {
+            "name": f"{detector}+{text_detector}+{recognizer}+{size}+{'deskew' if deskew else 'no_deskew'}",
+            "detector": detector,
+            "text_detector": text_detector,
+            "recognizer": recognizer,
+            "det_limit_side_len": size,
+            "deskew": deskew,
+        }
+        config = {"detector": detector, "deskew": deskew, "det_limit_side_len": size,
+                  **text_detectors[text_detector], **recognizers[recognizer]}
+        yield row, config
+
+
+def pareto_frontier(rows, latency="p50_ms"):
+    """
+    Mark the rows no other row beats in both latency (lower) and field accuracy (higher).
+    """
+    for row in rows:
+        row["pareto"] = not any(
+            other[latency] <= row[latency] and other["field_accuracy"] >= row["field_accuracy"]
+            and (other[latency] < row[latency] or other["field_accuracy"] > row["field_accuracy"])
+            for other in rows
+        )
+    return [row for row in sorted(rows, key=lambda row: row[latency]) if row["pareto"]]
+
+
+def sweep(dataset_folder, grid, processes=None, limit=None, latency="p50_ms"):
+    rows = []
+    for row, config in configurations(grid):
+        summary, _ = evaluate(dataset_folder, processes, limit=limit, config=config)
+        row.update(
+            date_exact_match=summary["date_exact_match"],
+            total_exact_match=summary["total_exact_match"],
+            field_accuracy=(summary["date_exact_match"] + summary["total_exact_match"]) / 2,
+            cer=summary["cer"],
+            p50_ms=summary["latency"]["total"]["median_ms"],
+            p95_ms=summary["latency"]["total"]["p95_ms"],
+            images_per_second=summary["images_per_second"],
+            failed=summary["failed"],
+        )
+        rows.append(row)
+        print(f"{row['name']}: field accuracy {row['field_accuracy']:.3f}, p50 {row['p50_ms']:.0f} ms, "
+              f"p95 {row['p95_ms']:.0f} ms, {row['images_per_second']:.2f} images/s")
+    return rows, pareto_frontier(rows, latency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency/accuracy sweep over pipeline configurations.")
+    parser.add_argument("dataset", help="generator output folder with images/ and labels/")
+    parser.add_argument("grid", help="JSON file with the values of every dimension")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--limit", type=int, default=None, help="evaluate only the first images")
+    parser.add_argument("--latency", choices=["p50_ms", "p95_ms"], default="p50_ms",
+                        help="latency used for the Pareto frontier")
+    parser.add_argument("--min-accuracy", type=float, default=None,
+                        help="print the fastest configuration reaching this field accuracy")
+    parser.add_argument("--output", default="sweep", help="output path without extension (.json and .csv)")
+    args = parser.parse_args()
+
+    with open(args.grid) as f:
+        grid = json.load(f)
+    rows, frontier = sweep(args.dataset, grid, args.processes, args.limit, args.latency)
+
+    with open(args.output + ".json", "w") as f:
+        json.dump({"configurations": rows, "pareto": frontier}, f, indent=2)
+    with open(args.output + ".csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print("Pareto frontier:")
+    for row in frontier:
+        print(f"  {row['name']}: field accuracy {row['field_accuracy']:.3f}, {args.latency} {row[args.latency]:.0f}")
+    if args.min_accuracy is not None:
+        meeting = [row for row in frontier if row["field_accuracy"] >= args.min_accuracy]
+        if meeting:
+            print(f"Fastest configuration with field accuracy >= {args.min_accuracy}: {meeting[0]['name']}")
+        else:
+            print(f"No configuration reaches field accuracy {args.min_accuracy}")
+
+
+if __name__ == "__main__":
+    main()
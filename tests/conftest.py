@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The modules are plain scripts in the repository root, comparison/ and receipt_generator/
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in (root, os.path.join(root, "comparison"), os.path.join(root, "receipt_generator")):
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
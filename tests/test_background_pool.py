@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from background_pool import BackgroundPool
+from receipt_background_generator import composite_receipt
+
+
+@pytest.fixture
+def background_file(tmp_path):
+    path = tmp_path / "background.png"
+    Image.fromarray(np.random.default_rng(0).integers(0, 256, (300, 400, 3), dtype=np.uint8)).save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_composite_leaves_the_pooled_background_unchanged(background_file, tmp_path, cached):
+    pool = BackgroundPool([background_file], cache_dir=str(tmp_path / "cache") if cached else None)
+    background = pool.get(0)
+    assert not background.flags.writeable
+    before = background.copy()
+
+    receipt = np.full((120, 60, 4), 255, dtype=np.uint8)
+    image, box, _ = composite_receipt(background, receipt, np.random.default_rng(1))
+    assert np.array_equal(pool.get(0), before)
+    # The receipt is white and opaque, the background around it is not
+    pixels = np.asarray(image)
+    assert (pixels[box[1]:box[3] - 2, box[0]:box[2] - 2] == 255).all()
+    assert not np.array_equal(pixels, before)
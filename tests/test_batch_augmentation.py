@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+try:
+    import imgaug  # noqa: F401
+except ImportError:
+    pytest.skip("imgaug is not installed", allow_module_level=True)
+except AttributeError:
+    # imgaug 0.4 uses np.sctypes, which numpy 2 removed
+    pytest.skip("imgaug does not import with this numpy", allow_module_level=True)
+
+from batch_augmentation import BatchAugmenter
+from receipt_background_generator import compute_max_scale_factor, sample_warp_matrix, transform_points, warp_receipt
+
+BACKGROUND_SIZES = [(800, 600), (1200, 1600), (800, 600), (640, 480), (1200, 1600)]
+
+
+def receipts():
+    # Noise receipts of different sizes, some sharing a bucket, so a batch is padded
+    rng = np.random.default_rng(0)
+    sizes = [(180, 436), (170, 430), (200, 520), (185, 400), (120, 300)]
+    return [Image.fromarray(rng.integers(0, 256, (height, width, 4), dtype=np.uint8), 'RGBA')
+            for width, height in sizes]
+
+
+def corners(receipt):
+    return np.array([[0, 0], [receipt.width, 0], [receipt.width, receipt.height], [0, receipt.height]],
+                    dtype=np.float32)
+
+
+def place_like_script_mode(receipt, background_size, rng):
+    # The warp of place_receipt in receipt_background_generator.py
+    max_scale_factor = compute_max_scale_factor(receipt.size, background_size)
+    matrix = sample_warp_matrix(rng, receipt.width, receipt.height, max_scale_factor)
+    image, matrix = warp_receipt(receipt, matrix)
+    return image, transform_points(matrix, corners(receipt))
+
+
+@pytest.mark.parametrize("processes, batch_size", [(1, 16), (1, 1), (2, 2)])
+def test_batch_warp_is_the_script_mode_warp(processes, batch_size):
+    images = receipts()
+    rngs = [np.random.default_rng([7, index]) for index in range(len(images))]
+    with BatchAugmenter(batch_size=batch_size, processes=processes, seed=3) as augmenter:
+        augmented = augmenter.augment(images, BACKGROUND_SIZES, [corners(image) for image in images], rngs)
+
+    for index, (image, background_size) in enumerate(zip(images, BACKGROUND_SIZES)):
+        reference_rng = np.random.default_rng([7, index])
+        expected_image, expected_points = place_like_script_mode(image, background_size, reference_rng)
+        image_aug, points_aug = augmented[index]
+        np.testing.assert_array_equal(image_aug, expected_image)
+        np.testing.assert_allclose(points_aug, expected_points, atol=1e-3)
+        # The generator is left where place_receipt leaves it, so the composite draws the same placement
+        assert rngs[index].random() == reference_rng.random()
+
+
+def test_result_does_not_depend_on_the_batch():
+    images = receipts()
+    order = [3, 0, 4, 2, 1]
+    with BatchAugmenter(batch_size=16, processes=1) as augmenter:
+        together = augmenter.augment(images, BACKGROUND_SIZES,
+                                     rngs=[np.random.default_rng([1, index]) for index in range(len(images))])
+        shuffled = augmenter.augment([images[index] for index in order], [BACKGROUND_SIZES[index] for index in order],
+                                     rngs=[np.random.default_rng([1, index]) for index in order])
+    for position, index in enumerate(order):
+        np.testing.assert_array_equal(shuffled[position][0], together[index][0])
+        np.testing.assert_array_equal(shuffled[position][1], together[index][1])
@@ -0,0 +1,78 @@
+import os
+import numpy as np
+import pytest
+
+from detection_evaluation import AnnotationIndex, box_iou, evaluate_detections
+
+ANNOTATION = """<annotation><filename>{name}.jpg</filename>{objects}</annotation>"""
+OBJECT = ("<object><name>receipt</name><bndbox><xmin>{}</xmin><ymin>{}</ymin><xmax>{}</xmax><ymax>{}</ymax>"
+          "</bndbox></object>")
+
+
+def write_annotations(folder, images):
+    for name, boxes in images.items():
+        objects = "".join(OBJECT.format(*box) for box in boxes)
+        (folder / f"{name}.xml").write_text(ANNOTATION.format(name=name, objects=objects))
+
+
+def greedy_reference(index, image_names, boxes, scores, threshold):
+    # Matching one prediction at a time, highest score first
+    image_ids = index.lookup(image_names)
+    matched = set()
+    true_positives = []
+    for prediction in np.argsort(-np.asarray(scores), kind="stable"):
+        if image_ids[prediction] < 0:
+            continue
+        truths = np.flatnonzero(index.image_ids == image_ids[prediction])
+        ious = box_iou(boxes[prediction], index.boxes[truths])
+        hit = False
+        for truth, iou in sorted(zip(truths, ious), key=lambda pair: -pair[1]):
+            if iou < threshold:
+                break
+            if truth not in matched:
+                matched.add(truth)
+                hit = True
+                break
+        true_positives.append(hit)
+    return sum(true_positives)
+
+
+@pytest.fixture
+def index(tmp_path):
+    rng = np.random.default_rng(0)
+    images = {}
+    for number in range(30):
+        corners = rng.integers(0, 200, (int(rng.integers(0, 4)), 2))
+        images[f"img{number:02d}"] = [list(corner) + list(corner + rng.integers(20, 120, 2)) for corner in corners]
+    (tmp_path / "annotations").mkdir()
+    write_annotations(tmp_path / "annotations", images)
+    return AnnotationIndex(str(tmp_path / "annotations"), str(tmp_path / "cache"))
+
+
+def test_matching_is_the_greedy_matching(index):
+    rng = np.random.default_rng(1)
+    # Several jittered predictions per box compete for it, plus predictions on unknown images
+    truth = rng.integers(0, len(index.boxes), 200)
+    boxes = index.boxes[truth] + rng.normal(0, 10, (200, 4))
+    image_names = [f"{index.names[image_id]}.jpg" for image_id in index.image_ids[truth]]
+    image_names[:5] = ["unknown.jpg"] * 5
+    scores = rng.integers(0, 10, 200) / 10
+    results = evaluate_detections(index, image_names, boxes, scores, thresholds=[0.3, 0.5, 0.75])
+    for threshold, values in results["thresholds"].items():
+        tp = greedy_reference(index, image_names, boxes, scores, threshold)
+        assert values["precision"] == pytest.approx(tp / 195)
+        assert values["recall"] == pytest.approx(tp / len(index.boxes))
+
+
+def test_exact_predictions_are_perfect(index):
+    image_names = [f"{name}.jpg" for name in index.names[index.image_ids]]
+    results = evaluate_detections(index, image_names, index.boxes, np.linspace(1, 0, len(index.boxes)))
+    assert results["mAP"] == pytest.approx(1.0)
+
+
+def test_index_is_cached_outside_of_the_annotations(tmp_path, index):
+    assert all(name.endswith(".xml") for name in os.listdir(tmp_path / "annotations"))
+    assert len(os.listdir(tmp_path / "cache")) == 1
+    cached = AnnotationIndex(str(tmp_path / "annotations"), str(tmp_path / "cache"))
+    np.testing.assert_array_equal(cached.boxes, index.boxes)
+    np.testing.assert_array_equal(cached.names, index.names)
@@ -0,0 +1,54 @@
+import sys
+import types
+import cv2
+import numpy as np
+import pytest
+
+import ocr_evaluation
+from ocr_evaluation import EvaluationConfig, _predict, recognition_metrics
+
+# Text of the stub recognizer, by width of the line image
+TEXTS = {40: "Summe 14,71", 50: "EUR 3,20", 60: "Datum 22.10.2016"}
+
+
+class StubOCR():
+    # PaddleOCR with the output shape of ocr(image, det=False, rec=True): one [(text, score)] list per image
+    def __init__(self, **options):
+        self.options = options
+
+    def ocr(self, image, det=True, rec=True, cls=True):
+        assert not det and rec
+        return [[(TEXTS[image.shape[1]], 0.98)]]
+
+
+@pytest.fixture
+def rec_config(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "paddleocr", types.SimpleNamespace(PaddleOCR=StubOCR))
+    monkeypatch.setattr(ocr_evaluation, "_models", {})
+    labels = []
+    for width, text in TEXTS.items():
+        cv2.imwrite(str(tmp_path / f"line_{width}.png"), np.full((32, width, 3), 255, dtype=np.uint8))
+        labels.append(f"line_{width}.png\t{text}\n")
+    # The last line is read wrong
+    labels[-1] = "line_60.png\tDatum 23.10.2016\n"
+    (tmp_path / "rec_gt.txt").write_text("".join(labels), encoding="utf-8")
+    (tmp_path / "model").mkdir()
+    return EvaluationConfig("crnn", "rec", str(tmp_path / "model"), str(tmp_path), str(tmp_path / "rec_gt.txt"))
+
+
+def test_predict_keeps_the_whole_text(rec_config):
+    output = _predict(rec_config, cpu_threads=1)
+    assert output["predictions"] == list(TEXTS.values())
+
+
+def test_recognition_metrics_of_predictions(rec_config):
+    output = _predict(rec_config, cpu_threads=1)
+    ground_truth = [text for _, text in ocr_evaluation.load_labels(
+        rec_config.data_dir, rec_config.label_file, "rec")]
+    metrics = recognition_metrics(output["predictions"], ground_truth, seconds=1.0)
+    assert metrics.accuracy == pytest.approx(2 / 3)
+    assert metrics.fps == pytest.approx(3.0)
+
+
+def test_recognition_metrics_ignore_spaces():
+    assert recognition_metrics(["Summe14,71"], ["Summe 14,71"], seconds=0).accuracy == 1.0
@@ -0,0 +1,37 @@
+from perf_check import compare
+
+BASELINE = {
+    "tolerance": 0.2, "memory_tolerance": 0.1, "slack_ms": 1.0,
+    "stages": {"pipeline.ocr": {"ms": 100.0}, "pipeline.deskew": {"ms": 10.0}, "generator.augment": {"ms": 5.0}},
+    "memory_mb": {"pipeline": {"mb": 500.0}, "generator": {"mb": 50.0}},
+}
+
+
+def test_stages_within_the_tolerance_are_ok():
+    rows, ok = compare(BASELINE, {"pipeline.ocr": 115.0, "pipeline.deskew": 12.5}, {"pipeline": 540.0})
+    assert ok
+    assert [row[0] for row in rows] == ["pipeline.deskew", "pipeline.ocr", "memory.pipeline"]
+
+
+def test_slower_stage_fails():
+    _, ok = compare(BASELINE, {"pipeline.ocr": 125.0, "pipeline.deskew": 10.0}, {"pipeline": 500.0})
+    assert not ok
+
+
+def test_missing_stage_of_a_measured_part_fails():
+    rows, ok = compare(BASELINE, {"pipeline.ocr": 100.0}, {"pipeline": 500.0})
+    assert not ok
+    assert ("pipeline.deskew", 10.0, None, None, None, False) in rows
+
+
+def test_skipped_part_is_not_missing():
+    # --skip-generator: neither the generator stages nor its memory are measured
+    _, ok = compare(BASELINE, {"pipeline.ocr": 100.0, "pipeline.deskew": 10.0}, {"pipeline": 500.0})
+    assert ok
+
+
+def test_new_stage_is_reported_but_ok():
+    rows, ok = compare(BASELINE, {"pipeline.ocr": 100.0, "pipeline.deskew": 10.0, "pipeline.extraction": 3.0},
+                       {"pipeline": 500.0})
+    assert ok
+    assert ("pipeline.extraction", None, 3.0, None, None, True) in rows
@@ -0,0 +1,41 @@
+import cv2
+import numpy as np
+import pytest
+
+from quality import check_quality, measure_quality, quality_thresholds
+
+
+def receipt(height, ink=0):
+    # White receipt with lines of text, drawn at 436 pixels height and scaled
+    image = np.full((436, 180), 255, dtype=np.uint8)
+    for row in range(20, 420, 18):
+        cv2.putText(image, "Artikel 1 x 3,49 EUR", (8, row), cv2.FONT_HERSHEY_SIMPLEX, 0.4, ink, 1, cv2.LINE_AA)
+    return cv2.resize(image, (round(180 * height / 436), height), interpolation=cv2.INTER_CUBIC)
+
+
+VARIANTS = {
+    None: lambda image: image,
+    "blurry": lambda image: cv2.GaussianBlur(image, (0, 0), 3.5 * image.shape[0] / 436),
+    "too_dark": lambda image: (image * 0.2).astype(np.uint8),
+    "overexposed": lambda image: np.clip(image * 0.25 + 200, 0, 255).astype(np.uint8),
+    "no_text": lambda image: np.full_like(image, 240),
+}
+
+
+@pytest.mark.parametrize("height", [436, 1300, 2600])
+@pytest.mark.parametrize("expected", list(VARIANTS))
+def test_reason_does_not_depend_on_the_resolution(height, expected):
+    metrics = measure_quality(VARIANTS[expected](receipt(height)))
+    assert check_quality(metrics, quality_thresholds) == expected
+
+
+def test_blur_that_lightens_the_ink_is_blurry():
+    # On pale thermal print the blur lifts the darkest pixels above max_ink_level, the crop is still blurry
+    metrics = measure_quality(VARIANTS["blurry"](receipt(1300, ink=90)))
+    assert metrics["ink_level"] > quality_thresholds["max_ink_level"]
+    assert check_quality(metrics, quality_thresholds) == "blurry"
+
+
+def test_missing_limits_are_not_checked():
+    metrics = measure_quality(VARIANTS["too_dark"](receipt(436)))
+    assert check_quality(metrics, dict(quality_thresholds, min_paper_level=None)) is None
@@ -0,0 +1,120 @@
+import contextlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+"""
+Opt-in tracing of single requests (one receipt image) in Chrome trace format, viewable in chrome://tracing
+or https://ui.perfetto.dev.
+The pipeline marks its stages with span("name", attribute=value, ...). Without an active trace a span does nothing,
+with trace_request(...) around a request every span becomes a complete event ("ph": "X") with its attributes
+(image size, box counts, ...) as args. The trace of a request is written when it was sampled (sample_rate)
+or when the request took longer than threshold_ms, so slow outliers can be explained one by one.
+"""
+
+_local = threading.local()
+
+
+class Tracer():
+    """
+    Collects the spans of one request
+    """
+    def __init__(self):
+        self.events = []
+        self.pid = os.getpid()
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        # The yielded dict takes attributes only known at the end of the span, e.g. the number of boxes
+        start = time.perf_counter_ns()
+        try:
+            yield args
+        finally:
+            self.events.append({"name": name, "ph": "X", "ts": start / 1000,
+                                "dur": (time.perf_counter_ns() - start) / 1000,
+                                "pid": self.pid, "tid": threading.get_ident(), "args": args})
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+
+def active():
+    return getattr(_local, "tracer", None) is not None
+
+
+def span(name, **args):
+    """
+    Span of the active trace, a no-op context (yielding the attributes dict) if no request is traced
+    """
+    tracer = getattr(_local, "tracer", None)
+    if tracer is None:
+        return contextlib.nullcontext(args)
+    return tracer.span(name, **args)
+
+
+@contextlib.contextmanager
+def trace_request(name, folder, sample_rate=0.0, threshold_ms=None, **args):
+    """
+    Trace one request and write it to folder as <name>-<pid>-<time>.json if it was sampled or slower than threshold_ms.
+    Requests neither sampled nor checked against a threshold are not recorded at all.
+
+    yield: the tracer, None if the request is not recorded
+    """
+    sampled = random.random() < sample_rate
+    if not sampled and threshold_ms is None:
+        yield None
+        return
+
+    tracer = Tracer()
+    _local.tracer = tracer
+    try:
+        with tracer.span(name, **args) as root:
+            yield tracer
+    finally:
+        _local.tracer = None
+        duration_ms = tracer.events[-1]["dur"] / 1000
+        if sampled or duration_ms > threshold_ms:
+            root["trigger"] = "sampled" if sampled else f"latency > {threshold_ms} ms"
+            os.makedirs(folder, exist_ok=True)
+            file_name = f"{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}-{tracer.pid}-{time.time_ns() // 1000000}.json"
+            tracer.save(os.path.join(folder, file_name))
+
+
+class _TracedCall():
+    # Callable attribute of the OCR system recorded as a span
+    def __init__(self, function, name, count):
+        self.function = function
+        self.name = name
+        self.count = count
+
+    def __call__(self, *args, **kwargs):
+        if not active():
+            return self.function(*args, **kwargs)
+        with span(self.name) as attributes:
+            result = self.function(*args, **kwargs)
+            attributes.update(self.count(args, result))
+            return result
+
+    def __getattr__(self, name):
+        return getattr(self.function, name)
+
+
+def instrument_ocr(ocr):
+    """
+    Record the text detection, angle classification and recognition of a PaddleOCR instance as separate spans
+    """
+    stages = [
+        ("text_detector", "ocr.detection",
+         lambda args, result: {"boxes": 0 if result[0] is None else len(result[0])}),
+        ("text_classifier", "ocr.classification", lambda args, result: {"lines": len(args[0])}),
+        ("text_recognizer", "ocr.recognition", lambda args, result: {"lines": len(args[0])}),
+    ]
+    for attribute, name, count in stages:
+        function = getattr(ocr, attribute, None)
+        if function is not None and not isinstance(function, _TracedCall):
+            setattr(ocr, attribute, _TracedCall(function, name, count))
+    return ocr